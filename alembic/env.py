@@ -1,9 +1,9 @@
 from logging.config import fileConfig
-from sqlalchemy import engine_from_config, pool
+from sqlalchemy import pool
 from alembic import context
 from sqlmodel import SQLModel
 from app.db.models import *
-from app.db.base import sqlite_url  
+from app.db.base import sqlite_url, make_engine
 
 target_metadata = SQLModel.metadata
 
@@ -18,11 +18,7 @@ def run_migrations_offline():
         context.run_migrations()
 
 def run_migrations_online():
-    connectable = engine_from_config(
-        {"sqlalchemy.url": sqlite_url},
-        prefix="sqlalchemy.",
-        poolclass=pool.NullPool,
-    )
+    connectable = make_engine(sqlite_url, poolclass=pool.NullPool)
     with connectable.connect() as connection:
         context.configure(connection=connection, target_metadata=target_metadata)
         with context.begin_transaction():
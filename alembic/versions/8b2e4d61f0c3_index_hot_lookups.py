@@ -0,0 +1,79 @@
+"""index hot lookups
+
+Revision ID: 8b2e4d61f0c3
+Revises: 3f1a7c2e9b40
+Create Date: 2026-10-18 14:03:51.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e4d61f0c3'
+down_revision: Union[str, Sequence[str], None] = '3f1a7c2e9b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (index name, table, columns, unique)
+INDEXES = [
+    ('ix_users_xp', 'users', ['xp'], False),
+    ('ix_habits_owner_id', 'habits', ['owner_id'], False),
+    ('ix_streaks_user_habit', 'streaks', ['user_id', 'habit_id'], True),
+    ('ix_streaks_habit_id', 'streaks', ['habit_id'], False),
+    ('ix_habit_completions_habit_id', 'habit_completions', ['habit_id'], False),
+    ('ix_userachievement_user_achievement', 'userachievement', ['user_id', 'achievement_id'], False),
+    ('ix_userachievement_habit_id', 'userachievement', ['habit_id'], False),
+    ('ix_user_wallets_user_id', 'user_wallets', ['user_id'], True),
+    ('ix_user_items_user_id', 'user_items', ['user_id'], False),
+    ('ix_user_quests_user_quest', 'user_quests', ['user_id', 'quest_id'], False),
+    ('ix_medal_achievement_link_achievement_id', 'medal_achievement_link', ['achievement_id'], False),
+]
+
+
+def _existing_tables() -> set[str]:
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    tables = _existing_tables()
+
+    # The unique indexes need duplicates gone first: keep the oldest streak
+    # row per (user, habit), and fold duplicate wallets into the oldest one.
+    if 'streaks' in tables:
+        op.execute("""
+            DELETE FROM streaks WHERE id NOT IN (
+                SELECT min(id) FROM streaks GROUP BY user_id, habit_id
+            )
+        """)
+    if 'user_wallets' in tables:
+        op.execute("""
+            UPDATE user_wallets SET
+                coins = (SELECT sum(w.coins) FROM user_wallets w WHERE w.user_id = user_wallets.user_id),
+                gems = (SELECT sum(w.gems) FROM user_wallets w WHERE w.user_id = user_wallets.user_id),
+                event_tokens = (SELECT sum(w.event_tokens) FROM user_wallets w WHERE w.user_id = user_wallets.user_id)
+            WHERE id IN (SELECT min(id) FROM user_wallets GROUP BY user_id HAVING count(*) > 1)
+        """)
+        op.execute("""
+            DELETE FROM user_wallets WHERE id NOT IN (
+                SELECT min(id) FROM user_wallets GROUP BY user_id
+            )
+        """)
+
+    # Tables the app creates on startup may not exist yet; create_all adds
+    # these indexes along with them.
+    for name, table, columns, unique in INDEXES:
+        if table in tables:
+            op.create_index(name, table, columns, unique=unique, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    tables = _existing_tables()
+    for name, table, columns, unique in reversed(INDEXES):
+        if table in tables:
+            op.drop_index(name, table_name=table, if_exists=True)
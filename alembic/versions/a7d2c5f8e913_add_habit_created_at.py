@@ -0,0 +1,31 @@
+"""habit created_at
+
+Revision ID: a7d2c5f8e913
+Revises: d3b7e91c4a26
+Create Date: 2026-10-18 09:12:44.502117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d2c5f8e913'
+down_revision: Union[str, Sequence[str], None] = 'd3b7e91c4a26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing habits keep NULL: their creation day is unknown
+    with op.batch_alter_table('habits') as batch_op:
+        batch_op.add_column(sa.Column('created_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('habits') as batch_op:
+        batch_op.drop_column('created_at')
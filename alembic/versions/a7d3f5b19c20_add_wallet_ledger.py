@@ -0,0 +1,50 @@
+"""add wallet ledger
+
+Revision ID: a7d3f5b19c20
+Revises: c41d9a7e2f18
+Create Date: 2026-10-18 18:02:41.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3f5b19c20'
+down_revision: Union[str, Sequence[str], None] = 'c41d9a7e2f18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('wallet_ledger',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('currency', sa.String(), nullable=False),
+    sa.Column('delta', sa.Integer(), nullable=False),
+    sa.Column('balance', sa.Integer(), nullable=False),
+    sa.Column('reason', sa.String(), nullable=False),
+    sa.Column('reference', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_wallet_ledger_user', 'wallet_ledger', ['user_id', 'id'], unique=False)
+
+    # Open every ledger with the current balances so that, per user and
+    # currency, the deltas always sum to the wallet balance
+    for currency in ('coins', 'gems', 'event_tokens'):
+        op.execute(f"""
+            INSERT INTO wallet_ledger (user_id, currency, delta, balance, reason, created_at)
+            SELECT user_id, '{currency}', {currency}, {currency}, 'opening_balance', CURRENT_TIMESTAMP
+            FROM user_wallets WHERE {currency} != 0
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_wallet_ledger_user', table_name='wallet_ledger')
+    op.drop_table('wallet_ledger')
@@ -0,0 +1,41 @@
+"""quest period start
+
+Revision ID: b6e1f4a8c352
+Revises: f2c6a9d41e07
+Create Date: 2026-10-18 22:41:07.318264
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e1f4a8c352'
+down_revision: Union[str, Sequence[str], None] = 'f2c6a9d41e07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_user_quests() -> bool:
+    return 'user_quests' in sa.inspect(op.get_bind()).get_table_names()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The app creates user_quests on startup when it is missing
+    if not _has_user_quests():
+        return
+
+    with op.batch_alter_table('user_quests') as batch_op:
+        batch_op.add_column(sa.Column('period_start', sa.Date(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if not _has_user_quests():
+        return
+
+    with op.batch_alter_table('user_quests') as batch_op:
+        batch_op.drop_column('period_start')
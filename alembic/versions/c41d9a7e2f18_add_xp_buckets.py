@@ -0,0 +1,54 @@
+"""add xp buckets
+
+Revision ID: c41d9a7e2f18
+Revises: 8b2e4d61f0c3
+Create Date: 2026-10-18 16:20:07.551930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41d9a7e2f18'
+down_revision: Union[str, Sequence[str], None] = '8b2e4d61f0c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('xp_buckets',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('period', sa.String(), nullable=False),
+    sa.Column('period_start', sa.Date(), nullable=False),
+    sa.Column('xp', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_xp_buckets_period_user', 'xp_buckets', ['period', 'period_start', 'user_id'], unique=True)
+    op.create_index('ix_xp_buckets_period_rank', 'xp_buckets', ['period', 'period_start', sa.text('xp DESC'), 'user_id'])
+
+    # Seed the buckets with habit-completion XP from the completion log
+    # (quest XP was never logged per day, so it starts counting from here)
+    xp = "CASE WHEN h.frequency > 1 THEN 5 * h.frequency ELSE 10 END"
+    for period, start in (
+        ('week', "date(c.day, 'weekday 0', '-6 days')"),
+        ('month', "date(c.day, 'start of month')"),
+    ):
+        op.execute(f"""
+            INSERT INTO xp_buckets (user_id, period, period_start, xp)
+            SELECT c.user_id, '{period}', {start}, sum({xp})
+            FROM habit_completions c JOIN habits h ON h.id = c.habit_id
+            GROUP BY c.user_id, {start}
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_xp_buckets_period_rank', table_name='xp_buckets')
+    op.drop_index('ix_xp_buckets_period_user', table_name='xp_buckets')
+    op.drop_table('xp_buckets')
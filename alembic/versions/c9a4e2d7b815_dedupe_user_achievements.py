@@ -0,0 +1,57 @@
+"""one user achievement row per achievement
+
+Revision ID: c9a4e2d7b815
+Revises: b6e1f4a8c352
+Create Date: 2026-10-19 09:12:44.502117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9a4e2d7b815'
+down_revision: Union[str, Sequence[str], None] = 'b6e1f4a8c352'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Users compacted per DELETE
+BATCH_USERS = 10000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    first_id, last_id = bind.execute(sa.text(
+        "SELECT (SELECT min(user_id) FROM userachievement), (SELECT max(user_id) FROM userachievement)"
+    )).one()
+
+    # Grants used to write two rows (with and without the habit). Keep one
+    # per (user, achievement): the oldest that names its habit, else the oldest.
+    compact = sa.text("""
+        DELETE FROM userachievement
+        WHERE user_id >= :lo AND user_id < :hi AND id NOT IN (
+            SELECT coalesce(min(CASE WHEN habit_id IS NOT NULL THEN id END), min(id))
+            FROM userachievement
+            WHERE user_id >= :lo AND user_id < :hi
+            GROUP BY user_id, achievement_id
+        )
+    """)
+    if first_id is not None:
+        # Outside the migration transaction: each DELETE commits on its own,
+        # so the app's writers get the lock between batches
+        with op.get_context().autocommit_block():
+            for lo in range(first_id, last_id + 1, BATCH_USERS):
+                bind.execute(compact, {"lo": lo, "hi": lo + BATCH_USERS})
+
+    op.drop_index('ix_userachievement_user_achievement', table_name='userachievement', if_exists=True)
+    op.create_index('ix_userachievement_user_achievement', 'userachievement', ['user_id', 'achievement_id'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # The dropped duplicate rows are not restored
+    op.drop_index('ix_userachievement_user_achievement', table_name='userachievement')
+    op.create_index('ix_userachievement_user_achievement', 'userachievement', ['user_id', 'achievement_id'], unique=False)
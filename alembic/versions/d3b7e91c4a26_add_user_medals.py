@@ -0,0 +1,43 @@
+"""add user medals
+
+Revision ID: d3b7e91c4a26
+Revises: c9a4e2d7b815
+Create Date: 2026-10-19 11:37:20.664031
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3b7e91c4a26'
+down_revision: Union[str, Sequence[str], None] = 'c9a4e2d7b815'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Progress on existing achievements (and their XP rewards) is filled in
+    # by `python -m app.utils.medal_engine`
+    op.create_table('user_medals',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('medal_id', sa.Integer(), nullable=False),
+    sa.Column('remaining', sa.Integer(), nullable=False),
+    sa.Column('awarded_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['medal_id'], ['medals.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_user_medals_user_medal', 'user_medals', ['user_id', 'medal_id'], unique=True)
+    op.create_index(op.f('ix_user_medals_medal_id'), 'user_medals', ['medal_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_user_medals_medal_id'), table_name='user_medals')
+    op.drop_index('ix_user_medals_user_medal', table_name='user_medals')
+    op.drop_table('user_medals')
@@ -0,0 +1,54 @@
+"""quest progress
+
+Revision ID: f2c6a9d41e07
+Revises: e5b08c7d3a91
+Create Date: 2026-10-18 20:24:13.907351
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c6a9d41e07'
+down_revision: Union[str, Sequence[str], None] = 'e5b08c7d3a91'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_user_quests() -> bool:
+    return 'user_quests' in sa.inspect(op.get_bind()).get_table_names()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The app creates user_quests on startup when it is missing
+    if not _has_user_quests():
+        return
+
+    with op.batch_alter_table('user_quests') as batch_op:
+        batch_op.add_column(sa.Column('progress', sa.Integer(), nullable=False, server_default='0'))
+
+    # One progress row per (user, quest): keep a completed row if there is one,
+    # else the oldest
+    op.execute("""
+        DELETE FROM user_quests WHERE id NOT IN (
+            SELECT coalesce(min(CASE WHEN completed THEN id END), min(id))
+            FROM user_quests GROUP BY user_id, quest_id
+        )
+    """)
+    op.drop_index('ix_user_quests_user_quest', table_name='user_quests', if_exists=True)
+    op.create_index('ix_user_quests_user_quest', 'user_quests', ['user_id', 'quest_id'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if not _has_user_quests():
+        return
+
+    op.drop_index('ix_user_quests_user_quest', table_name='user_quests')
+    op.create_index('ix_user_quests_user_quest', 'user_quests', ['user_id', 'quest_id'], unique=False)
+    with op.batch_alter_table('user_quests') as batch_op:
+        batch_op.drop_column('progress')
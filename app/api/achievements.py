@@ -1,13 +1,22 @@
+from datetime import datetime
 from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import select
 from ..db.session import AsyncSessionDep
-from ..db.models import Achievement, UserAchievement, User, Habit, Streak, UserWallet
+from ..db.models import Achievement, MedalAchievementLink, UserAchievement, UserMedal, User
 from ..utils.dependencies import get_current_user
 from ..utils.users import require_role
 from ..db.response_model import UserAchievementRead
-import json
-from ..utils.check_condition import check_condition
+from ..utils.achievement_rules import achievement_rules
+from ..utils.pagination import NEXT_CURSOR_HEADER, paginate, page
+from ..utils.wallet import apply_changes_async
+from ..utils.achievement_backfill import backfill_achievement, backfill_jobs, is_running, queue_backfill
+from ..utils.medal_engine import award_medals, medal_index, medal_progress_cache, recompute_medals
+from ..utils.catalog_cache import ACHIEVEMENTS, catalog_cache
+from ..utils.http_cache import cached_json, render_json
 
 router = APIRouter()
 
@@ -20,25 +29,42 @@ router = APIRouter()
 async def create_achievement(
     achievement: Achievement,
     session: AsyncSessionDep,
+    background_tasks: BackgroundTasks,
     current_user: Annotated[User, Depends(get_current_user)]
 ):
     require_role(current_user, roles="admin")
     session.add(achievement)
     await session.commit()
     await session.refresh(achievement)
+    achievement_rules.invalidate()
+    catalog_cache.invalidate(ACHIEVEMENTS)
+    # Users who already qualify get it from the backfill, everyone else on
+    # their next habit completion
+    queue_backfill(achievement.id)
+    background_tasks.add_task(backfill_achievement, achievement.id)
     return achievement
 
 
 @router.get("/", response_model=list[Achievement])
 async def read_achievements(
+    request: Request,
     session: AsyncSessionDep,
+    response: Response,
     current_user: Annotated[User, Depends(get_current_user)],
     offset: int = 0,
-    limit: Annotated[int, Query(le=100)] = 100,
+    limit: Annotated[int, Query(ge=1, le=100)] = 100,
+    cursor: str | None = None,
 ):
-    query = select(Achievement)
-    result = await session.exec(query.offset(offset).limit(limit))
-    return result.all()
+    key = catalog_cache.key(ACHIEVEMENTS, offset, limit, cursor)
+    entry = catalog_cache.get(key)
+    if entry is None:
+        query = select(Achievement)
+        result = await session.exec(paginate(query, [Achievement.id], cursor, offset, limit))
+        rows = page(result.all(), limit, response)
+        headers = {NEXT_CURSOR_HEADER: response.headers[NEXT_CURSOR_HEADER]} if NEXT_CURSOR_HEADER in response.headers else {}
+        entry = (*render_json(rows, headers), headers)
+        catalog_cache.set(key, entry)
+    return cached_json(request, *entry)
 
 
 @router.get("/{achievement_id}", response_model=Achievement)
@@ -54,10 +80,40 @@ async def read_achievement(
     return achievement
 
 
+@router.post("/{achievement_id}/backfill", status_code=202)
+async def start_achievement_backfill(
+    achievement_id: int,
+    session: AsyncSessionDep,
+    background_tasks: BackgroundTasks,
+    current_user: Annotated[User, Depends(get_current_user)]
+):
+    require_role(current_user, roles=["admin"])
+    if not await session.get(Achievement, achievement_id):
+        raise HTTPException(status_code=404, detail="Achievement not found")
+    if is_running(achievement_id):
+        raise HTTPException(status_code=409, detail="A backfill of this achievement is already running")
+    job = queue_backfill(achievement_id)
+    background_tasks.add_task(backfill_achievement, achievement_id)
+    return job
+
+
+@router.get("/{achievement_id}/backfill")
+async def read_achievement_backfill(
+    achievement_id: int,
+    current_user: Annotated[User, Depends(get_current_user)]
+):
+    require_role(current_user, roles=["admin"])
+    job = backfill_jobs.get(achievement_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="No backfill of this achievement in this process")
+    return job
+
+
 @router.delete("/{achievement_id}")
 async def delete_achievement(
     achievement_id: int,
     session: AsyncSessionDep,
+    background_tasks: BackgroundTasks,
     current_user: Annotated[User, Depends(get_current_user)]
 ):
     require_role(current_user, roles=["admin"])
@@ -65,8 +121,20 @@ async def delete_achievement(
     if not achievement:
         raise HTTPException(status_code=404, detail="Achievement not found")
 
+    result = await session.exec(
+        select(MedalAchievementLink).where(MedalAchievementLink.achievement_id == achievement_id)
+    )
+    links = result.all()
+    for link in links:
+        await session.delete(link)
     await session.delete(achievement)
     await session.commit()
+    achievement_rules.invalidate()
+    medal_index.invalidate()
+    catalog_cache.invalidate(ACHIEVEMENTS)
+    # The medals it counted towards now need one achievement less
+    if links:
+        background_tasks.add_task(recompute_medals, [link.medal_id for link in links])
     return {"ok": True}
 
 
@@ -77,7 +145,11 @@ async def delete_achievement(
 @router.post("/user/", response_model=UserAchievement)
 async def create_user_achievement(user_achievement: UserAchievement, session: AsyncSessionDep):
     session.add(user_achievement)
-    await session.commit()
+    try:
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(status_code=409, detail="User already has this achievement")
     await session.refresh(user_achievement)
     return user_achievement
 
@@ -85,13 +157,16 @@ async def create_user_achievement(user_achievement: UserAchievement, session: As
 @router.get("/user/", response_model=list[UserAchievementRead])
 async def read_user_achievements(
     session: AsyncSessionDep,
+    response: Response,
     current_user: Annotated[User, Depends(get_current_user)],
     offset: int = 0,
-    limit: Annotated[int, Query(le=100)] = 100,
+    limit: Annotated[int, Query(ge=1, le=100)] = 100,
+    cursor: str | None = None,
 ):
+    # One row per achievement: walks the (user_id, achievement_id) unique index
     query = select(UserAchievement).where(UserAchievement.user_id == current_user.id)
-    result = await session.exec(query.offset(offset).limit(limit))
-    return result.all()
+    result = await session.exec(paginate(query, [UserAchievement.achievement_id], cursor, offset, limit))
+    return page(result.all(), limit, response, key=lambda row: (row.achievement_id,))
 
 
 @router.get("/user/{ua_id}", response_model=UserAchievement)
@@ -107,8 +182,18 @@ async def delete_user_achievement(ua_id: int, session: AsyncSessionDep):
     ua = await session.get(UserAchievement, ua_id)
     if not ua:
         raise HTTPException(status_code=404, detail="UserAchievement not found")
+    await medal_index.ensure_loaded(session)
+    medal_ids = medal_index.by_achievement.get(ua.achievement_id)
+    if medal_ids:
+        # Medals not awarded yet need it again
+        await session.exec(
+            update(UserMedal)
+            .where(UserMedal.user_id == ua.user_id, UserMedal.medal_id.in_(medal_ids), UserMedal.awarded_at == None)
+            .values(remaining=UserMedal.remaining + 1)
+        )
     await session.delete(ua)
     await session.commit()
+    medal_progress_cache.pop(ua.user_id)
     return {"ok": True}
 
 
@@ -116,43 +201,39 @@ async def delete_user_achievement(ua_id: int, session: AsyncSessionDep):
 # CHECK AND GRANT ACHIEVEMENTS
 # -------------------------------
 
-async def check_and_grant_achievements(session: AsyncSessionDep, user: User, habit: Habit, streak: Streak):
-    achievements_result = await session.exec(select(Achievement))
-    achievements = achievements_result.all()
-
-    obtained_result = await session.exec(
-        select(UserAchievement.achievement_id).where(UserAchievement.user_id == user.id)
+async def check_and_grant_achievements(
+    session: AsyncSessionDep,
+    user: User,
+    transitions,
+):
+    # Runs inside the caller's transaction; the caller commits, then drops
+    # the user's medal_progress_cache entry if anything was granted
+    await achievement_rules.ensure_loaded(session)
+    triggered = achievement_rules.triggered(transitions)
+    if not triggered:
+        return []
+
+    # One row per (user, achievement): the unique index skips the ones the
+    # user already has, also when a concurrent request granted them first
+    now = datetime.utcnow()
+    result = await session.exec(
+        sqlite_insert(UserAchievement).values([
+            {"user_id": user.id, "achievement_id": ach_id, "habit_id": transition.habit_id,
+             "obtained": True, "created_at": now}
+            for ach_id, transition in triggered.items()
+        ])
+        .on_conflict_do_nothing(index_elements=["user_id", "achievement_id"])
+        .returning(UserAchievement.achievement_id)
     )
-    obtained_ids = set(obtained_result.all())
-
-    wallet_result = await session.exec(select(UserWallet).where(UserWallet.user_id == user.id))
-    wallet = wallet_result.first()
-
-    for ach in achievements:
-        if ach.id in obtained_ids:
-            continue
-
-        cond = ach.condition if isinstance(ach.condition, dict) else json.loads(ach.condition)
-        if check_condition(cond, streak, user):
-            ua1 = UserAchievement(
-                user_id=user.id,
-                achievement_id=ach.id,
-                habit_id=habit.id,
-                obtained=True
-            )
-            session.add(ua1)
-
-            ua2 = UserAchievement(
-                user_id=user.id,
-                achievement_id=ach.id,
-                habit_id=None,
-                obtained=True
-            )
-            session.add(ua2)
-
-            if wallet:
-                gems_reward = getattr(ach, "gems_reward", 1)
-                wallet.gems += gems_reward
-                session.add(wallet)
-
-    await session.commit()
+    inserted = set(result.scalars().all())
+    granted_ids = [ach_id for ach_id in triggered if ach_id in inserted]
+
+    await apply_changes_async(session, user.id, [
+        ("gems", achievement_rules.gems_rewards[ach_id], f"achievement:{ach_id}") for ach_id in granted_ids
+    ], "achievement")
+
+    # Medal XP can in turn complete XP / level achievements
+    caused = await award_medals(session, user, granted_ids)
+    if caused:
+        granted_ids += await check_and_grant_achievements(session, user, caused)
+    return granted_ids
@@ -5,7 +5,7 @@ from typing import Annotated
 from ..core.config import ACCESS_TOKEN_EXPIRE_MINUTES
 from ..core.security import create_access_token
 from ..shemas.auth import Token, LoginRequest
-from ..utils.users import authenticate_user
+from ..utils.users import authenticate_user, authenticate_user_async
 from ..db.session import SessionDep
 
 router = APIRouter()
@@ -31,7 +31,7 @@ async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
     session: SessionDep
 ):
-    user = authenticate_user(session, form_data.username, form_data.password)
+    user = await authenticate_user_async(session, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1,16 +1,37 @@
 from typing import Annotated
-from fastapi import APIRouter, Query, HTTPException, Depends
+from fastapi import APIRouter, Query, HTTPException, Depends, Response
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import select
-from ..db.models import Habit, User, Streak, UserAchievement, UserWallet
+from ..db.models import Habit, User, Streak, UserAchievement, HabitCompletion
 from ..db.response_model import HabitWithStreak
-from ..db.session import SessionDep
+from ..shemas.habit import BatchCompleteRequest, BatchCompleteResponse, HabitCompletionResult
+from ..db.session import SessionDep, AsyncSessionDep
 from ..utils.dependencies import get_current_user
-from datetime import date, timedelta
-from math import floor
+from datetime import date, datetime, timedelta
+from ..core.config import BATCH_MAX_BACKDATE_DAYS
 from .achievements import check_and_grant_achievements
+from ..utils.achievement_rules import Transition
+from ..utils.user_cache import invalidate_user
+from ..utils.leaderboard import leaderboard
+from ..utils.medal_engine import medal_progress_cache
+from ..utils.xp_buckets import add_xp, add_xp_by_day
+from ..utils.wallet import apply_changes_async
+from ..utils.users import add_user_xp
+from ..utils.quest_engine import advance_quests
+from ..utils.streaks import advance_streak, completion_row, is_duplicate_completion, record_completion
+from ..utils.pagination import paginate, page
 
 router = APIRouter()
 
+
+def xp_for_completion(freq: int) -> int:
+    return 5 * freq if freq > 1 else 10
+
+def coins_for_completion(freq: int) -> int:
+    return 10 * freq
+
+
 @router.post("/", response_model=Habit)
 def create_habit(
     habit: Habit,
@@ -18,6 +39,7 @@ def create_habit(
     current_user: Annotated[User, Depends(get_current_user)],
 ) -> Habit:
     habit.owner_id = current_user.id
+    habit.created_at = datetime.utcnow()
     session.add(habit)
     session.commit()
     session.refresh(habit)
@@ -31,29 +53,29 @@ def create_habit(
     )
     session.add(streak)
     session.commit()
+    session.refresh(habit)
     return habit
 
 
 @router.post("/{habit_id}/complete", response_model=Habit)
-def complete_habit(
+async def complete_habit(
     habit_id: int,
-    session: SessionDep,
+    session: AsyncSessionDep,
     current_user: Annotated[User, Depends(get_current_user)],
 ) -> Habit:
-    db_habit = session.get(Habit, habit_id)
-    if not db_habit:
+    result = await session.exec(
+        select(Habit, Streak)
+        .outerjoin(Streak, (Streak.habit_id == Habit.id) & (Streak.user_id == current_user.id))
+        .where(Habit.id == habit_id)
+    )
+    row = result.first()
+    if not row:
         raise HTTPException(status_code=404, detail="Habit not found")
+    db_habit, streak = row
 
     if db_habit.owner_id != current_user.id and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not enough permissions")
 
-    streak = session.exec(
-        select(Streak).where(
-            Streak.habit_id == habit_id,
-            Streak.user_id == current_user.id
-        )
-    ).first()
-
     if not streak:
         raise HTTPException(status_code=404, detail="Streak not found")
 
@@ -63,70 +85,210 @@ def complete_habit(
     if streak.last_completed == today:
         raise HTTPException(status_code=400, detail="Habit already completed today")
 
+    old_streak = streak.current_streak
+    record_completion(session, streak, freq, today)
+    try:
+        # The log's unique index catches a concurrent completion of the same
+        # day that passed the check above
+        await session.flush()
+    except IntegrityError as exc:
+        await session.rollback()
+        if not is_duplicate_completion(exc):
+            raise
+        raise HTTPException(status_code=400, detail="Habit already completed today")
 
-    if streak.last_completed == today - timedelta(days=freq):
-        streak.current_streak += 1
-    else:
-        streak.current_streak = 1
+    result = await session.exec(select(User).where(User.id == current_user.id))
+    user = result.one()
+    xp_gained = xp_for_completion(freq)
+    old_xp, old_level = await add_user_xp(session, user, xp_gained)
+    await session.exec(add_xp(user.id, xp_gained, today))
 
-    streak.last_completed = today
-    if streak.current_streak > streak.longest_streak:
-        streak.longest_streak = streak.current_streak
+    await apply_changes_async(
+        session, user.id, [("coins", coins_for_completion(freq), f"habit:{habit_id}")], "habit_completion"
+    )
 
-    session.add(streak)
+    transitions = [
+        Transition("streak", old_streak, streak.current_streak, habit_id),
+        Transition("xp", old_xp, user.xp, habit_id),
+        Transition("level", old_level, user.level, habit_id),
+        Transition("completions", 0, 1, habit_id),
+    ]
+    _, reward_transitions = await advance_quests(session, user, transitions)
+    granted = await check_and_grant_achievements(session, user, transitions + reward_transitions)
+
+    # Streak, XP/level, coins, quest progress and achievement grants land in one transaction
+    await session.commit()
+    invalidate_user(user.username)
+    leaderboard.update(user.id, user.xp, user.level, user.nickname)
+    if granted:
+        medal_progress_cache.pop(user.id)
 
-    user = session.get(User, current_user.id)
-    xp_gain = 5 * freq if freq > 1 else 10
-    user.xp += xp_gain
-    user.level = floor((user.xp)**0.5 / 10)
-    session.add(user)
+    return db_habit
 
-    wallet = session.exec(select(UserWallet).where(UserWallet.user_id == user.id)).first()
-    if wallet:
-        coins_reward = 10 * freq  
-        wallet.coins += coins_reward
-        session.add(wallet)
 
-    session.commit()
-    session.refresh(user)
-    session.refresh(db_habit)
-    session.refresh(streak)
 
-    check_and_grant_achievements(session, user, db_habit, streak)
+@router.post("/complete/batch", response_model=BatchCompleteResponse)
+async def complete_habits_batch(
+    request: BatchCompleteRequest,
+    session: AsyncSessionDep,
+    current_user: Annotated[User, Depends(get_current_user)],
+) -> BatchCompleteResponse:
+    for _ in range(2):
+        try:
+            return await _complete_batch(request, session, current_user)
+        except IntegrityError as exc:
+            await session.rollback()
+            if not is_duplicate_completion(exc):
+                raise
+    # A concurrent request logged one of the completions first: the second
+    # pass reads its streak and reports that item as already_completed, so
+    # this only happens if the race repeats
+    raise HTTPException(status_code=400, detail="Habit already completed today")
+
+
+async def _complete_batch(request: BatchCompleteRequest, session, current_user: User) -> BatchCompleteResponse:
+    today = date.today()
+    habit_ids = {item.habit_id for item in request.items}
 
-    return db_habit
+    # Ownership and streaks for every habit in the batch in one query
+    result = await session.exec(
+        select(Habit, Streak)
+        .outerjoin(Streak, (Streak.habit_id == Habit.id) & (Streak.user_id == current_user.id))
+        .where(Habit.id.in_(habit_ids))
+    )
+    rows = {habit.id: (habit, streak) for habit, streak in result.all()}
+
+    result = await session.exec(select(User).where(User.id == current_user.id))
+    user = result.one()
+
+    results: list[HabitCompletionResult | None] = [None] * len(request.items)
+    transitions = []
+    xp_gained = coins_gained = 0
+    coin_changes = []
+    xp_items = []  # (habit id, day, xp) in replay order
+    completions = []
+    oldest = today - timedelta(days=BATCH_MAX_BACKDATE_DAYS)
+
+    # Replay in chronological order so offline queues rebuild streaks correctly
+    order = sorted(range(len(request.items)), key=lambda i: request.items[i].completed_on or today)
+    for i in order:
+        item = request.items[i]
+        day = item.completed_on or today
+        habit, streak = rows.get(item.habit_id, (None, None))
+
+        if not habit:
+            status = "not_found"
+        elif habit.owner_id != current_user.id and current_user.role != "admin":
+            status = "forbidden"
+        elif not streak:
+            status = "not_found"
+        elif day > today:
+            status = "future_date"
+        elif day < oldest:
+            status = "too_old"
+        elif habit.created_at and day < habit.created_at.date():
+            status = "before_created"
+        elif streak.last_completed == day:
+            status = "already_completed"
+        elif streak.last_completed and day < streak.last_completed:
+            status = "out_of_order"
+        else:
+            status = "completed"
+
+        if status != "completed":
+            results[i] = HabitCompletionResult(
+                habit_id=item.habit_id,
+                completed_on=day,
+                status=status,
+                current_streak=streak.current_streak if streak and status != "forbidden" else None,
+            )
+            continue
+
+        old_streak = streak.current_streak
+        advance_streak(streak, habit.frequency, day)
+        session.add(streak)
+        completions.append(completion_row(streak, day))
+
+        item_xp = xp_for_completion(habit.frequency)
+        item_coins = coins_for_completion(habit.frequency)
+        xp_gained += item_xp
+        coins_gained += item_coins
+        coin_changes.append(("coins", item_coins, f"habit:{habit.id}"))
+        transitions.append(Transition("streak", old_streak, streak.current_streak, habit.id))
+        transitions.append(Transition("completions", 0, 1, habit.id))
+        xp_items.append((habit.id, day, item_xp))
+
+        results[i] = HabitCompletionResult(
+            habit_id=habit.id,
+            completed_on=day,
+            status=status,
+            current_streak=streak.current_streak,
+            xp_gained=item_xp,
+            coins_gained=item_coins,
+        )
 
+    granted, quests = [], []
+    if xp_gained:
+        # One multi-row INSERT for the log; a row a concurrent request logged
+        # first raises the unique-index IntegrityError handled by the caller
+        await session.exec(insert(HabitCompletion).values(completions))
+        xp, old_level = await add_user_xp(session, user, xp_gained)
+        xp_by_day = {}
+        for habit_id, day, item_xp in xp_items:
+            transitions.append(Transition("xp", xp, xp + item_xp, habit_id))
+            xp += item_xp
+            xp_by_day[day] = xp_by_day.get(day, 0) + item_xp
+        # Back-dated completions count towards the week / month they were made in
+        await session.exec(add_xp_by_day(user.id, xp_by_day))
+        transitions.append(Transition("level", old_level, user.level, transitions[-1].habit_id))
+
+        await apply_changes_async(session, user.id, coin_changes, "habit_completion")
+
+        quests, reward_transitions = await advance_quests(session, user, transitions)
+        granted = await check_and_grant_achievements(session, user, transitions + reward_transitions)
+        await session.commit()
+        invalidate_user(user.username)
+        leaderboard.update(user.id, user.xp, user.level, user.nickname)
+        if granted:
+            medal_progress_cache.pop(user.id)
+
+    return BatchCompleteResponse(
+        results=results,
+        xp_gained=xp_gained,
+        coins_gained=coins_gained,
+        xp=user.xp,
+        level=user.level,
+        achievements=granted,
+        quests=quests,
+    )
 
 
 @router.get("/", response_model=list[HabitWithStreak])
 def read_my_habits(
     session: SessionDep,
+    response: Response,
     current_user: Annotated[User, Depends(get_current_user)],
     offset: int = 0,
-    limit: Annotated[int, Query(le=100)] = 100,
+    limit: Annotated[int, Query(ge=1, le=100)] = 100,
+    cursor: str | None = None,
 ):
-
-    habits = session.exec(
-        select(Habit)
+    # Only the streaks of the habits on this page
+    query = (
+        select(Habit, Streak)
+        .outerjoin(Streak, (Streak.habit_id == Habit.id) & (Streak.user_id == current_user.id))
         .where(Habit.owner_id == current_user.id)
-        .offset(offset)
-        .limit(limit)
-    ).all()
-
-    streaks = session.exec(
-        select(Streak).where(Streak.user_id == current_user.id)
-    ).all()
-
-    streak_map = {s.habit_id: s for s in streaks}
+    )
+    rows = session.exec(paginate(query, [Habit.id], cursor, offset, limit)).all()
+    rows = page(rows, limit, response, key=lambda row: (row[0].id,))
 
     results = []
-    for habit in habits:
+    for habit, streak in rows:
         results.append(HabitWithStreak(
             id=habit.id,
             name=habit.title,
             description=habit.description,
             frequency = habit.frequency,
-            streak=streak_map.get(habit.id)  
+            streak=streak
         ))
 
     return results
@@ -162,6 +324,7 @@ def update_habit(
         raise HTTPException(status_code=403, detail="Not enough permissions")
 
     update_data = updated_habit.dict(exclude_unset=True)
+    update_data.pop("created_at", None)
     for key, value in update_data.items():
         setattr(db_habit, key, value)
 
@@ -190,11 +353,12 @@ def delete_habit(
     if streak:
         session.delete(streak)
 
-    user_achievements = session.exec(
-        select(UserAchievement).where(UserAchievement.habit_id == habit.id)
-    ).all()
-    for ua in user_achievements:
-        session.delete(ua)
+    # Achievements the habit earned stay with the user
+    session.query(UserAchievement).filter(UserAchievement.habit_id == habit.id).update(
+        {UserAchievement.habit_id: None}, synchronize_session=False
+    )
+
+    session.query(HabitCompletion).filter(HabitCompletion.habit_id == habit.id).delete()
 
     session.delete(habit)
     session.commit()
@@ -208,16 +372,17 @@ def delete_habit(
 def read_habits_by_user(
     user_id: int,
     session: SessionDep,
+    response: Response,
     current_user: Annotated[User, Depends(get_current_user)],
     offset: int = 0,
-    limit: Annotated[int, Query(le=100)] = 100,
+    limit: Annotated[int, Query(ge=1, le=100)] = 100,
+    cursor: str | None = None,
 ) -> list[Habit]:
     if current_user.id != user_id and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not enough permissions")
 
-    habits = session.exec(
-        select(Habit).where(Habit.owner_id == user_id).offset(offset).limit(limit)
-    ).all()
+    query = select(Habit).where(Habit.owner_id == user_id)
+    habits = page(session.exec(paginate(query, [Habit.id], cursor, offset, limit)).all(), limit, response)
     if not habits:
         raise HTTPException(status_code=404, detail="No habits found for this user")
     return habits
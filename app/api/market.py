@@ -1,4 +1,4 @@
-from fastapi import HTTPException, APIRouter, Depends
+from fastapi import HTTPException, APIRouter, Depends, Request
 from sqlmodel import select
 from sqlalchemy.exc import IntegrityError
 from ..db.models import User, ShopItem, UserItem, UserWallet
@@ -6,16 +6,25 @@ from ..db.session import SessionDep
 from ..shemas.market import BuyItemRequest
 from typing import Annotated
 from ..utils.dependencies import get_current_user
+from ..utils.catalog_cache import SHOP_ITEMS, catalog_cache
+from ..utils.http_cache import cached_json, render_json
+from ..utils.wallet import CURRENCIES, apply_changes
 
 router = APIRouter()
 
 @router.get("/shop/items/")
 def list_shop_items(
+    request: Request,
     session: SessionDep, 
     current_user: Annotated[User, Depends(get_current_user)], 
 ):
-    items = session.exec(select(ShopItem)).all()
-    return items
+    key = catalog_cache.key(SHOP_ITEMS)
+    entry = catalog_cache.get(key)
+    if entry is None:
+        items = session.exec(select(ShopItem).order_by(ShopItem.id)).all()
+        entry = (*render_json(items), {})
+        catalog_cache.set(key, entry)
+    return cached_json(request, *entry)
 
 @router.get("/shop/items/{item_id}")
 def get_shop_item(
@@ -39,37 +48,46 @@ def buy_item(
     session: SessionDep, 
     current_user: Annotated[User, Depends(get_current_user)], 
 ):
+    if request.currency not in CURRENCIES:
+        raise HTTPException(status_code=400, detail="Invalid currency")
 
     item = session.get(ShopItem, request.item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
 
-    wallet = session.exec(select(UserWallet).where(UserWallet.user_id == current_user.id)).first()
-    if not wallet:
-        raise HTTPException(status_code=404, detail="Wallet not found")
-
-    if request.currency not in ["coins", "gems", "event_tokens"]:
-        raise HTTPException(status_code=400, detail="Invalid currency")
-
-    cost = getattr(item, "price") if request.currency == "coins" else getattr(item, request.currency, 0)
-    current_balance = getattr(wallet, request.currency)
-
-    if current_balance < cost:
-        raise HTTPException(status_code=400, detail=f"Not enough {request.currency}")
+    # Items have one price, in their own currency
+    if request.currency != item.currency:
+        raise HTTPException(status_code=400, detail=f"Item is not sold for {request.currency}")
+    cost = item.price
 
+    # Funds check, XP check and debit are one conditional UPDATE; the extra
+    # lookup below only runs to explain a refusal
+    conditions = []
     if item.need_xp > 0:
-        user = session.get(User, current_user.id)
-        if user.xp < item.need_xp:
-            raise HTTPException(status_code=400, detail="Not enough XP")
+        user_xp = select(User.xp).where(User.id == current_user.id).scalar_subquery()
+        conditions.append(user_xp >= item.need_xp)
+    balances = apply_changes(
+        session, current_user.id, [(request.currency, -cost, f"item:{item.id}")], "purchase", *conditions
+    )
+    if balances is None:
+        balance, xp = session.exec(
+            select(getattr(UserWallet, request.currency), User.xp)
+            .outerjoin(UserWallet, UserWallet.user_id == User.id)
+            .where(User.id == current_user.id)
+        ).one()
+        if balance is None:
+            raise HTTPException(status_code=404, detail="Wallet not found")
+        if balance < cost:
+            raise HTTPException(status_code=400, detail=f"Not enough {request.currency}")
+        raise HTTPException(status_code=400, detail="Not enough XP")
 
     try:
-        setattr(wallet, request.currency, current_balance - cost)
-        session.add(wallet)
         user_item = UserItem(user_id=current_user.id, item_id=item.id, is_equipped=False)
         session.add(user_item)
+        session.flush()
+        user_item_id = user_item.id
         session.commit()
-        session.refresh(user_item)
-        return {"success": True, "message": "Item purchased successfully", "user_item_id": user_item.id}
+        return {"success": True, "message": "Item purchased successfully", "user_item_id": user_item_id}
     except IntegrityError:
         session.rollback()
         raise HTTPException(status_code=500, detail="Failed to purchase item")
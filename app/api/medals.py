@@ -1,10 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status
 from typing import List
-from ..db.models import Medal, User, Role, MedalAchievementLink
-from ..shemas.medal import MedalCreate, MedalOut, MedalUpdate
+from sqlalchemy import delete
+from sqlmodel import select
+from ..db.models import Achievement, Medal, User, Role, MedalAchievementLink, UserMedal
+from ..shemas.medal import MedalCreate, MedalOut, MedalProgress, MedalUpdate
 from ..utils.dependencies import get_current_user
 from ..utils.users import require_role
 from ..db.session import SessionDep
+from ..utils.medal_engine import medal_index, medal_progress, medal_progress_cache, recompute_medals
+from ..utils.catalog_cache import MEDALS, catalog_cache
+from ..utils.http_cache import cached_json, render_json
 
 router = APIRouter()
 
@@ -20,16 +25,36 @@ def create_medal(
     session.add(medal)
     session.commit()
     session.refresh(medal)
+    medal_progress_cache.clear()
+    catalog_cache.invalidate(MEDALS)
     return medal
 
 
 @router.get("/", response_model=List[MedalOut])
 def list_medals(
+    request: Request,
     session: SessionDep,
     current_user: User = Depends(get_current_user),
 ):
-    medals = session.query(Medal).all()
-    return medals
+    key = catalog_cache.key(MEDALS)
+    entry = catalog_cache.get(key)
+    if entry is None:
+        medals = session.exec(select(Medal).order_by(Medal.id)).all()
+        entry = (*render_json([MedalOut.model_validate(medal) for medal in medals]), {})
+        catalog_cache.set(key, entry)
+    return cached_json(request, *entry)
+
+
+@router.get("/progress", response_model=List[MedalProgress])
+def read_medal_progress(
+    session: SessionDep,
+    current_user: User = Depends(get_current_user),
+):
+    progress = medal_progress_cache.get(current_user.id)
+    if progress is None:
+        progress = medal_progress(session, current_user.id)
+        medal_progress_cache.set(current_user.id, progress)
+    return progress
 
 
 @router.get("/{medal_id}", response_model=MedalOut)
@@ -38,7 +63,7 @@ def get_medal(
     session: SessionDep,
     current_user: User = Depends(get_current_user),
 ):
-    medal = session.query(Medal).filter(Medal.id == medal_id).first()
+    medal = session.get(Medal, medal_id)
     if not medal:
         raise HTTPException(status_code=404, detail="Medal not found")
     return medal
@@ -52,13 +77,16 @@ def update_medal(
     current_user: User = Depends(get_current_user),
 ):
     require_role(current_user, [Role.admin])
-    medal = session.query(Medal).filter(Medal.id == medal_id).first()
+    medal = session.get(Medal, medal_id)
     if not medal:
         raise HTTPException(status_code=404, detail="Medal not found")
     for field, value in medal_in.dict(exclude_unset=True).items():
         setattr(medal, field, value)
     session.commit()
     session.refresh(medal)
+    medal_index.invalidate()
+    medal_progress_cache.clear()
+    catalog_cache.invalidate(MEDALS)
     return medal
 
 
@@ -69,12 +97,16 @@ def delete_medal(
     current_user: User = Depends(get_current_user),
 ):
     require_role(current_user, [Role.admin])
-    medal = session.query(Medal).filter(Medal.id == medal_id).first()
+    medal = session.get(Medal, medal_id)
     if not medal:
         raise HTTPException(status_code=404, detail="Medal not found")
-    session.query(MedalAchievementLink).filter(MedalAchievementLink.medal_id == medal_id).delete()
+    session.execute(delete(MedalAchievementLink).where(MedalAchievementLink.medal_id == medal_id))
+    session.execute(delete(UserMedal).where(UserMedal.medal_id == medal_id))
     session.delete(medal)
     session.commit()
+    medal_index.invalidate()
+    medal_progress_cache.clear()
+    catalog_cache.invalidate(MEDALS)
     return {"ok": True}
 
 @router.post("/{medal_id}/achievements/{achievement_id}", status_code=status.HTTP_201_CREATED)
@@ -82,15 +114,23 @@ def link_achievement_to_medal(
     medal_id: int,
     achievement_id: int,
     session: SessionDep,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
 ):
     require_role(current_user, [Role.admin])
-    medal = session.query(Medal).filter(Medal.id == medal_id).first()
+    medal = session.get(Medal, medal_id)
     if not medal:
         raise HTTPException(status_code=404, detail="Medal not found")
+    if not session.get(Achievement, achievement_id):
+        raise HTTPException(status_code=404, detail="Achievement not found")
+    if session.get(MedalAchievementLink, (medal_id, achievement_id)):
+        raise HTTPException(status_code=409, detail="Achievement already linked to this medal")
     achievement_link = MedalAchievementLink(medal_id=medal_id, achievement_id=achievement_id)
     session.add(achievement_link)
     session.commit()
+    # Every user's progress on the medal changes
+    medal_index.invalidate()
+    background_tasks.add_task(recompute_medals, [medal_id])
     return {"ok": True}
 
 @router.delete("/{medal_id}/achievements/{achievement_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -98,19 +138,19 @@ def unlink_achievement_from_medal(
     medal_id: int,
     achievement_id: int,
     session: SessionDep,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
 ):
     require_role(current_user, [Role.admin])
-    medal = session.query(Medal).filter(Medal.id == medal_id).first()
+    medal = session.get(Medal, medal_id)
     if not medal:
         raise HTTPException(status_code=404, detail="Medal not found")
-    achievement_link = session.query(MedalAchievementLink).filter(
-        MedalAchievementLink.medal_id == medal_id,
-        MedalAchievementLink.achievement_id == achievement_id
-    ).first()
+    achievement_link = session.get(MedalAchievementLink, (medal_id, achievement_id))
     if not achievement_link:
         raise HTTPException(status_code=404, detail="Link not found")
     session.delete(achievement_link)
     session.commit()
+    medal_index.invalidate()
+    background_tasks.add_task(recompute_medals, [medal_id])
     return {"ok": True}
 
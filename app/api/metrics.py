@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from ..utils.metrics import metrics, render_cache_stats
+from ..utils.user_cache import user_cache_stats
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def read_metrics():
+    body = metrics.render() + render_cache_stats(user_cache_stats())
+    return PlainTextResponse(body, media_type=PROMETHEUS_CONTENT_TYPE)
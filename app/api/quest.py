@@ -1,12 +1,21 @@
-from datetime import datetime  
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import date, datetime
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import func
 from sqlmodel import select
-from ..db.models import Quest, User, UserQuest, UserWallet, Streak
-from ..db.session import SessionDep
+from ..db.models import Quest, User, UserQuest, Streak
+from ..db.session import SessionDep, AsyncSessionDep
+from ..shemas.quest import QuestProgress
 from typing import Annotated
 from ..utils.dependencies import get_current_user
 from ..utils.users import require_role
-from ..utils.check_condition import check_condition
+from ..utils.user_cache import invalidate_user
+from ..utils.leaderboard import leaderboard
+from ..utils.medal_engine import medal_progress_cache
+from ..utils.achievement_rules import Transition
+from ..utils.quest_engine import quest_index, advance_quests, COUNTER_FIELDS
+from ..utils.quest_cache import active_quests
+from ..utils.http_cache import cached_json
+from .achievements import check_and_grant_achievements
 router = APIRouter()
 
 @router.post("/", response_model=Quest)
@@ -20,33 +29,66 @@ def create_quest(
     session.add(quest)
     session.commit()
     session.refresh(quest)
+    quest_index.invalidate()
+    active_quests.invalidate()
     return quest
 
 
 @router.get("/", response_model=list[Quest])
 def read_quests(
+    request: Request,
     session: SessionDep,
     current_user: Annotated[User, Depends(get_current_user)]
 ):
     now = datetime.utcnow()
-    quests = session.exec(
-        select(Quest).where(
-            Quest.is_active == True,
-            (Quest.start_date == None) | (Quest.start_date <= now),
-            (Quest.end_date == None) | (Quest.end_date >= now),
-        )
-    ).all()
-    return quests
+    body, etag = active_quests.get(now) or active_quests.load(session, now)
+    return cached_json(request, body, etag)
+
+
+@router.get("/progress", response_model=list[QuestProgress])
+async def read_quest_progress(
+    session: AsyncSessionDep,
+    current_user: Annotated[User, Depends(get_current_user)]
+):
+    await quest_index.ensure_loaded(session)
+    now = datetime.utcnow()
+    result = await session.exec(
+        select(UserQuest, Quest.title)
+        .join(Quest, Quest.id == UserQuest.quest_id)
+        .where(UserQuest.user_id == current_user.id, UserQuest.quest_id.in_(list(quest_index.rules)))
+    )
+    progress = []
+    for user_quest, title in result.all():
+        rule = quest_index.rules[user_quest.quest_id]
+        if not rule.running(now):
+            continue
+        if user_quest.period_start != rule.period(date.today()):
+            # Last period's row; this period has no progress yet
+            user_quest = UserQuest(quest_id=rule.quest_id, progress=0, completed=False)
+        progress.append(QuestProgress(
+            quest_id=rule.quest_id,
+            title=title,
+            field=rule.field,
+            operator=rule.operator,
+            target=rule.value,
+            progress=user_quest.progress,
+            completed=user_quest.completed,
+            completed_at=user_quest.completed_at,
+            end_date=rule.end_date,
+        ))
+    return progress
 
 
 @router.post("/{quest_id}/complete")
-def complete_quest(
+async def complete_quest(
     quest_id: int,
-    session: SessionDep,
-    streak: Streak,
+    session: AsyncSessionDep,
     current_user: Annotated[User, Depends(get_current_user)]
 ):
-    quest = session.get(Quest, quest_id)
+    # Quests complete on their own as habit and XP events come in; this
+    # re-checks one quest against the user's current state, e.g. an XP quest
+    # the user already qualified for when it was published
+    quest = await session.get(Quest, quest_id)
     if not quest or not quest.is_active:
         raise HTTPException(status_code=404, detail="Quest not found or inactive")
 
@@ -55,38 +97,40 @@ def complete_quest(
         raise HTTPException(status_code=400, detail="Quest not started yet")
     if quest.end_date and now > quest.end_date:
         raise HTTPException(status_code=400, detail="Quest expired")
-    if quest.is_active is False:
-        raise HTTPException(status_code=400, detail="Quest is inactive")
-    
-    if not check_condition(quest.condition, streak, current_user):
-        raise HTTPException(status_code=400, detail="Quest conditions not met")
 
-    user_quest = session.exec(
-        select(UserQuest).where(
+    await quest_index.ensure_loaded(session)
+    rule = quest_index.rules.get(quest_id)
+    result = await session.exec(
+        select(UserQuest.completed).where(
             UserQuest.user_id == current_user.id,
-            UserQuest.quest_id == quest_id
+            UserQuest.quest_id == quest_id,
+            UserQuest.period_start == (rule.period(date.today()) if rule else None),
         )
-    ).first()
-
-    if user_quest and user_quest.completed:
+    )
+    if result.first():
         raise HTTPException(status_code=400, detail="Quest already completed")
 
-    if not user_quest:
-        user_quest = UserQuest(user_id=current_user.id, quest_id=quest_id)
+    if rule is None or rule.field in COUNTER_FIELDS:
+        raise HTTPException(status_code=400, detail="Quest conditions not met")
 
-    user_quest.completed = True
-    user_quest.completed_at = now
+    result = await session.exec(select(User).where(User.id == current_user.id))
+    user = result.one()
+    if rule.field == "streak":
+        result = await session.exec(select(func.max(Streak.current_streak)).where(Streak.user_id == user.id))
+        current = result.one() or 0
+    else:
+        current = getattr(user, rule.field)
 
-    current_user.xp += quest.xp_reward
-    wallet = session.exec(
-        select(UserWallet).where(UserWallet.user_id == current_user.id)
-    ).first()
-    if wallet:
-        wallet.coins += quest.coin_reward
-        wallet.event_tokens += quest.event_tokens_reward
+    completed, transitions = await advance_quests(session, user, [Transition(rule.field, None, current)])
+    if quest_id not in completed:
+        raise HTTPException(status_code=400, detail="Quest conditions not met")
+    granted = await check_and_grant_achievements(session, user, transitions)
 
-    session.add_all([user_quest, current_user, wallet])
-    session.commit()
+    await session.commit()
+    invalidate_user(user.username)
+    leaderboard.update(user.id, user.xp, user.level, user.nickname)
+    if granted:
+        medal_progress_cache.pop(user.id)
     return {"message": "Quest completed", "rewards": quest}
 
 
@@ -105,4 +149,6 @@ def delete_quest(
     quest.is_active = False
     session.add(quest)
     session.commit()
+    quest_index.invalidate()
+    active_quests.invalidate()
     return {"message": "Quest deactivated"}
@@ -1,10 +1,11 @@
 from typing import Annotated
-from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi import APIRouter, HTTPException, Query, Depends, Response
 from sqlmodel import select
 from ..db.session import SessionDep
 from ..db.models import Streak
 from ..db.models import User
 from ..utils.dependencies import get_current_user
+from ..utils.pagination import paginate, page
 
 
 router = APIRouter()
@@ -12,18 +13,20 @@ router = APIRouter()
 @router.get("", response_model=list[Streak])
 def read_streaks(
     session: SessionDep,
+    response: Response,
     current_user: Annotated[User, Depends(get_current_user)],
     user_id: int | None = None,
     habit_id: int | None = None,
     offset: int = 0,
-    limit: Annotated[int, Query(le=100)] = 100
+    limit: Annotated[int, Query(ge=1, le=100)] = 100,
+    cursor: str | None = None,
 ):
     query = select(Streak)
     if user_id:
         query = query.where(Streak.user_id == user_id)
     if habit_id:
         query = query.where(Streak.habit_id == habit_id)
-    return session.exec(query.offset(offset).limit(limit)).all()
+    return page(session.exec(paginate(query, [Streak.id], cursor, offset, limit)).all(), limit, response)
 
 @router.get("/{streak_id}", response_model=Streak)
 def read_streak(streak_id: int, session: SessionDep, current_user: Annotated[User, Depends(get_current_user)]):
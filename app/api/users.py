@@ -1,26 +1,33 @@
-from typing import Annotated
-from fastapi import HTTPException, Depends   
+from typing import Annotated, Literal
+from datetime import date
+from fastapi import HTTPException, Depends, Response, Query
 from sqlmodel import select
 from fastapi import APIRouter
 from ..db.models import User, UserWallet, UserItem, ShopItem
 from ..shemas.market import EquipItemRequest
+from ..shemas.user import LeaderboardEntry, LeaderboardWindow
 from ..db.session import SessionDep
-from ..core.security import get_password_hash
+from ..core.security import get_password_hash_async
 from ..utils.dependencies import get_current_user
 from ..utils.users import require_role
+from ..utils.user_cache import invalidate_user
+from ..utils.pagination import paginate, page
+from ..utils.leaderboard import leaderboard
+from ..utils.xp_buckets import period_top, period_around
 
 
 router = APIRouter()
 
 @router.post("/", response_model=User)
-def create_user(
+async def create_user(
     user: User,
     session: SessionDep,
     current_user: Annotated[User, Depends(get_current_user)], 
 ) -> User:
     require_role(current_user, roles="admin") 
 
-    user.password = get_password_hash(user.password)
+    # Hashed on the bcrypt pool before the session takes a connection
+    user.password = await get_password_hash_async(user.password)
     session.add(user)
     session.commit()
     session.refresh(user)
@@ -29,6 +36,7 @@ def create_user(
     session.add(wallet)
     session.commit()
     session.refresh(wallet)
+    leaderboard.update(user.id, user.xp, user.level, user.nickname)
 
     return user
 
@@ -36,13 +44,15 @@ def create_user(
 @router.get("/", response_model=list[User])
 def read_users(
     session: SessionDep,
+    response: Response,
     current_user: Annotated[User, Depends(get_current_user)], 
     offset: int = 0,
-    limit: int = 100,
+    limit: Annotated[int, Query(ge=1, le=100)] = 100,
+    cursor: str | None = None,
 ):
     require_role(current_user, roles="admin") 
-    users = session.exec(select(User).offset(offset).limit(limit)).all()
-    return users
+    users = session.exec(paginate(select(User), [User.id], cursor, offset, limit)).all()
+    return page(users, limit, response)
 
 
 @router.get("/{user_id}", response_model=User)
@@ -67,8 +77,11 @@ def delete_user(
     user = session.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    username = user.username
     session.delete(user)
     session.commit()
+    invalidate_user(username)
+    leaderboard.remove(user_id)
     return {"ok": True}
 
 
@@ -79,35 +92,61 @@ def read_users_me(
     return current_user
 
 @router.put("/update-password/", response_model=User)
-def update_password(
+async def update_password(
     new_password: str,
     session: SessionDep,
     current_user: Annotated[User, Depends(get_current_user)],
 ):
+    password = await get_password_hash_async(new_password)
     user = session.get(User, current_user.id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    user.password = get_password_hash(new_password)
+    user.password = password
     session.add(user)
     session.commit()
     session.refresh(user)
+    invalidate_user(user.username)
     return user
 
 # -----------------------------
 # Users leaderboard
 # -----------------------------
 
-@router.get("/leaderboard/", response_model=list[User])
+# period=all ranks lifetime XP from memory; week/month rank the XP earned in
+# the ISO week / month containing `day` (default today)
+Period = Literal["all", "week", "month"]
+
+@router.get("/leaderboard/", response_model=list[LeaderboardEntry])
 def read_leaderboard(
     current_user: Annotated[User, Depends(get_current_user)], 
     session: SessionDep,
     limit: int = 10,
+    period: Period = "all",
+    day: date | None = None,
 ):
-    users = session.exec(
-        select(User).order_by(User.xp.desc()).limit(limit)
-    ).all()
+    if period != "all":
+        return period_top(session, period, day or date.today(), limit)
+    leaderboard.ensure_loaded()
+    return leaderboard.top(limit)
+
 
-    return users
+@router.get("/leaderboard/me/", response_model=LeaderboardWindow)
+def read_leaderboard_around_me(
+    current_user: Annotated[User, Depends(get_current_user)], 
+    session: SessionDep,
+    window: Annotated[int, Query(ge=0, le=50)] = 5,
+    period: Period = "all",
+    day: date | None = None,
+):
+    if period != "all":
+        rank, total, entries = period_around(session, period, day or date.today(), current_user.id, window)
+    else:
+        leaderboard.ensure_loaded()
+        rank, entries = leaderboard.around(current_user.id, window)
+        total = len(leaderboard)
+    if rank is None:
+        raise HTTPException(status_code=404, detail="User not on the leaderboard")
+    return LeaderboardWindow(rank=rank, total=total, entries=entries)
 
 # -----------------------------
 # User wallet
@@ -6,3 +6,76 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY", "dev_secret")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", 60))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", 10000))
+
+# Password hashing pool: "thread" or "process"
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR", "thread")
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", 4))
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", 64))
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///database.db")
+DATABASE_ECHO = os.getenv("DATABASE_ECHO", "false").lower() in ("1", "true", "yes")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+
+# Applied to every new SQLite connection; an empty value keeps SQLite's default
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"),
+    "cache_size": os.getenv("SQLITE_CACHE_SIZE", "-20000"),
+    "mmap_size": os.getenv("SQLITE_MMAP_SIZE", "268435456"),
+}
+
+# Batch habit completion: how many days back an offline completion may be dated
+BATCH_MAX_BACKDATE_DAYS = int(os.getenv("BATCH_MAX_BACKDATE_DAYS", 7))
+
+# In-process nightly jobs (streak expiry, ...); local time, HH:MM
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() in ("1", "true", "yes")
+NIGHTLY_JOBS_AT = os.getenv("NIGHTLY_JOBS_AT", "00:05")
+# Rebuild the in-memory leaderboard from the database every N seconds (0 = off);
+# only needed when several workers change XP
+LEADERBOARD_REFRESH_SECONDS = int(os.getenv("LEADERBOARD_REFRESH_SECONDS", 0))
+
+# Per-request SQL accounting: X-DB-* response headers in debug mode, and a
+# warning when a request exceeds the statement budget or repeats one shape
+DEBUG = os.getenv("DEBUG", "false").lower() in ("1", "true", "yes")
+SQL_QUERY_BUDGET = int(os.getenv("SQL_QUERY_BUDGET", 25))
+SQL_REPEAT_LIMIT = int(os.getenv("SQL_REPEAT_LIMIT", 5))
+
+# Periodic XP leaderboards: buckets older than this many weeks / months are dropped
+XP_WEEK_RETENTION = int(os.getenv("XP_WEEK_RETENTION", 12))
+XP_MONTH_RETENTION = int(os.getenv("XP_MONTH_RETENTION", 24))
+
+# Daily/weekly quest rotation: rows are assigned to users who completed a habit
+# in the last QUEST_ACTIVE_DAYS days (0 = every user), QUEST_ROTATION_CHUNK
+# users per transaction with a pause between chunks for online writers
+QUEST_ACTIVE_DAYS = int(os.getenv("QUEST_ACTIVE_DAYS", 30))
+QUEST_ROTATION_CHUNK = int(os.getenv("QUEST_ROTATION_CHUNK", 2000))
+QUEST_ROTATION_PAUSE = float(os.getenv("QUEST_ROTATION_PAUSE", 0.02))
+# The cached active quest list is rebuilt when a quest starts or ends, on quest
+# writes, and at least this often (picks up writes made by other workers; 0 = never)
+QUEST_CACHE_MAX_AGE_SECONDS = int(os.getenv("QUEST_CACHE_MAX_AGE_SECONDS", 300))
+# Rendered shop item, medal and achievement lists; dropped on admin writes
+CATALOG_CACHE_MAX_AGE_SECONDS = int(os.getenv("CATALOG_CACHE_MAX_AGE_SECONDS", 300))
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", 1000))
+
+# Granting a new achievement to users who already qualify: users per
+# transaction, and the pause between transactions for online writers
+ACHIEVEMENT_BACKFILL_CHUNK = int(os.getenv("ACHIEVEMENT_BACKFILL_CHUNK", 2000))
+ACHIEVEMENT_BACKFILL_PAUSE = float(os.getenv("ACHIEVEMENT_BACKFILL_PAUSE", 0.02))
+# Recomputing medal progress after medal links change: users per transaction
+# and the pause between transactions
+MEDAL_RECOMPUTE_CHUNK = int(os.getenv("MEDAL_RECOMPUTE_CHUNK", 2000))
+MEDAL_RECOMPUTE_PAUSE = float(os.getenv("MEDAL_RECOMPUTE_PAUSE", 0.02))
+# Per-user /medals/progress cache; dropped on the user's achievement grants
+MEDAL_PROGRESS_CACHE_TTL_SECONDS = int(os.getenv("MEDAL_PROGRESS_CACHE_TTL_SECONDS", 60))
+MEDAL_PROGRESS_CACHE_SIZE = int(os.getenv("MEDAL_PROGRESS_CACHE_SIZE", 10000))
+
+# Idempotency-Key support on reward-granting POSTs: stored responses are kept
+# this long; a key whose first request never finished is freed after the lock
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 86400))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", 60))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", 10000))
@@ -1,16 +1,79 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 import jwt
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
-from .config import SECRET_KEY, ALGORITHM
+from .config import SECRET_KEY, ALGORITHM, HASH_EXECUTOR, HASH_WORKERS, HASH_QUEUE_SIZE
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-def verify_password(plain_password, hashed_password):
+
+# Module-level so they can be pickled into a process pool
+def _verify(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
-def get_password_hash(password):
+def _hash(password):
     return pwd_context.hash(password)
 
+
+class HashingExecutor:
+    def __init__(self, kind: str, workers: int, queue_size: int):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown HASH_EXECUTOR {kind!r}, expected 'thread' or 'process'")
+        self.kind = kind
+        self.workers = workers
+        # Running + queued jobs; anything beyond that is rejected instead of piling up
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    pool_class = ThreadPoolExecutor if self.kind == "thread" else ProcessPoolExecutor
+                    self._executor = pool_class(max_workers=self.workers)
+        return self._executor
+
+    def submit(self, fn, *args) -> Future:
+        if not self._slots.acquire(blocking=False):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many password operations in progress",
+                headers={"Retry-After": "1"},
+            )
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+hashing_executor = HashingExecutor(HASH_EXECUTOR, HASH_WORKERS, HASH_QUEUE_SIZE)
+
+# Blocking variants: only call these from sync routes (they run in the threadpool)
+def verify_password(plain_password, hashed_password):
+    return hashing_executor.submit(_verify, plain_password, hashed_password).result()
+
+def get_password_hash(password):
+    return hashing_executor.submit(_hash, password).result()
+
+async def verify_password_async(plain_password, hashed_password):
+    return await asyncio.wrap_future(hashing_executor.submit(_verify, plain_password, hashed_password))
+
+async def get_password_hash_async(password):
+    return await asyncio.wrap_future(hashing_executor.submit(_hash, password))
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=15))
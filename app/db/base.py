@@ -1,16 +1,66 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlmodel import create_engine
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.orm import sessionmaker
+from ..core.config import DATABASE_URL, DATABASE_ECHO, DB_POOL_SIZE, DB_MAX_OVERFLOW, SQLITE_PRAGMAS
 
-sqlite_file_name = "database.db"
-sqlite_url = f"sqlite:///{sqlite_file_name}"
+
+def to_async_url(url: str) -> str:
+    parsed = make_url(url)
+    if parsed.drivername in ("sqlite", "sqlite+pysqlite"):
+        parsed = parsed.set(drivername="sqlite+aiosqlite")
+    return parsed.render_as_string(hide_password=False)
+
+
+sqlite_url = DATABASE_URL
 # For async
-sqlite_async_url = f"sqlite+aiosqlite:///{sqlite_file_name}"
+sqlite_async_url = to_async_url(sqlite_url)
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        if value:
+            cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+
+def _engine_options(url: str, options: dict) -> dict:
+    options.setdefault("echo", DATABASE_ECHO)
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        options.setdefault("connect_args", {"check_same_thread": False})
+        in_memory = parsed.database in (None, "", ":memory:")
+        if not in_memory and "poolclass" not in options:
+            options.setdefault("pool_size", DB_POOL_SIZE)
+            options.setdefault("max_overflow", DB_MAX_OVERFLOW)
+    return options
+
+
+def make_engine(url: str = sqlite_url, **options):
+    engine = create_engine(url, **_engine_options(url, options))
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", set_sqlite_pragmas)
+    return engine
+
+
+def make_async_engine(url: str = sqlite_async_url, **options):
+    engine = create_async_engine(url, **_engine_options(url, options))
+    if engine.dialect.name == "sqlite":
+        event.listen(engine.sync_engine, "connect", set_sqlite_pragmas)
+    return engine
+
+
+def is_locked(exc) -> bool:
+    # OperationalError raised when busy_timeout ran out waiting for the lock
+    return "database is locked" in str(exc.orig) or "database is busy" in str(exc.orig)
+
 
-connect_args = {"check_same_thread": False}
-engine = create_engine(sqlite_url, connect_args=connect_args)
+engine = make_engine(sqlite_url)
 
-async_engine = create_async_engine(sqlite_async_url, echo=True) 
+async_engine = make_async_engine(sqlite_async_url)
 
 AsyncSessionLocal = sessionmaker(
     bind=async_engine,
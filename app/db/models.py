@@ -2,7 +2,7 @@ from sqlmodel import SQLModel, Field, Relationship
 from datetime import datetime, date
 from enum import Enum
 from typing import Optional, List
-from sqlalchemy import Column
+from sqlalchemy import Column, Index
 from .response_model import JSONEncodedDict
 
 class Role(str, Enum):
@@ -24,7 +24,7 @@ class User(SQLModel, table=True):
     nickname: Optional[str] = Field(default="User")
     password: str
     role: Role = Field(default=Role.user)
-    xp: int = Field(default=0)
+    xp: int = Field(default=0, index=True)
     level: int = Field(default=1)
 
 
@@ -38,7 +38,8 @@ class Habit(SQLModel, table=True):
     description: Optional[str] = Field(default=None)
     is_active: bool = Field(default=True)
     frequency: int = Field(default=1) 
-    owner_id: Optional[int] = Field(default=None, foreign_key="users.id")
+    owner_id: Optional[int] = Field(default=None, foreign_key="users.id", index=True)
+    created_at: Optional[datetime] = Field(default=None)  # NULL for habits created before it was recorded
 
     owner: Optional[User] = Relationship(back_populates="habits")
 
@@ -53,23 +54,58 @@ class Achievement(SQLModel, table=True):
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class UserAchievement(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_userachievement_user_achievement", "user_id", "achievement_id", unique=True),
+    )
+
     id: int = Field(primary_key=True)
     user_id: int = Field(foreign_key="users.id")
     achievement_id: int = Field(foreign_key="achievements.id")
-    habit_id: int | None = Field(default=None, foreign_key="habits.id")
+    # The habit whose completion earned it; None for other triggers and deleted habits
+    habit_id: int | None = Field(default=None, foreign_key="habits.id", index=True)
     obtained: bool = False
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class Streak(SQLModel, table=True):
     __tablename__ = "streaks"
+    __table_args__ = (
+        Index("ix_streaks_user_habit", "user_id", "habit_id", unique=True),
+    )
 
     id: int = Field(primary_key=True)
     user_id: int = Field(foreign_key="users.id")
-    habit_id: int = Field(foreign_key="habits.id")
+    habit_id: int = Field(foreign_key="habits.id", index=True)
     current_streak: int = 0
     longest_streak: int = 0
     last_completed: date | None = None  
 
+class HabitCompletion(SQLModel, table=True):
+    __tablename__ = "habit_completions"
+    __table_args__ = (
+        Index("ix_habit_completions_user_habit_day", "user_id", "habit_id", "day", unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="users.id")
+    habit_id: int = Field(foreign_key="habits.id", index=True)
+    day: date
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class XpBucket(SQLModel, table=True):
+    __tablename__ = "xp_buckets"
+    __table_args__ = (
+        Index("ix_xp_buckets_period_user", "period", "period_start", "user_id", unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="users.id")
+    period: str  # week / month
+    period_start: date  # ISO week Monday / first day of the month
+    xp: int = 0
+
+# Serves ORDER BY xp DESC, user_id and the rank range counts of one period
+Index("ix_xp_buckets_period_rank", XpBucket.period, XpBucket.period_start, XpBucket.xp.desc(), XpBucket.user_id)
+
 class Medal(SQLModel, table=True):
     __tablename__ = "medals"
 
@@ -82,7 +118,19 @@ class MedalAchievementLink(SQLModel, table=True):
     __tablename__ = "medal_achievement_link"
 
     medal_id: int = Field(foreign_key="medals.id", primary_key=True)
-    achievement_id: int = Field(foreign_key="achievements.id", primary_key=True)
+    achievement_id: int = Field(foreign_key="achievements.id", primary_key=True, index=True)
+
+class UserMedal(SQLModel, table=True):
+    __tablename__ = "user_medals"
+    __table_args__ = (
+        Index("ix_user_medals_user_medal", "user_id", "medal_id", unique=True),
+    )
+
+    id: int = Field(primary_key=True)
+    user_id: int = Field(foreign_key="users.id")
+    medal_id: int = Field(foreign_key="medals.id", index=True)
+    remaining: int  # linked achievements the user does not have yet
+    awarded_at: datetime | None = None
 
 class ShopItem(SQLModel, table=True):
     __tablename__ = "shop_items"
@@ -102,7 +150,7 @@ class UserItem(SQLModel, table=True):
     __tablename__ = "user_items"
 
     id: int = Field(primary_key=True)
-    user_id: int = Field(foreign_key="users.id")
+    user_id: int = Field(foreign_key="users.id", index=True)
     item_id: int = Field(foreign_key="shop_items.id")
     is_equipped: bool = False 
     acquired_at: datetime = Field(default_factory=datetime.utcnow)
@@ -111,11 +159,26 @@ class UserWallet(SQLModel, table=True):
     __tablename__ = "user_wallets"
 
     id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: int = Field(foreign_key="users.id")
+    user_id: int = Field(foreign_key="users.id", unique=True, index=True)
     coins: int = Field(default=0)
     gems: int = Field(default=0)  
     event_tokens: int = Field(default=0)  
 
+class WalletLedger(SQLModel, table=True):
+    __tablename__ = "wallet_ledger"
+    __table_args__ = (
+        Index("ix_wallet_ledger_user", "user_id", "id"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="users.id")
+    currency: str  # coins / gems / event_tokens
+    delta: int
+    balance: int  # wallet balance in this currency after the change
+    reason: str  # purchase / habit_completion / achievement / quest / opening_balance
+    reference: str | None = None  # e.g. "item:3", "habit:12"
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
 class Quest(SQLModel, table=True):
     __tablename__ = "quests"
 
@@ -133,16 +196,29 @@ class Quest(SQLModel, table=True):
 
 class UserQuest(SQLModel, table=True):
     __tablename__ = "user_quests"
+    __table_args__ = (
+        Index("ix_user_quests_user_quest", "user_id", "quest_id", unique=True),
+    )
 
     id: int = Field(primary_key=True)
     user_id: int = Field(foreign_key="users.id")
     quest_id: int = Field(foreign_key="quests.id")
+    period_start: date | None = None  # day / week the row counts for (daily / weekly quests)
+    progress: int = 0
     completed: bool = Field(default=False)
     completed_at: datetime | None = None
 
+class IdempotencyKey(SQLModel, table=True):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        Index("ix_idempotency_keys_user_key", "username", "key", unique=True),
+    )
 
-
-
-
-
-
+    id: Optional[int] = Field(default=None, primary_key=True)
+    username: str
+    key: str
+    fingerprint: str  # sha256 of the request path and body
+    status: int | None = None  # None while the first request is still running
+    content_type: str | None = None
+    body: bytes | None = None
+    expires_at: datetime = Field(index=True)
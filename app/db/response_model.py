@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from typing import Optional
-from datetime import date
+from datetime import date, datetime
 from sqlalchemy.types import TypeDecorator, TEXT
 import json
 
@@ -10,6 +10,7 @@ class UserAchievementRead(BaseModel):
     achievement_id: int
     habit_id: int | None
     obtained: bool
+    created_at: datetime
 
     class Config:
         from_attributes = True  
@@ -17,6 +18,7 @@ class UserAchievementRead(BaseModel):
 
 class JSONEncodedDict(TypeDecorator):
     impl = TEXT
+    cache_ok = True
 
     def process_bind_param(self, value, dialect):
         if value is None:
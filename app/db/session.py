@@ -1,5 +1,5 @@
 from sqlmodel import Session
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import Annotated
 from .base import engine
 from fastapi import Depends
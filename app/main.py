@@ -1,13 +1,48 @@
-from fastapi import FastAPI
-from app.api import users, habits, auth, achievements, streak, medals
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import OperationalError
+from app.api import users, habits, auth, achievements, streak, medals, market, metrics, quest
 from .db.init_db import create_db_and_tables
 from .utils.create_admin import create_admin
+from .core.security import hashing_executor
+from .utils.scheduler import start_scheduler, stop_scheduler
+from .utils.metrics import MetricsMiddleware
+from .utils.query_counter import QueryCounterMiddleware, instrument
+from .utils.idempotency import IdempotencyMiddleware
+from .db.base import engine, async_engine, is_locked
+from .utils.leaderboard import leaderboard
 
 app = FastAPI(title="Gamified Habit Tracker")
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(QueryCounterMiddleware)
+app.add_middleware(MetricsMiddleware)
+instrument(engine, async_engine.sync_engine)
+
+@app.exception_handler(OperationalError)
+async def database_locked(request: Request, exc: OperationalError):
+    # Another writer held SQLite's lock past busy_timeout; the request's
+    # transaction was rolled back, so it can simply be retried
+    if not is_locked(exc):
+        raise exc
+    return JSONResponse(status_code=503, content={"detail": "Database busy, retry"}, headers={"Retry-After": "1"})
+
 @app.on_event("startup")
 def on_startup():
     create_db_and_tables()
     create_admin()
+    leaderboard.rebuild()
+
+@app.on_event("startup")
+async def on_startup_background():
+    start_scheduler()
+
+@app.on_event("shutdown")
+async def on_shutdown_background():
+    await stop_scheduler()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    hashing_executor.shutdown()
 
 app.include_router(auth.router, tags=["Auth"])
 app.include_router(users.router, prefix="/users", tags=["Users"])
@@ -15,5 +50,6 @@ app.include_router(streak.router, prefix="/streak", tags=["Streaks"])
 app.include_router(habits.router, prefix="/habits", tags=["Habits"])
 app.include_router(achievements.router, prefix="/achievements", tags=["Achievements"])
 app.include_router(medals.router, prefix="/medals", tags=["Medals"])
-
-
+app.include_router(market.router, tags=["Market"])
+app.include_router(quest.router, prefix="/quests", tags=["Quests"])
+app.include_router(metrics.router, tags=["Metrics"])
@@ -0,0 +1,28 @@
+from datetime import date
+from pydantic import BaseModel, Field
+
+class HabitCompletionItem(BaseModel):
+    habit_id: int
+    completed_on: date | None = None
+
+class BatchCompleteRequest(BaseModel):
+    items: list[HabitCompletionItem] = Field(min_length=1, max_length=500)
+
+class HabitCompletionResult(BaseModel):
+    habit_id: int
+    completed_on: date
+    # completed / already_completed / out_of_order / future_date / too_old /
+    # before_created / not_found / forbidden
+    status: str
+    current_streak: int | None = None
+    xp_gained: int = 0
+    coins_gained: int = 0
+
+class BatchCompleteResponse(BaseModel):
+    results: list[HabitCompletionResult]
+    xp_gained: int
+    coins_gained: int
+    xp: int
+    level: int
+    achievements: list[int]
+    quests: list[int] = []
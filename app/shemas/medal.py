@@ -1,6 +1,6 @@
+from datetime import datetime
 from pydantic import BaseModel
 from typing import Optional
-from uuid import UUID
 
 class MedalBase(BaseModel):
     name: str
@@ -14,7 +14,16 @@ class MedalUpdate(MedalBase):
     pass
 
 class MedalOut(MedalBase):
-    id: UUID
+    id: int
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        from_attributes = True
+
+class MedalProgress(BaseModel):
+    medal_id: int
+    name: str
+    icon_url: Optional[str] = None
+    xp_reward: int
+    obtained: int  # linked achievements the user has
+    required: int  # linked achievements
+    awarded_at: Optional[datetime] = None
@@ -0,0 +1,13 @@
+from datetime import datetime
+from pydantic import BaseModel
+
+class QuestProgress(BaseModel):
+    quest_id: int
+    title: str
+    field: str
+    operator: str
+    target: float
+    progress: int
+    completed: bool
+    completed_at: datetime | None = None
+    end_date: datetime | None = None
@@ -9,3 +9,15 @@ class UserRead(BaseModel):
     id: int
     username: str
     nickname: str | None
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    user_id: int
+    nickname: str | None
+    xp: int
+    level: int
+
+class LeaderboardWindow(BaseModel):
+    rank: int
+    total: int
+    entries: list[LeaderboardEntry]
@@ -0,0 +1,133 @@
+"""Grant an achievement to every user who already meets its condition.
+
+    python -m app.utils.achievement_backfill ACHIEVEMENT_ID [--chunk-size 2000]
+
+The achievement's condition is compiled to a SQL predicate over users and
+streaks. The job walks the users table in primary-key ranges; each range
+is one transaction with a single INSERT ... SELECT ... RETURNING that adds
+the missing UserAchievement rows, and a single UPDATE that credits the gem
+reward to those users' wallets (logged in wallet_ledger); the progress on
+the medals the achievement counts towards is recomputed for the range in
+the same transaction. It sleeps between ranges so online requests can
+take the SQLite write lock.
+"""
+import argparse
+import logging
+import time
+from datetime import datetime
+from sqlalchemy import DateTime, bindparam, exists, func, literal, null, select, true
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from ..core.config import ACHIEVEMENT_BACKFILL_CHUNK, ACHIEVEMENT_BACKFILL_PAUSE
+from ..db.base import engine
+from ..db.models import Achievement, MedalAchievementLink, User, UserAchievement
+from .achievement_rules import condition_predicate
+from .medal_engine import medal_progress_cache, recompute_range, refresh_users
+from .wallet import credit_users
+
+logger = logging.getLogger("app.achievement_backfill")
+
+# achievement id -> status of its latest backfill in this process
+backfill_jobs: dict[int, dict] = {}
+
+
+def queue_backfill(achievement_id: int) -> dict:
+    job = {
+        "achievement_id": achievement_id, "status": "queued", "error": None,
+        "last_user_id": None, "max_user_id": None, "chunks": 0, "granted": 0, "gems": 0, "medals_awarded": 0, "slowest_chunk_ms": 0.0,
+        "started_at": None, "finished_at": None, "duration_s": None,
+    }
+    backfill_jobs[achievement_id] = job
+    return job
+
+
+def is_running(achievement_id: int) -> bool:
+    job = backfill_jobs.get(achievement_id)
+    return job is not None and job["status"] in ("queued", "running")
+
+
+def _grant(achievement_id: int, predicate, now: datetime):
+    # Adds the row for every user of the id range who qualifies and does not
+    # have it yet (the unique index also covers grants racing the job);
+    # returns their ids
+    return sqlite_insert(UserAchievement).from_select(
+        ["user_id", "achievement_id", "habit_id", "obtained", "created_at"],
+        select(User.id, literal(achievement_id), null(), true(), literal(now, DateTime)).where(
+            User.id >= bindparam("lo"), User.id < bindparam("hi"), predicate,
+            ~exists().where(UserAchievement.user_id == User.id, UserAchievement.achievement_id == achievement_id),
+        ),
+    ).on_conflict_do_nothing(index_elements=["user_id", "achievement_id"]).returning(UserAchievement.user_id)
+
+
+def backfill_achievement(
+    achievement_id: int,
+    chunk_size: int = ACHIEVEMENT_BACKFILL_CHUNK,
+    pause: float = ACHIEVEMENT_BACKFILL_PAUSE,
+) -> dict:
+    job = backfill_jobs.get(achievement_id)
+    if job is None or job["status"] != "queued":
+        job = queue_backfill(achievement_id)
+    started = time.perf_counter()
+    job.update(status="running", started_at=datetime.utcnow())
+    try:
+        with engine.connect() as conn:
+            achievement = conn.execute(
+                select(Achievement.condition, Achievement.gems_reward).where(Achievement.id == achievement_id)
+            ).first()
+            medal_ids = conn.execute(
+                select(MedalAchievementLink.medal_id).where(MedalAchievementLink.achievement_id == achievement_id)
+            ).scalars().all()
+            first_id, last_id = conn.execute(select(
+                select(func.min(User.id)).scalar_subquery(), select(func.max(User.id)).scalar_subquery()
+            )).one()
+        if achievement is None:
+            raise LookupError("Achievement not found")
+        predicate = condition_predicate(achievement.condition)
+        if predicate is None:
+            raise ValueError("Achievement condition cannot be evaluated")
+        gems = achievement.gems_reward if achievement.gems_reward is not None else 1
+
+        now = datetime.utcnow()
+        grant = _grant(achievement_id, predicate, now)
+        job["max_user_id"] = last_id
+        for lo in range(first_id or 0, (last_id or -1) + 1, chunk_size):
+            chunk_started = time.perf_counter()
+            with engine.begin() as conn:
+                user_ids = conn.execute(grant, {"lo": lo, "hi": lo + chunk_size}).scalars().all()
+                credited = credit_users(conn, user_ids, "gems", gems, "achievement", f"achievement:{achievement_id}")
+                awarded, paid = recompute_range(conn, medal_ids, lo, lo + chunk_size, now) if user_ids and medal_ids else (0, [])
+            refresh_users(paid)
+            for user_id in user_ids:
+                medal_progress_cache.pop(user_id)
+            job["slowest_chunk_ms"] = max(job["slowest_chunk_ms"], round((time.perf_counter() - chunk_started) * 1000, 1))
+            job["last_user_id"] = min(lo + chunk_size - 1, last_id)
+            job["chunks"] += 1
+            job["granted"] += len(user_ids)
+            job["gems"] += credited * gems
+            job["medals_awarded"] += awarded
+            if pause:
+                time.sleep(pause)
+        job["status"] = "done"
+    except (LookupError, ValueError) as exc:
+        logger.warning("backfill of achievement %s skipped: %s", achievement_id, exc)
+        job.update(status="failed", error=str(exc))
+    except Exception as exc:
+        logger.exception("backfill of achievement %s failed", achievement_id)
+        job.update(status="failed", error=str(exc))
+    job.update(finished_at=datetime.utcnow(), duration_s=round(time.perf_counter() - started, 3))
+    return job
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("achievement_id", type=int)
+    parser.add_argument("--chunk-size", type=int, default=ACHIEVEMENT_BACKFILL_CHUNK)
+    args = parser.parse_args()
+    job = backfill_achievement(args.achievement_id, args.chunk_size)
+    if job["status"] == "failed":
+        raise SystemExit(job["error"])
+    print(f"Granted achievement {args.achievement_id} to {job['granted']} users ({job['gems']} gems) "
+          f"in {job['chunks']} chunks, {job['duration_s']}s")
+
+
+if __name__ == "__main__":
+    main()
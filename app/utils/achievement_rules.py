@@ -0,0 +1,151 @@
+import json
+from bisect import bisect_left, bisect_right
+from typing import NamedTuple
+from sqlalchemy import exists
+from sqlmodel import select
+from ..db.models import Achievement, Streak, User
+from .check_condition import OPS
+
+FIELDS = ("streak", "xp", "level")
+
+# Operators whose satisfied thresholds form a prefix / suffix of the sorted list
+PREFIX_OPS = (">=", ">")
+SUFFIX_OPS = ("<=", "<")
+
+
+class Transition(NamedTuple):
+    field: str
+    old: int | None
+    new: int
+    habit_id: int | None = None
+
+
+def compile_condition(cond, fields=FIELDS) -> tuple[str, str, float] | None:
+    if isinstance(cond, str):
+        cond = json.loads(cond)
+    if not isinstance(cond, dict):
+        return None
+
+    field = cond.get("field")
+    operator = cond.get("operator")
+    value = cond.get("value")
+
+    if field not in fields or operator not in OPS:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return field, operator, value
+
+
+def condition_predicate(cond):
+    # The condition as a WHERE clause over users, for bulk grants. A streak
+    # condition holds if one of the user's habits satisfies it; for ">=" / ">"
+    # the longest streak counts, since the user reached it at some point.
+    compiled = compile_condition(cond)
+    if compiled is None:
+        return None
+    field, operator, value = compiled
+    if field == "streak":
+        column = Streak.longest_streak if operator in PREFIX_OPS else Streak.current_streak
+        return exists().where(Streak.user_id == User.id, OPS[operator](column, value))
+    return OPS[operator](getattr(User, field), value)
+
+
+def _satisfied_span(operator: str, thresholds: list, value) -> tuple[int, int]:
+    if operator == ">=":
+        return 0, bisect_right(thresholds, value)
+    if operator == ">":
+        return 0, bisect_left(thresholds, value)
+    if operator == "<=":
+        return bisect_left(thresholds, value), len(thresholds)
+    return bisect_right(thresholds, value), len(thresholds)
+
+
+class FieldRules:
+    def __init__(self):
+        # operator -> (sorted thresholds, achievement ids in the same order)
+        self.ranges: dict[str, tuple[list, list[int]]] = {}
+        # threshold -> achievement ids, for "=="
+        self.equals: dict[float, list[int]] = {}
+
+    def add(self, operator: str, value, achievement_id: int):
+        if operator == "==":
+            self.equals.setdefault(value, []).append(achievement_id)
+        else:
+            self.ranges.setdefault(operator, ([], []))
+            self.ranges[operator][0].append((value, achievement_id))
+
+    def freeze(self):
+        for operator, (pairs, _) in list(self.ranges.items()):
+            pairs.sort()
+            self.ranges[operator] = ([v for v, _ in pairs], [a for _, a in pairs])
+
+    def newly_satisfied(self, old, new) -> list[int]:
+        if old == new:
+            return []
+
+        result = []
+        for operator, (thresholds, ids) in self.ranges.items():
+            new_start, new_end = _satisfied_span(operator, thresholds, new)
+            if old is None:
+                result.extend(ids[new_start:new_end])
+                continue
+            old_start, old_end = _satisfied_span(operator, thresholds, old)
+            if operator in PREFIX_OPS and new_end > old_end:
+                result.extend(ids[old_end:new_end])
+            elif operator in SUFFIX_OPS and new_start < old_start:
+                result.extend(ids[new_start:old_start])
+
+        result.extend(self.equals.get(new, ()))
+        return result
+
+
+class AchievementRuleIndex:
+    def __init__(self):
+        self.fields: dict[str, FieldRules] = {}
+        self.gems_rewards: dict[int, int] = {}
+        self.loaded = False
+
+    def build(self, rows):
+        fields = {field: FieldRules() for field in FIELDS}
+        gems_rewards = {}
+
+        for achievement_id, condition, gems_reward in rows:
+            compiled = compile_condition(condition)
+            if compiled is None:
+                continue
+            field, operator, value = compiled
+            fields[field].add(operator, value, achievement_id)
+            gems_rewards[achievement_id] = gems_reward if gems_reward is not None else 1
+
+        for rules in fields.values():
+            rules.freeze()
+
+        self.fields = fields
+        self.gems_rewards = gems_rewards
+        self.loaded = True
+
+    async def ensure_loaded(self, session):
+        if self.loaded:
+            return
+        result = await session.exec(
+            select(Achievement.id, Achievement.condition, Achievement.gems_reward)
+        )
+        self.build(result.all())
+
+    def invalidate(self):
+        self.loaded = False
+
+    def triggered(self, transitions) -> dict[int, Transition]:
+        # achievement id -> first transition that newly satisfies it
+        result = {}
+        for transition in transitions:
+            rules = self.fields.get(transition.field)
+            if rules is None:
+                continue
+            for achievement_id in rules.newly_satisfied(transition.old, transition.new):
+                result.setdefault(achievement_id, transition)
+        return result
+
+
+achievement_rules = AchievementRuleIndex()
@@ -0,0 +1,39 @@
+import threading
+from ..core.config import CATALOG_CACHE_MAX_AGE_SECONDS, CATALOG_CACHE_SIZE
+from .cache import TTLCache
+
+SHOP_ITEMS = "shop_items"
+MEDALS = "medals"
+ACHIEVEMENTS = "achievements"
+
+
+class CatalogCache:
+    # Rendered list responses of the catalogs (shop items, medals,
+    # achievements) as (body, ETag, headers), keyed by catalog, its version
+    # and the query params. The tables only change through admin routes,
+    # which bump the catalog's version: older entries are never read again
+    # and a response rendered while the write landed is stored under the old
+    # version. max_age covers writes made by other workers.
+    def __init__(self, max_age: int, maxsize: int):
+        self._entries = TTLCache(maxsize=maxsize, ttl=max_age)
+        self._versions: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def key(self, catalog: str, *params) -> tuple:
+        return (catalog, self._versions.get(catalog, 0), *params)
+
+    def get(self, key: tuple) -> tuple[bytes, str, dict] | None:
+        return self._entries.get(key)
+
+    def set(self, key: tuple, entry: tuple[bytes, str, dict]):
+        self._entries.set(key, entry)
+
+    def invalidate(self, catalog: str):
+        with self._lock:
+            self._versions[catalog] = self._versions.get(catalog, 0) + 1
+
+    def stats(self) -> dict:
+        return self._entries.stats()
+
+
+catalog_cache = CatalogCache(CATALOG_CACHE_MAX_AGE_SECONDS, CATALOG_CACHE_SIZE)
@@ -1,11 +1,10 @@
 from fastapi import Depends, HTTPException, status
-import jwt
 from jwt.exceptions import InvalidTokenError
 from typing import Annotated
 from fastapi.security import OAuth2PasswordBearer
-from ..db.models import User
+from starlette.concurrency import run_in_threadpool
 from ..db.session import SessionDep
-from ..core.config import SECRET_KEY, ALGORITHM
+from .user_cache import decode_token, cached_user_snapshot, load_user_snapshot, attach_user
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/token")  
 
@@ -19,14 +18,16 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         username = payload.get("sub")
         if username is None:
             raise credentials_exception
     except InvalidTokenError:
         raise credentials_exception
 
-    user = session.query(User).filter(User.username == username).first()
-    if user is None:
+    snapshot = cached_user_snapshot(username)
+    if snapshot is None:
+        snapshot = await run_in_threadpool(load_user_snapshot, username)
+    if snapshot is None:
         raise credentials_exception
-    return user
+    return attach_user(session, snapshot)
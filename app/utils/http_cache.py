@@ -0,0 +1,34 @@
+import hashlib
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+# Authenticated responses: browsers may keep them but must revalidate each time
+CACHE_CONTROL = "private, no-cache"
+
+
+def render_json(content, headers: dict | None = None) -> tuple[bytes, str]:
+    # -> (the JSON body FastAPI would send for `content`, its ETag). The ETag
+    # also covers `headers` sent along with the body, e.g. a next-page cursor.
+    body = JSONResponse(jsonable_encoder(content)).body
+    digest = hashlib.blake2b(body, digest_size=16)
+    for name, value in sorted((headers or {}).items()):
+        digest.update(f"\n{name}: {value}".encode())
+    return body, f'"{digest.hexdigest()}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 asks for If-None-Match
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def cached_json(request: Request, body: bytes, etag: str, headers: dict | None = None) -> Response:
+    headers = {**(headers or {}), "ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
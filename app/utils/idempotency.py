@@ -0,0 +1,219 @@
+import hashlib
+import json
+import re
+import time
+from datetime import datetime, timedelta
+from typing import NamedTuple
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from jwt.exceptions import InvalidTokenError
+from ..core.config import IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_LOCK_SECONDS, IDEMPOTENCY_CACHE_SIZE
+from ..db.base import engine, async_engine
+from ..db.models import IdempotencyKey
+from .cache import TTLCache
+from .user_cache import decode_token
+
+HEADER = b"idempotency-key"
+REPLAYED_HEADER = b"idempotent-replayed"
+MAX_KEY_LENGTH = 255
+
+# POST routes that grant rewards or spend currency
+ROUTES = [
+    re.compile(r"^/habits/\d+/complete$"),
+    re.compile(r"^/habits/complete/batch$"),
+    re.compile(r"^/shop/buy/$"),
+    re.compile(r"^/quests/\d+/complete$"),
+]
+
+
+class StoredResponse(NamedTuple):
+    fingerprint: str
+    status: int | None  # None: the first request is still running
+    content_type: str | None
+    body: bytes | None
+    expires_at: datetime
+
+
+# (username, key) -> StoredResponse of a finished request, per process
+response_cache = TTLCache(maxsize=IDEMPOTENCY_CACHE_SIZE, ttl=IDEMPOTENCY_TTL_SECONDS)
+
+
+def _where(username: str, key: str):
+    return (IdempotencyKey.username == username, IdempotencyKey.key == key)
+
+
+def _stored(username: str, key: str):
+    return select(
+        IdempotencyKey.fingerprint, IdempotencyKey.status, IdempotencyKey.content_type,
+        IdempotencyKey.body, IdempotencyKey.expires_at,
+    ).where(*_where(username, key))
+
+
+async def claim(username: str, key: str, fingerprint: str) -> StoredResponse | None:
+    # Returns None when this request now owns the key, else what is stored
+    # under it. Replays only read; the key is taken with one upsert that
+    # inserts it or takes over an expired one.
+    now = datetime.utcnow()
+    async with async_engine.connect() as conn:
+        row = (await conn.execute(_stored(username, key))).first()
+    if row is not None and row.expires_at >= now:
+        return StoredResponse(*row)
+
+    statement = sqlite_insert(IdempotencyKey).values(
+        username=username, key=key, fingerprint=fingerprint,
+        expires_at=now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=["username", "key"],
+        set_={
+            "fingerprint": statement.excluded.fingerprint, "status": None, "content_type": None, "body": None,
+            "expires_at": statement.excluded.expires_at,
+        },
+        where=IdempotencyKey.expires_at < now,
+    ).returning(IdempotencyKey.id)
+
+    async with async_engine.begin() as conn:
+        if (await conn.execute(statement)).first():
+            return None
+        row = (await conn.execute(_stored(username, key))).one()
+    return StoredResponse(*row)
+
+
+async def save(username: str, key: str, response: StoredResponse):
+    async with async_engine.begin() as conn:
+        await conn.execute(
+            update(IdempotencyKey).where(*_where(username, key)).values(
+                status=response.status, content_type=response.content_type,
+                body=response.body, expires_at=response.expires_at,
+            )
+        )
+    response_cache.set((username, key), response, ttl=IDEMPOTENCY_TTL_SECONDS)
+
+
+async def release(username: str, key: str):
+    # The request failed; let a retry run it again
+    async with async_engine.begin() as conn:
+        await conn.execute(delete(IdempotencyKey).where(*_where(username, key), IdempotencyKey.status == None))
+
+
+def purge_expired_keys(now: datetime | None = None, chunk_size: int = 20000) -> dict:
+    now = now or datetime.utcnow()
+    started = time.perf_counter()
+    deleted = 0
+    while True:
+        expired = select(IdempotencyKey.id).where(IdempotencyKey.expires_at < now).limit(chunk_size)
+        with engine.begin() as conn:
+            removed = conn.execute(delete(IdempotencyKey).where(IdempotencyKey.id.in_(expired))).rowcount
+        deleted += removed
+        if removed < chunk_size:
+            break
+    return {"deleted": deleted, "duration_s": round(time.perf_counter() - started, 3)}
+
+
+def _caller(headers: dict) -> str | None:
+    scheme, _, token = headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return decode_token(token).get("sub")
+    except InvalidTokenError:
+        return None
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def _respond(send, status: int, body: bytes, content_type: str | None, extra_headers=()):
+    headers = [(b"content-length", str(len(body)).encode())]
+    if content_type:
+        headers.append((b"content-type", content_type.encode("latin-1")))
+    headers.extend(extra_headers)
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _error(send, status: int, detail: str):
+    await _respond(send, status, json.dumps({"detail": detail}).encode(), "application/json")
+
+
+class IdempotencyMiddleware:
+    # A POST carrying an Idempotency-Key runs once per (user, key); repeats get
+    # the stored response back without reaching the route. Requests without
+    # the header, or that fail authentication, pass straight through.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http" or scope["method"] != "POST"
+            or not any(route.match(scope["path"]) for route in ROUTES)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        key = headers.get(HEADER)
+        username = _caller(headers) if key else None
+        if username is None:
+            await self.app(scope, receive, send)
+            return
+        key = key.decode("latin-1")
+        if len(key) > MAX_KEY_LENGTH:
+            await _error(send, 400, "Idempotency-Key is too long")
+            return
+
+        body = await _read_body(receive)
+        fingerprint = hashlib.sha256(scope["path"].encode() + b"\0" + body).hexdigest()
+
+        stored = response_cache.get((username, key))
+        cached = stored is not None
+        if not cached:
+            stored = await claim(username, key, fingerprint)
+        if stored is not None:
+            if stored.fingerprint != fingerprint:
+                await _error(send, 422, "Idempotency-Key was already used for a different request")
+            elif stored.status is None:
+                await _error(send, 409, "A request with this Idempotency-Key is still in progress")
+            else:
+                if not cached:
+                    response_cache.set((username, key), stored, ttl=(stored.expires_at - datetime.utcnow()).total_seconds())
+                await _respond(send, stored.status, stored.body, stored.content_type, [(REPLAYED_HEADER, b"true")])
+            return
+
+        await self._run(scope, receive, send, username, key, fingerprint, body)
+
+    async def _run(self, scope, receive, send, username, key, fingerprint, body):
+        consumed = False
+
+        async def replay_body():
+            nonlocal consumed
+            if not consumed:
+                consumed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        status, content_type, chunks = 500, None, []
+
+        async def capture(message):
+            nonlocal status, content_type
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                content_type = dict(message.get("headers", [])).get(b"content-type", b"").decode("latin-1") or None
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_body, capture)
+        finally:
+            if status < 500:
+                expires_at = datetime.utcnow() + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+                await save(username, key, StoredResponse(fingerprint, status, content_type, b"".join(chunks), expires_at))
+            else:
+                await release(username, key)
@@ -0,0 +1,200 @@
+import threading
+from bisect import bisect_left, insort
+from sqlmodel import select
+from ..db.base import engine
+from ..db.models import User
+
+# Target bucket length; a bucket is split once it grows past twice this
+LOAD = 512
+# Keys pack (-xp, user id) into one int, which sorts and bisects much faster
+# than a tuple; user ids must stay below ID_SPACE
+ID_SPACE = 1 << 40
+
+
+# Sorted multiset of keys stored as a list of sorted buckets, with a Fenwick
+# tree over the bucket lengths: insert/remove cost O(log n + LOAD) and
+# position <-> key lookups O(log n).
+class RankedList:
+    def __init__(self, keys=()):
+        self._build(sorted(keys))
+
+    def _build(self, ordered: list):
+        self.buckets = [ordered[i:i + LOAD] for i in range(0, len(ordered), LOAD)]
+        self.maxes = [bucket[-1] for bucket in self.buckets]
+        self.size = len(ordered)
+        self._build_tree()
+
+    def _build_tree(self):
+        n = len(self.buckets)
+        tree = [0] * (n + 1)
+        for i in range(1, n + 1):
+            tree[i] += len(self.buckets[i - 1])
+            parent = i + (i & -i)
+            if parent <= n:
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def _tree_add(self, bucket: int, delta: int):
+        i = bucket + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def _before(self, bucket: int) -> int:
+        # Number of keys in the buckets before `bucket`
+        total, i = 0, bucket
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def _locate(self, position: int) -> tuple[int, int]:
+        # (bucket, offset) of the key at `position`
+        bucket, step = 0, 1 << (len(self.tree) - 1).bit_length()
+        while step:
+            nxt = bucket + step
+            if nxt < len(self.tree) and self.tree[nxt] <= position:
+                bucket = nxt
+                position -= self.tree[nxt]
+            step >>= 1
+        return bucket, position
+
+    def __len__(self):
+        return self.size
+
+    def add(self, key):
+        if not self.buckets:
+            self._build([key])
+            return
+        b = min(bisect_left(self.maxes, key), len(self.buckets) - 1)
+        bucket = self.buckets[b]
+        insort(bucket, key)
+        self.maxes[b] = bucket[-1]
+        self.size += 1
+        if len(bucket) > 2 * LOAD:
+            self.buckets[b:b + 1] = [bucket[:LOAD], bucket[LOAD:]]
+            self.maxes[b:b + 1] = [bucket[LOAD - 1], bucket[-1]]
+            self._build_tree()
+        else:
+            self._tree_add(b, 1)
+
+    def _find(self, key) -> tuple[int, int]:
+        b = bisect_left(self.maxes, key)
+        if b < len(self.buckets):
+            i = bisect_left(self.buckets[b], key)
+            if self.buckets[b][i] == key:
+                return b, i
+        raise KeyError(key)
+
+    def remove(self, key):
+        b, i = self._find(key)
+        bucket = self.buckets[b]
+        del bucket[i]
+        self.size -= 1
+        if not bucket:
+            del self.buckets[b]
+            del self.maxes[b]
+            self._build_tree()
+        else:
+            self.maxes[b] = bucket[-1]
+            self._tree_add(b, -1)
+
+    def index(self, key) -> int:
+        b, i = self._find(key)
+        return self._before(b) + i
+
+    def __getitem__(self, position: int):
+        if not 0 <= position < self.size:
+            raise IndexError(position)
+        b, i = self._locate(position)
+        return self.buckets[b][i]
+
+    def slice(self, start: int, stop: int) -> list:
+        start, stop = max(start, 0), min(stop, self.size)
+        if start >= stop:
+            return []
+        b, i = self._locate(start)
+        result = []
+        while len(result) < stop - start:
+            result.extend(self.buckets[b][i:i + stop - start - len(result)])
+            b, i = b + 1, 0
+        return result
+
+
+# Per-process leaderboard, ordered like ORDER BY xp DESC, id ASC; rank is the
+# 1-based position in that order. Routes that change XP call update() after
+# their commit. Another worker's updates only show up after a rebuild.
+class Leaderboard:
+    def __init__(self):
+        self.ranked = RankedList()
+        # user id -> (xp, level, nickname)
+        self.users: dict[int, tuple[int, int, str | None]] = {}
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(user_id: int, xp: int) -> int:
+        return -xp * ID_SPACE + user_id
+
+    def rebuild(self):
+        with engine.connect() as conn:
+            rows = conn.execute(select(User.id, User.xp, User.level, User.nickname)).all()
+        users = {user_id: (xp, level, nickname) for user_id, xp, level, nickname in rows}
+        ranked = RankedList(self._key(user_id, xp) for user_id, xp, _, _ in rows)
+        with self._lock:
+            self.ranked, self.users, self.loaded = ranked, users, True
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            self.rebuild()
+
+    def update(self, user_id: int, xp: int, level: int, nickname: str | None):
+        # Before the first load the rebuild will read the committed row anyway
+        if not self.loaded:
+            return
+        with self._lock:
+            old = self.users.get(user_id)
+            if old is None or old[0] != xp:
+                if old is not None:
+                    self.ranked.remove(self._key(user_id, old[0]))
+                self.ranked.add(self._key(user_id, xp))
+            self.users[user_id] = (xp, level, nickname)
+
+    def remove(self, user_id: int):
+        with self._lock:
+            old = self.users.pop(user_id, None)
+            if old is not None:
+                self.ranked.remove(self._key(user_id, old[0]))
+
+    def __len__(self):
+        return len(self.ranked)
+
+    def _entry(self, position: int, key) -> dict:
+        user_id = key % ID_SPACE
+        xp, level, nickname = self.users[user_id]
+        return {"rank": position + 1, "user_id": user_id, "nickname": nickname, "xp": xp, "level": level}
+
+    def rank(self, user_id: int) -> int | None:
+        with self._lock:
+            entry = self.users.get(user_id)
+            if entry is None:
+                return None
+            return self.ranked.index(self._key(user_id, entry[0])) + 1
+
+    def top(self, n: int) -> list[dict]:
+        with self._lock:
+            return [self._entry(i, key) for i, key in enumerate(self.ranked.slice(0, n))]
+
+    def around(self, user_id: int, window: int) -> tuple[int | None, list[dict]]:
+        # The caller's rank and up to `window` entries on each side of it
+        with self._lock:
+            entry = self.users.get(user_id)
+            if entry is None:
+                return None, []
+            position = self.ranked.index(self._key(user_id, entry[0]))
+            start = max(position - window, 0)
+            keys = self.ranked.slice(start, position + window + 1)
+            return position + 1, [self._entry(start + i, key) for i, key in enumerate(keys)]
+
+
+leaderboard = Leaderboard()
@@ -0,0 +1,254 @@
+"""Recompute medal progress from the users' achievements and award complete medals.
+
+    python -m app.utils.medal_engine [MEDAL_ID ...] [--chunk-size 2000]
+
+Medals are normally awarded as achievements are granted. This recomputes
+user_medals for the given medals (all by default) after their links
+changed, or to award medals for achievements granted before medals were
+tracked. It walks the users in id ranges; each range is one transaction
+with a single grouped INSERT ... SELECT ... ON CONFLICT over the range's
+achievements, followed by the XP rewards of the medals it completed.
+"""
+import argparse
+import time
+from datetime import date, datetime
+from sqlalchemy import DateTime, and_, bindparam, case, delete, func, literal, null, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import select
+from ..core.config import (
+    MEDAL_RECOMPUTE_CHUNK, MEDAL_RECOMPUTE_PAUSE, MEDAL_PROGRESS_CACHE_TTL_SECONDS, MEDAL_PROGRESS_CACHE_SIZE,
+)
+from ..db.base import engine
+from ..db.models import Medal, MedalAchievementLink, User, UserAchievement, UserMedal
+from .cache import TTLCache
+from .leaderboard import leaderboard
+from .user_cache import invalidate_user
+from .users import grant_xp, level_for_xp
+from .xp_buckets import add_xp_many
+
+
+class MedalIndex:
+    # Reverse index of medal_achievement_link: achievement id -> the medals
+    # it counts towards, so a grant only touches the medals linked to it
+    def __init__(self):
+        self.by_achievement: dict[int, list[int]] = {}
+        self.required: dict[int, int] = {}
+        self.xp_rewards: dict[int, int] = {}
+        self.loaded = False
+
+    def build(self, links, medals):
+        by_achievement, required = {}, {}
+        for medal_id, achievement_id in links:
+            by_achievement.setdefault(achievement_id, []).append(medal_id)
+            required[medal_id] = required.get(medal_id, 0) + 1
+        self.by_achievement, self.required = by_achievement, required
+        self.xp_rewards = {medal_id: xp_reward or 0 for medal_id, xp_reward in medals}
+        self.loaded = True
+
+    async def ensure_loaded(self, session):
+        if self.loaded:
+            return
+        links = await session.exec(select(MedalAchievementLink.medal_id, MedalAchievementLink.achievement_id))
+        medals = await session.exec(select(Medal.id, Medal.xp_reward))
+        self.build(links.all(), medals.all())
+
+    def invalidate(self):
+        self.loaded = False
+
+    def counts(self, achievement_ids) -> dict[int, int]:
+        # medal id -> how many of the achievements count towards it
+        result = {}
+        for achievement_id in achievement_ids:
+            for medal_id in self.by_achievement.get(achievement_id, ()):
+                result[medal_id] = result.get(medal_id, 0) + 1
+        return result
+
+
+medal_index = MedalIndex()
+
+# user id -> the user's GET /medals/progress rows, per process
+medal_progress_cache = TTLCache(maxsize=MEDAL_PROGRESS_CACHE_SIZE, ttl=MEDAL_PROGRESS_CACHE_TTL_SECONDS)
+
+
+def medal_progress(session, user_id: int) -> list[dict]:
+    # Every medal with its linked achievements obtained vs required, in one
+    # grouped query (user_medals has at most one row per medal and user)
+    rows = session.exec(
+        select(
+            Medal.id, Medal.name, Medal.icon_url, Medal.xp_reward,
+            func.count(UserAchievement.id), func.count(MedalAchievementLink.achievement_id),
+            func.max(UserMedal.awarded_at),
+        )
+        .outerjoin(MedalAchievementLink, MedalAchievementLink.medal_id == Medal.id)
+        .outerjoin(UserAchievement, and_(
+            UserAchievement.user_id == user_id, UserAchievement.achievement_id == MedalAchievementLink.achievement_id,
+        ))
+        .outerjoin(UserMedal, and_(UserMedal.user_id == user_id, UserMedal.medal_id == Medal.id))
+        .group_by(Medal.id)
+        .order_by(Medal.id)
+    ).all()
+    return [
+        {"medal_id": medal_id, "name": name, "icon_url": icon_url, "xp_reward": xp_reward or 0,
+         "obtained": obtained, "required": required, "awarded_at": awarded_at}
+        for medal_id, name, icon_url, xp_reward, obtained, required, awarded_at in rows
+    ]
+
+
+def _progress(user_id: int, medal_ids: list[int], step: int, now: datetime):
+    # Counts `step` more achievements towards each medal. A medal whose
+    # remaining count reaches zero gets awarded_at = now, once.
+    statement = sqlite_insert(UserMedal).values([
+        {"user_id": user_id, "medal_id": medal_id, "remaining": medal_index.required[medal_id] - step,
+         "awarded_at": now if medal_index.required[medal_id] <= step else None}
+        for medal_id in medal_ids
+    ])
+    remaining = UserMedal.remaining - step
+    return statement.on_conflict_do_update(
+        index_elements=["user_id", "medal_id"],
+        set_={
+            "remaining": remaining,
+            "awarded_at": case((remaining <= 0, func.coalesce(UserMedal.awarded_at, now)), else_=UserMedal.awarded_at),
+        },
+    ).returning(UserMedal.medal_id, UserMedal.awarded_at)
+
+
+async def award_medals(session, user, achievement_ids: list[int]):
+    # Counts newly granted achievements towards their medals, and awards and
+    # pays every medal that is now complete. Runs inside the caller's
+    # transaction; -> the transitions the XP rewards caused.
+    await medal_index.ensure_loaded(session)
+    counts = medal_index.counts(achievement_ids)
+    if not counts:
+        return []
+
+    # Usually one statement: every medal moves by one achievement
+    by_step = {}
+    for medal_id, step in counts.items():
+        by_step.setdefault(step, []).append(medal_id)
+    now = datetime.utcnow()
+    awarded = []
+    for step, medal_ids in by_step.items():
+        result = await session.exec(_progress(user.id, medal_ids, step, now))
+        awarded += [medal_id for medal_id, awarded_at in result.all() if awarded_at == now]
+    return await grant_xp(session, user, sum(medal_index.xp_rewards.get(medal_id, 0) for medal_id in awarded))
+
+
+def recompute_range(conn, medal_ids: list[int], lo: int, hi: int, now: datetime) -> tuple[int, list]:
+    # Sets the progress of the users with lo <= id < hi on the medals from
+    # their achievements and pays the medals this completed. Awarded medals
+    # are kept even if a link change made them incomplete. The reward XP does
+    # not trigger XP achievements or quests. -> (medals awarded, the paid
+    # users' rows for refresh_users() once the caller commits)
+    in_range = (UserMedal.user_id >= lo, UserMedal.user_id < hi, UserMedal.medal_id.in_(medal_ids))
+    conn.execute(delete(UserMedal).where(*in_range, UserMedal.awarded_at == None))
+
+    required = (
+        select(MedalAchievementLink.medal_id, func.count().label("required"))
+        .where(MedalAchievementLink.medal_id.in_(medal_ids))
+        .group_by(MedalAchievementLink.medal_id)
+        .subquery()
+    )
+    remaining = required.c.required - func.count()
+    statement = sqlite_insert(UserMedal).from_select(
+        ["user_id", "medal_id", "remaining", "awarded_at"],
+        select(
+            UserAchievement.user_id, MedalAchievementLink.medal_id, remaining,
+            case((remaining <= 0, literal(now, DateTime)), else_=null()),
+        )
+        .join(MedalAchievementLink, MedalAchievementLink.achievement_id == UserAchievement.achievement_id)
+        .join(required, required.c.medal_id == MedalAchievementLink.medal_id)
+        .where(UserAchievement.user_id >= lo, UserAchievement.user_id < hi)
+        .group_by(UserAchievement.user_id, MedalAchievementLink.medal_id),
+    )
+    conn.execute(statement.on_conflict_do_update(
+        index_elements=["user_id", "medal_id"],
+        set_={
+            "remaining": statement.excluded.remaining,
+            "awarded_at": func.coalesce(UserMedal.awarded_at, statement.excluded.awarded_at),
+        },
+    ))
+
+    awards = conn.execute(
+        select(UserMedal.user_id, Medal.xp_reward)
+        .join(Medal, Medal.id == UserMedal.medal_id)
+        .where(*in_range, UserMedal.awarded_at == now)
+    ).all()
+    gains = {}
+    for user_id, xp_reward in awards:
+        if xp_reward:
+            gains[user_id] = gains.get(user_id, 0) + xp_reward
+    if not gains:
+        return len(awards), []
+
+    users_table = User.__table__
+    conn.execute(
+        update(users_table).where(users_table.c.id == bindparam("user_id")).values(xp=users_table.c.xp + bindparam("gain")),
+        [{"user_id": user_id, "gain": xp} for user_id, xp in gains.items()],
+    )
+    users = conn.execute(select(User.id, User.xp, User.level, User.username, User.nickname).where(User.id.in_(list(gains)))).all()
+    levels = [
+        {"user_id": user.id, "new_level": level_for_xp(user.xp)}
+        for user in users if level_for_xp(user.xp) != user.level
+    ]
+    if levels:
+        conn.execute(
+            update(users_table).where(users_table.c.id == bindparam("user_id")).values(level=bindparam("new_level")),
+            levels,
+        )
+    conn.execute(add_xp_many(gains, date.today()))
+    return len(awards), [(user.id, user.xp, level_for_xp(user.xp), user.username, user.nickname) for user in users]
+
+
+def refresh_users(rows: list):
+    for user_id, xp, level, username, nickname in rows:
+        invalidate_user(username)
+        leaderboard.update(user_id, xp, level, nickname)
+
+
+def recompute_medals(
+    medal_ids: list[int] | None = None,
+    chunk_size: int = MEDAL_RECOMPUTE_CHUNK,
+    pause: float = MEDAL_RECOMPUTE_PAUSE,
+) -> dict:
+    started = time.perf_counter()
+    medal_index.invalidate()
+    medal_progress_cache.clear()
+    with engine.connect() as conn:
+        if medal_ids is None:
+            medal_ids = conn.execute(select(Medal.id)).scalars().all()
+        first_id, last_id = conn.execute(select(
+            select(func.min(User.id)).scalar_subquery(), select(func.max(User.id)).scalar_subquery()
+        )).one()
+
+    awarded = chunks = 0
+    now = datetime.utcnow()
+    if medal_ids and first_id is not None:
+        for lo in range(first_id, last_id + 1, chunk_size):
+            with engine.begin() as conn:
+                count, paid = recompute_range(conn, medal_ids, lo, lo + chunk_size, now)
+            refresh_users(paid)
+            awarded += count
+            chunks += 1
+            if pause:
+                time.sleep(pause)
+    medal_progress_cache.clear()
+    return {
+        "medals": len(medal_ids),
+        "awarded": awarded,
+        "chunks": chunks,
+        "duration_s": round(time.perf_counter() - started, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("medal_ids", type=int, nargs="*")
+    parser.add_argument("--chunk-size", type=int, default=MEDAL_RECOMPUTE_CHUNK)
+    args = parser.parse_args()
+    report = recompute_medals(args.medal_ids or None, args.chunk_size)
+    print(f"Recomputed {report['medals']} medals: {report['awarded']} awarded "
+          f"in {report['chunks']} chunks, {report['duration_s']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import time
+from bisect import bisect_left
+
+# Latency histogram upper bounds in seconds; the last bucket is +Inf
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED = "<unmatched>"
+
+
+class RouteStats:
+    __slots__ = ("count", "errors", "seconds", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+
+# Per-process counters. Requests are observed on the event loop thread
+# only, so plain integer updates need no lock; each worker exports its own.
+class MetricsRegistry:
+    def __init__(self):
+        self.routes: dict[tuple[str, str], RouteStats] = {}
+
+    def observe(self, method: str, route: str, seconds: float, error: bool):
+        stats = self.routes.get((method, route))
+        if stats is None:
+            stats = self.routes[(method, route)] = RouteStats()
+        stats.count += 1
+        stats.seconds += seconds
+        stats.buckets[bisect_left(BUCKETS, seconds)] += 1
+        if error:
+            stats.errors += 1
+
+    def reset(self):
+        self.routes = {}
+
+    def render(self) -> str:
+        lines = [
+            "# HELP http_requests_total Requests handled, by route template.",
+            "# TYPE http_requests_total counter",
+        ]
+        routes = sorted(self.routes.items())
+        for (method, route), stats in routes:
+            lines.append(f"http_requests_total{_labels(method, route)} {stats.count}")
+
+        lines += [
+            "# HELP http_request_errors_total Requests that ended in a 5xx or an unhandled exception.",
+            "# TYPE http_request_errors_total counter",
+        ]
+        for (method, route), stats in routes:
+            lines.append(f"http_request_errors_total{_labels(method, route)} {stats.errors}")
+
+        lines += [
+            "# HELP http_request_duration_seconds Request latency, by route template.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route), stats in routes:
+            cumulative = 0
+            for bound, n in zip(BUCKETS + ("+Inf",), stats.buckets):
+                cumulative += n
+                lines.append(f"http_request_duration_seconds_bucket{_labels(method, route, le=bound)} {cumulative}")
+            lines.append(f"http_request_duration_seconds_sum{_labels(method, route)} {stats.seconds:.6f}")
+            lines.append(f"http_request_duration_seconds_count{_labels(method, route)} {stats.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(method: str, route: str, **extra) -> str:
+    pairs = [("method", method), ("route", route), *extra.items()]
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def render_cache_stats(stats: dict) -> str:
+    lines = [
+        "# HELP user_cache_entries Entries held by the auth caches.",
+        "# TYPE user_cache_entries gauge",
+    ]
+    lines += [f'user_cache_entries{{cache="{name}"}} {s["size"]}' for name, s in stats.items()]
+    lines += ["# TYPE user_cache_hits_total counter"]
+    lines += [f'user_cache_hits_total{{cache="{name}"}} {s["hits"]}' for name, s in stats.items()]
+    lines += ["# TYPE user_cache_misses_total counter"]
+    lines += [f'user_cache_misses_total{{cache="{name}"}} {s["misses"]}' for name, s in stats.items()]
+    return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    # Plain ASGI middleware: the route template is only known after the
+    # router has matched, so it is read from the scope once the app returns.
+    def __init__(self, app, registry: MetricsRegistry = metrics, skip_paths=("/metrics",)):
+        self.app = app
+        self.registry = registry
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            self.registry.observe(
+                scope["method"],
+                route.path if route is not None else UNMATCHED,
+                time.perf_counter() - started,
+                status >= 500,
+            )
@@ -0,0 +1,47 @@
+import base64
+import json
+from fastapi import HTTPException, Response
+from sqlalchemy import tuple_
+
+# List bodies stay plain JSON arrays; the cursor for the next page travels in a header
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    invalid = HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise invalid
+    if not isinstance(values, list) or len(values) != size:
+        raise invalid
+    if any(isinstance(v, bool) or not isinstance(v, (int, float, str)) for v in values):
+        raise invalid
+    return values
+
+
+def paginate(query, keys: list, cursor: str | None, offset: int, limit: int):
+    # Keyset on `keys` when a cursor is given, plain offset otherwise. One
+    # extra row is fetched to tell whether there is a next page.
+    query = query.order_by(*keys)
+    if cursor:
+        values = decode_cursor(cursor, len(keys))
+        if len(keys) == 1:
+            query = query.where(keys[0] > values[0])
+        else:
+            query = query.where(tuple_(*keys) > tuple_(*values))
+    elif offset:
+        query = query.offset(offset)
+    return query.limit(limit + 1)
+
+
+def page(rows: list, limit: int, response: Response, key=lambda row: (row.id,)) -> list:
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(key(rows[-1]))
+    return rows
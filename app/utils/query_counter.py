@@ -0,0 +1,97 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from sqlalchemy import event
+from ..core.config import DEBUG, SQL_QUERY_BUDGET, SQL_REPEAT_LIMIT
+
+logger = logging.getLogger("app.sql")
+
+# Expanded IN lists differ only in their number of placeholders
+_IN_LIST = re.compile(r"\?(?:, \?)+")
+
+
+class QueryStats:
+    __slots__ = ("count", "seconds", "shapes")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+
+# The stats object is shared by reference, so statements issued from the
+# threadpool (sync routes and dependencies) land in the request's stats too
+_current: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+def current_query_stats() -> QueryStats | None:
+    return _current.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    stats = _current.get()
+    if stats is None:
+        return
+    stats.count += 1
+    stats.seconds += time.perf_counter() - started
+    stats.shapes[_IN_LIST.sub("?, ...", statement)] += 1
+
+
+def instrument(*engines):
+    # Sync engines; pass async_engine.sync_engine for the async one
+    for engine in engines:
+        if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryCounterMiddleware:
+    def __init__(self, app, debug_headers: bool = DEBUG, budget: int = SQL_QUERY_BUDGET, repeat_limit: int = SQL_REPEAT_LIMIT):
+        self.app = app
+        self.debug_headers = debug_headers
+        self.budget = budget
+        self.repeat_limit = repeat_limit
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current.set(stats)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and self.debug_headers:
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-db-query-count", str(stats.count).encode()),
+                    (b"x-db-time-ms", f"{stats.seconds * 1000:.2f}".encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers if self.debug_headers else send)
+        finally:
+            _current.reset(token)
+            self.check(scope, stats)
+
+    def check(self, scope, stats: QueryStats):
+        if not stats.count:
+            return
+        route = scope.get("route")
+        name = f"{scope['method']} {route.path if route is not None else scope['path']}"
+        if stats.count > self.budget:
+            logger.warning(
+                "%s issued %d SQL statements (budget %d, %.1f ms in the database)",
+                name, stats.count, self.budget, stats.seconds * 1000,
+            )
+        shape, repeats = stats.shapes.most_common(1)[0]
+        if repeats > self.repeat_limit:
+            logger.warning("%s ran the same statement %d times (possible N+1): %s", name, repeats, shape)
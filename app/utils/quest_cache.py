@@ -0,0 +1,58 @@
+import threading
+from datetime import datetime, timedelta
+from sqlmodel import select
+from ..core.config import QUEST_CACHE_MAX_AGE_SECONDS
+from ..db.models import Quest
+from .http_cache import render_json
+
+
+class ActiveQuests:
+    # The rendered GET /quests/ body. It can only change when a quest is
+    # written or a start/end date passes, so it is kept until the next such
+    # instant (capped by max_age, for writes made by other workers).
+    def __init__(self, max_age: int):
+        self.max_age = max_age
+        self.body: bytes | None = None
+        self.etag: str | None = None
+        self.expires_at: datetime | None = None
+        self.loads = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, now: datetime) -> tuple[bytes, str] | None:
+        body, etag, expires_at = self.body, self.etag, self.expires_at
+        if body is None or (expires_at is not None and now >= expires_at):
+            return None
+        return body, etag
+
+    def load(self, session, now: datetime) -> tuple[bytes, str]:
+        with self._lock:
+            cached = self.get(now)
+            if cached:
+                return cached
+            generation = self._generation
+            quests = session.exec(
+                select(Quest).where(Quest.is_active == True, (Quest.end_date == None) | (Quest.end_date >= now))
+            ).all()
+            running = [quest for quest in quests if quest.start_date is None or quest.start_date <= now]
+
+            # Next instant a quest starts, or a running one ends (it is listed
+            # up to and including its end_date)
+            boundaries = [quest.start_date for quest in quests if quest.start_date and quest.start_date > now]
+            boundaries += [quest.end_date + timedelta(microseconds=1) for quest in running if quest.end_date]
+            if self.max_age:
+                boundaries.append(now + timedelta(seconds=self.max_age))
+
+            body, etag = render_json(running)
+            # A write that landed while loading leaves the cache empty
+            if generation == self._generation:
+                self.body, self.etag, self.expires_at = body, etag, min(boundaries, default=None)
+            self.loads += 1
+            return body, etag
+
+    def invalidate(self):
+        self._generation += 1
+        self.body = self.etag = self.expires_at = None
+
+
+active_quests = ActiveQuests(QUEST_CACHE_MAX_AGE_SECONDS)
@@ -0,0 +1,160 @@
+from datetime import date, datetime, timedelta
+from typing import NamedTuple
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import select
+from ..db.models import Quest, UserQuest
+from .achievement_rules import Transition, compile_condition
+from .check_condition import OPS
+from .users import grant_xp
+from .wallet import apply_changes_async
+
+# Quest progress on a counter field is the sum of its events' deltas while the
+# quest runs; on the other fields it is the latest value seen.
+COUNTER_FIELDS = ("completions",)
+FIELDS = ("streak", "xp", "level") + COUNTER_FIELDS
+# Quest types whose progress starts over every day / week
+ROTATING_TYPES = ("daily", "weekly")
+
+
+def quest_period(quest_type: str, day: date) -> date | None:
+    if quest_type == "daily":
+        return day
+    if quest_type == "weekly":
+        return day - timedelta(days=day.weekday())
+    return None
+
+
+class QuestRule(NamedTuple):
+    quest_id: int
+    type: str
+    field: str
+    operator: str
+    value: float
+    start_date: datetime | None
+    end_date: datetime | None
+    xp_reward: int
+    coin_reward: int
+    event_tokens_reward: int
+
+    def running(self, now: datetime) -> bool:
+        return (self.start_date is None or self.start_date <= now) and (self.end_date is None or self.end_date >= now)
+
+    def period(self, day: date) -> date | None:
+        return quest_period(self.type, day)
+
+    def met(self, progress) -> bool:
+        return OPS[self.operator](progress, self.value)
+
+
+class QuestIndex:
+    # Active, not yet ended quests grouped by the field their condition reads,
+    # so an event only looks at the quests that depend on it
+    def __init__(self):
+        self.by_field: dict[str, list[QuestRule]] = {}
+        self.rules: dict[int, QuestRule] = {}
+        self.loaded = False
+
+    def build(self, quests):
+        by_field, rules = {}, {}
+        for quest in quests:
+            compiled = compile_condition(quest.condition, FIELDS)
+            if compiled is None:
+                continue
+            rule = QuestRule(
+                quest.id, quest.type, *compiled, quest.start_date, quest.end_date,
+                quest.xp_reward, quest.coin_reward, quest.event_tokens_reward,
+            )
+            by_field.setdefault(rule.field, []).append(rule)
+            rules[rule.quest_id] = rule
+        self.by_field, self.rules, self.loaded = by_field, rules, True
+
+    async def ensure_loaded(self, session):
+        if self.loaded:
+            return
+        result = await session.exec(
+            select(Quest).where(Quest.is_active == True, (Quest.end_date == None) | (Quest.end_date >= datetime.utcnow()))
+        )
+        self.build(result.all())
+
+    def invalidate(self):
+        self.loaded = False
+
+    def touched(self, transitions, now: datetime) -> dict[int, tuple[QuestRule, int]]:
+        # quest id -> (rule, counter increment or latest value)
+        result = {}
+        for transition in transitions:
+            for rule in self.by_field.get(transition.field, ()):
+                if not rule.running(now):
+                    continue
+                if rule.field in COUNTER_FIELDS:
+                    previous = result.get(rule.quest_id, (rule, 0))[1]
+                    result[rule.quest_id] = (rule, previous + transition.new - (transition.old or 0))
+                else:
+                    result[rule.quest_id] = (rule, transition.new)
+        return result
+
+
+quest_index = QuestIndex()
+
+
+async def grant_quest_rewards(session, user, rules: list[QuestRule]) -> list[Transition]:
+    await apply_changes_async(session, user.id, [
+        change
+        for rule in rules
+        for change in (
+            ("coins", rule.coin_reward, f"quest:{rule.quest_id}"),
+            ("event_tokens", rule.event_tokens_reward, f"quest:{rule.quest_id}"),
+        )
+    ], "quest")
+    return await grant_xp(session, user, sum(rule.xp_reward for rule in rules))
+
+
+async def advance_quests(session, user, transitions) -> tuple[list[int], list[Transition]]:
+    # Folds the events into the user's progress rows and completes (and pays
+    # out) every quest whose condition is now met. Reward XP is fed back in,
+    # so it can complete XP quests too. Returns the completed quest ids and the
+    # transitions the rewards caused. Runs inside the caller's transaction.
+    await quest_index.ensure_loaded(session)
+    now = datetime.utcnow()
+    today = date.today()
+    completed, caused = [], []
+    pending = list(transitions)
+    while pending:
+        touched = quest_index.touched(pending, now)
+        if not touched:
+            break
+        result = await session.exec(
+            select(UserQuest.quest_id, UserQuest.period_start, UserQuest.progress, UserQuest.completed)
+            .where(UserQuest.user_id == user.id, UserQuest.quest_id.in_(list(touched)))
+        )
+        stored = {quest_id: (period, progress, done) for quest_id, period, progress, done in result.all()}
+
+        finished, rows = [], []
+        for quest_id, (rule, value) in touched.items():
+            period = rule.period(today)
+            stored_period, progress, done = stored.get(quest_id, (period, 0, False))
+            if stored_period != period:
+                # A row left over from an earlier day / week
+                progress, done = 0, False
+            if done:
+                continue
+            progress = progress + value if rule.field in COUNTER_FIELDS else value
+            done = rule.met(progress)
+            rows.append({
+                "user_id": user.id, "quest_id": quest_id, "period_start": period, "progress": progress,
+                "completed": done, "completed_at": now if done else None,
+            })
+            if done:
+                finished.append(rule)
+        if rows:
+            # New and existing progress rows in one statement
+            statement = sqlite_insert(UserQuest).values(rows)
+            await session.exec(statement.on_conflict_do_update(
+                index_elements=["user_id", "quest_id"],
+                set_={column: statement.excluded[column] for column in ("period_start", "progress", "completed", "completed_at")},
+            ))
+
+        completed += [rule.quest_id for rule in finished]
+        pending = await grant_quest_rewards(session, user, finished) if finished else []
+        caused += pending
+    return completed, caused
@@ -0,0 +1,138 @@
+"""Assign daily and weekly quests to the active users at the start of each period.
+
+    python -m app.utils.quest_rotation [--date 2025-01-31] [--chunk-size 2000] [--active-days 30]
+
+Walks the users table in primary-key ranges. Each range is one short
+transaction that deletes the range's rows left from an earlier day/week
+(or from rotating quests that have ended), then inserts the new period's
+UserQuest rows for its active users with a single executemany. The job
+sleeps between ranges so online requests can take the SQLite write lock.
+
+Daily quests are assigned every day; weekly quests on the first day of the
+week, or on the day they start. Users who are not assigned a row still get
+one from the quest engine on their first event of the period. Rows from
+before period_start was recorded (NULL) are expired as well, and their
+running quests are assigned again for the current period.
+"""
+import argparse
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy import and_, bindparam, delete, exists, func, or_, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from ..core.config import QUEST_ACTIVE_DAYS, QUEST_ROTATION_CHUNK, QUEST_ROTATION_PAUSE
+from ..db.base import engine
+from ..db.models import Quest, Streak, User, UserQuest
+from .quest_engine import ROTATING_TYPES, quest_period
+
+_assign = sqlite_insert(UserQuest).values(
+    user_id=bindparam("user_id"), quest_id=bindparam("quest_id"), period_start=bindparam("period_start"),
+    progress=0, completed=False,
+).on_conflict_do_nothing(index_elements=["user_id", "quest_id"])
+
+
+def _rotating_quests(conn) -> tuple[list, list[int]]:
+    # -> (quests running today, ids of rotating quests that no longer run)
+    now = datetime.utcnow()
+    running, ended = [], []
+    for quest in conn.execute(select(Quest.id, Quest.type, Quest.start_date, Quest.end_date, Quest.is_active).where(
+        Quest.type.in_(ROTATING_TYPES)
+    )):
+        if not quest.is_active or (quest.end_date and quest.end_date < now):
+            ended.append(quest.id)
+        elif not quest.start_date or quest.start_date <= now:
+            running.append(quest)
+    return running, ended
+
+
+def rotate_quests(
+    today: date | None = None,
+    chunk_size: int = QUEST_ROTATION_CHUNK,
+    pause: float = QUEST_ROTATION_PAUSE,
+    active_days: int = QUEST_ACTIVE_DAYS,
+) -> dict:
+    today = today or date.today()
+    started = time.perf_counter()
+
+    with engine.connect() as conn:
+        running, ended = _rotating_quests(conn)
+        first_id, last_id = conn.execute(select(
+            select(func.min(User.id)).scalar_subquery(), select(func.max(User.id)).scalar_subquery()
+        )).one()
+
+    # Quests whose period starts today, or that started since the last run
+    assigned = [
+        (quest.id, quest_period(quest.type, today))
+        for quest in running
+        if quest_period(quest.type, today) == today
+        or (quest.start_date and quest.start_date.date() >= today - timedelta(days=1))
+    ]
+    stale = [
+        and_(UserQuest.quest_id.in_([q.id for q in running if q.type == quest_type]),
+             (UserQuest.period_start < quest_period(quest_type, today)) | UserQuest.period_start.is_(None))
+        for quest_type in ROTATING_TYPES
+    ]
+    if ended:
+        stale.append(UserQuest.quest_id.in_(ended))
+    expire = delete(UserQuest).where(
+        UserQuest.user_id >= bindparam("lo"), UserQuest.user_id < bindparam("hi"), or_(*stale)
+    ).returning(UserQuest.user_id, UserQuest.quest_id, UserQuest.period_start)
+    periods = {quest.id: quest_period(quest.type, today) for quest in running}
+
+    users = select(User.id).where(User.id >= bindparam("lo"), User.id < bindparam("hi"))
+    if active_days:
+        cutoff = today - timedelta(days=active_days)
+        users = users.where(exists().where(Streak.user_id == User.id, Streak.last_completed >= cutoff))
+
+    inserted = expired = chunks = 0
+    slowest = 0.0
+    if first_id is not None and (assigned or running or ended):
+        for lo in range(first_id, last_id + 1, chunk_size):
+            bounds = {"lo": lo, "hi": lo + chunk_size}
+            # Read outside the write transaction to keep the lock short
+            with engine.connect() as conn:
+                user_ids = conn.execute(users, bounds).scalars().all() if assigned else []
+            rows = [
+                {"user_id": user_id, "quest_id": quest_id, "period_start": period}
+                for user_id in user_ids
+                for quest_id, period in assigned
+            ]
+            chunk_started = time.perf_counter()
+            with engine.begin() as conn:
+                removed = conn.execute(expire, bounds).all()
+                expired += len(removed)
+                rows += [
+                    {"user_id": user_id, "quest_id": quest_id, "period_start": periods[quest_id]}
+                    for user_id, quest_id, period in removed
+                    if period is None and quest_id in periods
+                ]
+                if rows:
+                    inserted += conn.execute(_assign, rows).rowcount
+            slowest = max(slowest, time.perf_counter() - chunk_started)
+            chunks += 1
+            if pause:
+                time.sleep(pause)
+
+    return {
+        "day": today.isoformat(),
+        "quests": len(assigned),
+        "inserted": inserted,
+        "expired": expired,
+        "chunks": chunks,
+        "slowest_chunk_ms": round(slowest * 1000, 1),
+        "duration_s": round(time.perf_counter() - started, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--date", type=date.fromisoformat, default=None)
+    parser.add_argument("--chunk-size", type=int, default=QUEST_ROTATION_CHUNK)
+    parser.add_argument("--active-days", type=int, default=QUEST_ACTIVE_DAYS)
+    args = parser.parse_args()
+    report = rotate_quests(args.date, args.chunk_size, active_days=args.active_days)
+    print(f"Assigned {report['quests']} quests: {report['inserted']} rows inserted, {report['expired']} expired "
+          f"in {report['chunks']} chunks, {report['duration_s']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Rebuild every Streak row from the habit_completions log.
+
+    python -m app.utils.recompute_streaks [--date 2025-01-31] [--batch-size 10000]
+
+The log is read in keyset-paginated chunks ordered by the
+(user_id, habit_id, day) index, so memory use is bounded by the batch size
+and no read transaction stays open between chunks. Streaks of habits with
+no logged completions (e.g. from before the log existed) are left as is.
+
+The log only starts with the habit_completions migration, so it cannot
+undo what happened before it: longest_streak is only ever raised, and a
+habit whose current run in the log starts on its first logged day while
+the stored run started earlier (it began before the log) keeps its stored
+current_streak and last_completed. A run that has lapsed by `today` (the
+streak sweeper's rule) is written with current_streak 0.
+"""
+import argparse
+import time
+from datetime import date, timedelta
+from sqlalchemy import bindparam, func, select, tuple_, update
+from ..db.base import engine
+from ..db.models import Habit, HabitCompletion, Streak
+from .streaks import is_lapsed, next_streak
+
+_update_streak = (
+    update(Streak)
+    .where(Streak.user_id == bindparam("b_user_id"), Streak.habit_id == bindparam("b_habit_id"))
+    .values(
+        current_streak=bindparam("b_current"),
+        longest_streak=func.max(Streak.longest_streak, bindparam("b_longest")),
+        last_completed=bindparam("b_last"),
+    )
+)
+
+
+def _read_chunk(conn, after, batch_size):
+    query = (
+        select(
+            HabitCompletion.user_id, HabitCompletion.habit_id, HabitCompletion.day, Habit.frequency,
+            Streak.current_streak, Streak.last_completed,
+        )
+        .join(Habit, Habit.id == HabitCompletion.habit_id)
+        .outerjoin(Streak, (Streak.user_id == HabitCompletion.user_id) & (Streak.habit_id == HabitCompletion.habit_id))
+        .order_by(HabitCompletion.user_id, HabitCompletion.habit_id, HabitCompletion.day)
+        .limit(batch_size)
+    )
+    if after is not None:
+        query = query.where(tuple_(HabitCompletion.user_id, HabitCompletion.habit_id, HabitCompletion.day) > tuple_(*after))
+    return conn.execute(query).all()
+
+
+def _stored_run_start(current: int, last, freq: int):
+    # First day of the run the Streak row holds, None if it holds none
+    if not current or last is None:
+        return None
+    return last - timedelta(days=(current - 1) * freq)
+
+
+def recompute_streaks(batch_size: int = 10000, today: date | None = None) -> dict:
+    today = today or date.today()
+    started = time.perf_counter()
+    rows_read = streaks_written = streaks_kept = 0
+    key = None  # (user_id, habit_id) of the group being folded
+    current = longest = 0
+    last = first_day = run_start = stored = None
+    pending = []
+
+    def flush(conn):
+        nonlocal streaks_written
+        if pending:
+            conn.execute(_update_streak, pending)
+            conn.commit()
+            streaks_written += len(pending)
+            pending.clear()
+
+    def finish():
+        nonlocal streaks_kept
+        stored_current, stored_last, freq = stored
+        stored_start = _stored_run_start(stored_current, stored_last, freq)
+        values = {"b_user_id": key[0], "b_habit_id": key[1], "b_current": current, "b_longest": longest, "b_last": last}
+        if run_start == first_day and stored_start is not None and stored_start < first_day:
+            # The run began before the log: only its tail is logged
+            values.update(b_current=stored_current, b_last=stored_last)
+            streaks_kept += 1
+        if is_lapsed(values["b_last"], freq, today):
+            values["b_current"] = 0
+        pending.append(values)
+
+    with engine.connect() as conn:
+        after = None
+        while True:
+            chunk = _read_chunk(conn, after, batch_size)
+            conn.commit()  # end the read before writing
+            if not chunk:
+                break
+
+            for user_id, habit_id, day, freq, stored_current, stored_last in chunk:
+                if (user_id, habit_id) != key:
+                    if key is not None:
+                        finish()
+                    key, current, longest, last = (user_id, habit_id), 0, 0, None
+                    first_day, stored = day, (stored_current, stored_last, freq)
+                current, longest = next_streak(current, longest, last, freq, day)
+                if current == 1:
+                    run_start = day
+                last = day
+
+            rows_read += len(chunk)
+            after = chunk[-1][:3]
+            if len(pending) >= batch_size:
+                flush(conn)
+
+        if key is not None:
+            finish()
+        flush(conn)
+
+    return {
+        "completions": rows_read,
+        "streaks": streaks_written,
+        "kept_current": streaks_kept,
+        "duration_s": round(time.perf_counter() - started, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--date", type=date.fromisoformat, default=None)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+    report = recompute_streaks(args.batch_size, args.date)
+    print(f"Rebuilt {report['streaks']} streaks from {report['completions']} completions in {report['duration_s']}s "
+          f"({report['kept_current']} kept their current run, which began before the log)")
+
+
+if __name__ == "__main__":
+    main()
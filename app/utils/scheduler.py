@@ -0,0 +1,82 @@
+import asyncio
+import logging
+from datetime import datetime, time, timedelta
+from ..core.config import SCHEDULER_ENABLED, NIGHTLY_JOBS_AT, LEADERBOARD_REFRESH_SECONDS
+from .streak_sweeper import sweep_expired_streaks
+from .leaderboard import leaderboard
+from .xp_buckets import compact_xp_buckets
+from .idempotency import purge_expired_keys
+from .quest_rotation import rotate_quests
+
+logger = logging.getLogger("app.scheduler")
+
+# (name, blocking callable returning a report dict); run in order once a night
+NIGHTLY_JOBS = [
+    ("streak_sweeper", sweep_expired_streaks),
+    ("quest_rotation", rotate_quests),
+    ("xp_bucket_compaction", compact_xp_buckets),
+    ("idempotency_key_purge", purge_expired_keys),
+]
+
+# (name, blocking callable, period in seconds); a period of 0 disables the job
+INTERVAL_JOBS = [
+    ("leaderboard_rebuild", leaderboard.rebuild, LEADERBOARD_REFRESH_SECONDS),
+]
+
+
+def seconds_until(at: time, now: datetime | None = None) -> float:
+    now = now or datetime.now()
+    run_at = datetime.combine(now.date(), at)
+    if run_at <= now:
+        run_at += timedelta(days=1)
+    return (run_at - now).total_seconds()
+
+
+async def run_job(name: str, job):
+    try:
+        report = await asyncio.to_thread(job)
+        logger.info("%s finished: %s", name, report)
+        return report
+    except Exception:
+        logger.exception("%s failed", name)
+
+
+async def run_nightly_jobs() -> dict:
+    return {name: await run_job(name, job) for name, job in NIGHTLY_JOBS}
+
+
+async def _nightly_loop():
+    at = time.fromisoformat(NIGHTLY_JOBS_AT)
+    while True:
+        await asyncio.sleep(seconds_until(at))
+        await run_nightly_jobs()
+
+
+async def _interval_loop(name: str, job, period: float):
+    while True:
+        await asyncio.sleep(period)
+        await run_job(name, job)
+
+
+_tasks: list[asyncio.Task] = []
+
+
+def start_scheduler():
+    if not SCHEDULER_ENABLED or _tasks:
+        return
+    loop = asyncio.get_running_loop()
+    _tasks.append(loop.create_task(_nightly_loop()))
+    for name, job, period in INTERVAL_JOBS:
+        if period > 0:
+            _tasks.append(loop.create_task(_interval_loop(name, job, period)))
+
+
+async def stop_scheduler():
+    for task in _tasks:
+        task.cancel()
+    for task in _tasks:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    _tasks.clear()
@@ -0,0 +1,72 @@
+"""Zero out streaks that expired because the habit was not completed in time.
+
+    python -m app.utils.streak_sweeper [--date 2025-01-31] [--chunk-size 20000]
+
+A streak is still alive while last_completed >= today - habit.frequency
+(complete_habit continues it exactly at that boundary). The sweep walks
+the streaks table in primary-key ranges; each range is a single UPDATE in
+its own short transaction, so online requests can take the write lock
+between chunks.
+"""
+import argparse
+import time
+from datetime import date
+from sqlalchemy import bindparam, func, select, update
+from ..db.base import engine
+from ..db.models import Habit, Streak
+
+_expiry_day = (
+    select(func.date(bindparam("today"), func.printf("-%d days", Habit.frequency)))
+    .where(Habit.id == Streak.habit_id)
+    .scalar_subquery()
+)
+
+_expire_chunk = (
+    update(Streak)
+    .where(
+        Streak.id >= bindparam("lo"),
+        Streak.id < bindparam("hi"),
+        Streak.current_streak > 0,
+        Streak.last_completed < _expiry_day,
+    )
+    .values(current_streak=0)
+    .execution_options(synchronize_session=False)
+)
+
+
+def sweep_expired_streaks(today: date | None = None, chunk_size: int = 20000, pause: float = 0.01) -> dict:
+    today = today or date.today()
+    started = time.perf_counter()
+    rows = chunks = 0
+
+    with engine.connect() as conn:
+        first_id, last_id = conn.execute(select(func.min(Streak.id), func.max(Streak.id))).one()
+
+    if first_id is not None:
+        for lo in range(first_id, last_id + 1, chunk_size):
+            with engine.begin() as conn:
+                result = conn.execute(_expire_chunk, {"today": today.isoformat(), "lo": lo, "hi": lo + chunk_size})
+            rows += result.rowcount
+            chunks += 1
+            if pause:
+                time.sleep(pause)
+
+    return {
+        "day": today.isoformat(),
+        "rows": rows,
+        "chunks": chunks,
+        "duration_s": round(time.perf_counter() - started, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--date", type=date.fromisoformat, default=None)
+    parser.add_argument("--chunk-size", type=int, default=20000)
+    args = parser.parse_args()
+    report = sweep_expired_streaks(args.date, args.chunk_size)
+    print(f"Expired {report['rows']} streaks in {report['chunks']} chunks, {report['duration_s']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+from datetime import date, datetime, timedelta
+from ..db.models import HabitCompletion, Streak
+
+
+def next_streak(current: int, longest: int, last_completed: date | None, freq: int, day: date) -> tuple[int, int]:
+    if last_completed == day - timedelta(days=freq):
+        current += 1
+    else:
+        current = 1
+    return current, max(longest, current)
+
+
+def is_lapsed(last_completed: date | None, freq: int, today: date) -> bool:
+    # The streak sweeper's rule: a run is alive while last_completed >= today - freq
+    return last_completed is not None and last_completed < today - timedelta(days=freq)
+
+
+def advance_streak(streak: Streak, freq: int, day: date):
+    streak.current_streak, streak.longest_streak = next_streak(
+        streak.current_streak, streak.longest_streak, streak.last_completed, freq, day
+    )
+    streak.last_completed = day
+
+
+def completion_row(streak: Streak, day: date) -> dict:
+    return {"user_id": streak.user_id, "habit_id": streak.habit_id, "day": day, "created_at": datetime.utcnow()}
+
+
+def record_completion(session, streak: Streak, freq: int, day: date) -> HabitCompletion:
+    # Append to the log and fold the event into the materialized Streak row
+    completion = HabitCompletion(user_id=streak.user_id, habit_id=streak.habit_id, day=day)
+    session.add(completion)
+    advance_streak(streak, freq, day)
+    session.add(streak)
+    return completion
+
+
+def is_duplicate_completion(exc) -> bool:
+    # IntegrityError from ix_habit_completions_user_habit_day
+    return "habit_completions" in str(exc.orig)
@@ -0,0 +1,55 @@
+import time
+import jwt
+from sqlalchemy.orm import make_transient_to_detached
+from sqlmodel import Session, select
+from ..core.config import SECRET_KEY, ALGORITHM, USER_CACHE_TTL_SECONDS, USER_CACHE_MAX_SIZE
+from ..db.base import engine
+from ..db.models import User
+from .cache import TTLCache
+
+# Per-process caches: token -> decoded claims, username -> User column snapshot.
+# Other workers only see an invalidation once their entry's TTL runs out.
+token_cache = TTLCache(maxsize=USER_CACHE_MAX_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+user_cache = TTLCache(maxsize=USER_CACHE_MAX_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
+
+def decode_token(token: str) -> dict:
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    exp = payload.get("exp")
+    token_cache.set(token, payload, ttl=exp - time.time() if exp else None)
+    return payload
+
+
+def cached_user_snapshot(username: str) -> dict | None:
+    return user_cache.get(username)
+
+
+def load_user_snapshot(username: str) -> dict | None:
+    # Blocking: async callers run this in the threadpool. Uses its own
+    # short-lived session so no request session pins a pooled connection.
+    with Session(engine) as lookup:
+        user = lookup.exec(select(User).where(User.username == username)).first()
+        if user is None:
+            return None
+        snapshot = user.model_dump()
+    user_cache.set(username, snapshot)
+    return snapshot
+
+
+def attach_user(session: Session, snapshot: dict) -> User:
+    # Attach a fresh copy to the request's session without a SELECT
+    user = User(**snapshot)
+    make_transient_to_detached(user)
+    return session.merge(user, load=False)
+
+
+def invalidate_user(username: str):
+    user_cache.pop(username)
+
+
+def user_cache_stats() -> dict:
+    return {"tokens": token_cache.stats(), "users": user_cache.stats()}
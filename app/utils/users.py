@@ -1,7 +1,44 @@
+from sqlalchemy import update
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
 from ..db.models import User, Role
-from app.core.security import verify_password
+from app.core.security import verify_password, verify_password_async
 from fastapi import HTTPException
+from math import floor
+from datetime import date
+from .achievement_rules import Transition
+from .xp_buckets import add_xp
+
+def level_for_xp(xp: int) -> int:
+    return floor(xp**0.5 / 10)
+
+
+async def add_user_xp(session, user: User, xp: int) -> tuple[int, int]:
+    # Adds xp in SQL rather than writing back user.xp, so XP committed by a
+    # concurrent request since `user` was read is kept; the UPDATE also takes
+    # the write lock before the level is set. `user` is brought in line with
+    # the row. -> (xp, level) before the change
+    users = User.__table__
+    result = await session.exec(
+        update(users).where(users.c.id == user.id).values(xp=users.c.xp + xp).returning(users.c.xp, users.c.level)
+    )
+    new_xp, old_level = result.one()
+    new_level = level_for_xp(new_xp)
+    if new_level != old_level:
+        await session.exec(update(users).where(users.c.id == user.id).values(level=new_level))
+    set_committed_value(user, "xp", new_xp)
+    set_committed_value(user, "level", new_level)
+    return new_xp - xp, old_level
+
+
+async def grant_xp(session, user: User, xp: int) -> list[Transition]:
+    # Reward XP inside the caller's transaction; -> the xp / level transitions
+    if not xp:
+        return []
+    old_xp, old_level = await add_user_xp(session, user, xp)
+    await session.exec(add_xp(user.id, xp, date.today()))
+    return [Transition("xp", old_xp, user.xp), Transition("level", old_level, user.level)]
+
 
 def require_role(user: User, roles: list[Role]):
     if user.role not in roles:
@@ -19,3 +56,15 @@ def authenticate_user(db: Session, username: str, password: str):
     if not verify_password(password, user.password):
         return None
     return user
+
+
+async def authenticate_user_async(db: Session, username: str, password: str):
+    user = get_user_by_username(db, username)
+    if not user:
+        return None
+    # Hand the pooled connection back while bcrypt runs
+    db.expunge(user)
+    db.rollback()
+    if not await verify_password_async(password, user.password):
+        return None
+    return user
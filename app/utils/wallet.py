@@ -0,0 +1,101 @@
+from datetime import datetime
+from sqlalchemy import insert, update
+from ..db.models import UserWallet, WalletLedger
+
+CURRENCIES = ("coins", "gems", "event_tokens")
+
+# A change is (currency, delta, reference). All changes of one call are applied
+# by a single conditional UPDATE ... RETURNING, so concurrent requests never
+# overwrite each other's balances, and are then logged in wallet_ledger with the
+# balance each one left behind. The caller commits.
+
+
+def _totals(changes: list[tuple]) -> dict[str, int]:
+    totals = {}
+    for currency, delta, _ in changes:
+        totals[currency] = totals.get(currency, 0) + delta
+    return totals
+
+
+def balance_update(user_id: int, totals: dict[str, int], *conditions):
+    # No row comes back when the wallet is missing, a debit would take a
+    # balance below zero or one of the extra conditions fails
+    columns = {currency: getattr(UserWallet, currency) for currency in totals}
+    return (
+        update(UserWallet)
+        .where(
+            UserWallet.user_id == user_id,
+            *(columns[c] + delta >= 0 for c, delta in totals.items() if delta < 0),
+            *conditions,
+        )
+        .values({c: columns[c] + delta for c, delta in totals.items()})
+        .returning(*columns.values())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def ledger_insert(user_id: int, changes: list[tuple], balances: dict[str, int], reason: str):
+    now = datetime.utcnow()
+    running = dict(balances)
+    rows = []
+    for currency, delta, reference in reversed(changes):
+        rows.append({
+            "user_id": user_id, "currency": currency, "delta": delta, "balance": running[currency],
+            "reason": reason, "reference": reference, "created_at": now,
+        })
+        running[currency] -= delta
+    rows.reverse()
+    return insert(WalletLedger).values(rows)
+
+
+def apply_changes(session, user_id: int, changes: list[tuple], reason: str, *conditions) -> dict | None:
+    # -> new balances of the touched currencies, or None if the update was
+    # refused. Zero deltas are not logged; with conditions they still guard.
+    totals = _totals(changes)
+    if not any(totals.values()) and not conditions:
+        return {}
+    row = session.exec(balance_update(user_id, totals, *conditions)).first()
+    if row is None:
+        return None
+    balances = dict(zip(totals, row))
+    logged = [change for change in changes if change[1]]
+    if logged:
+        session.exec(ledger_insert(user_id, logged, balances, reason))
+    return balances
+
+
+async def apply_changes_async(session, user_id: int, changes: list[tuple], reason: str, *conditions) -> dict | None:
+    totals = _totals(changes)
+    if not any(totals.values()) and not conditions:
+        return {}
+    row = (await session.exec(balance_update(user_id, totals, *conditions))).first()
+    if row is None:
+        return None
+    balances = dict(zip(totals, row))
+    logged = [change for change in changes if change[1]]
+    if logged:
+        await session.exec(ledger_insert(user_id, logged, balances, reason))
+    return balances
+
+
+def credit_users(conn, user_ids: list[int], currency: str, delta: int, reason: str, reference: str | None = None) -> int:
+    # Set-based credit of the same amount to many wallets (bulk jobs), logged
+    # per user. Only for deltas >= 0: nothing guards the balance. The caller
+    # commits.
+    if not user_ids or not delta:
+        return 0
+    column = getattr(UserWallet, currency)
+    rows = conn.execute(
+        update(UserWallet)
+        .where(UserWallet.user_id.in_(user_ids))
+        .values({currency: column + delta})
+        .returning(UserWallet.user_id, column)
+    ).all()
+    if rows:
+        now = datetime.utcnow()
+        conn.execute(insert(WalletLedger), [
+            {"user_id": user_id, "currency": currency, "delta": delta, "balance": balance,
+             "reason": reason, "reference": reference, "created_at": now}
+            for user_id, balance in rows
+        ])
+    return len(rows)
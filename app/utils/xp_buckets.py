@@ -0,0 +1,147 @@
+import time
+from datetime import date, timedelta
+from sqlalchemy import delete, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+from ..core.config import XP_WEEK_RETENTION, XP_MONTH_RETENTION
+from ..db.base import engine
+from ..db.models import User, XpBucket
+
+PERIODS = ("week", "month")
+
+
+def period_start(period: str, day: date) -> date:
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def add_xp(user_id: int, xp: int, day: date):
+    # One upsert statement for every period bucket the day falls into;
+    # execute it with session.exec() inside the caller's transaction
+    return add_xp_many({user_id: xp}, day)
+
+
+def add_xp_many(amounts: dict[int, int], day: date):
+    # add_xp for several users (user id -> xp) in one statement
+    return _upsert([
+        {"user_id": user_id, "period": period, "period_start": period_start(period, day), "xp": xp}
+        for user_id, xp in amounts.items()
+        for period in PERIODS
+    ])
+
+
+def add_xp_by_day(user_id: int, amounts: dict[date, int]):
+    # add_xp for XP earned on several days (day -> xp) in one statement, each
+    # day counted in its own week and month
+    buckets = {}
+    for day, xp in amounts.items():
+        for period in PERIODS:
+            key = (period, period_start(period, day))
+            buckets[key] = buckets.get(key, 0) + xp
+    return _upsert([
+        {"user_id": user_id, "period": period, "period_start": start, "xp": xp}
+        for (period, start), xp in buckets.items()
+    ])
+
+
+def _upsert(rows: list[dict]):
+    statement = sqlite_insert(XpBucket).values(rows)
+    return statement.on_conflict_do_update(
+        index_elements=["period", "period_start", "user_id"],
+        set_={"xp": XpBucket.xp + statement.excluded.xp},
+    )
+
+
+def _board(period: str, start: date):
+    return (
+        select(XpBucket.user_id, XpBucket.xp, User.nickname, User.level)
+        .join(User, User.id == XpBucket.user_id)
+        .where(XpBucket.period == period, XpBucket.period_start == start)
+    )
+
+
+def _entry(rank: int, row) -> dict:
+    user_id, xp, nickname, level = row
+    return {"rank": rank, "user_id": user_id, "nickname": nickname, "xp": xp, "level": level}
+
+
+def period_top(session: Session, period: str, day: date, limit: int) -> list[dict]:
+    rows = session.exec(
+        _board(period, period_start(period, day))
+        .order_by(XpBucket.xp.desc(), XpBucket.user_id)
+        .limit(limit)
+    ).all()
+    return [_entry(i + 1, row) for i, row in enumerate(rows)]
+
+
+def period_around(session: Session, period: str, day: date, user_id: int, window: int):
+    # -> (rank, total, entries), or (None, total, []) when the user has no XP
+    # in that period. Ties (same xp) are ordered by user id, as in period_top.
+    start = period_start(period, day)
+    in_period = (XpBucket.period == period, XpBucket.period_start == start)
+    total = session.exec(select(func.count()).select_from(XpBucket).where(*in_period)).one()
+    xp = session.exec(select(XpBucket.xp).where(*in_period, XpBucket.user_id == user_id)).first()
+    if xp is None:
+        return None, total, []
+
+    # Two range counts rather than one OR, so both stay index searches
+    higher = session.exec(select(func.count()).select_from(XpBucket).where(*in_period, XpBucket.xp > xp)).one()
+    tied_before = session.exec(
+        select(func.count()).select_from(XpBucket).where(*in_period, XpBucket.xp == xp, XpBucket.user_id < user_id)
+    ).one()
+    rank = higher + tied_before + 1
+
+    board = _board(period, start)
+    above = session.exec(
+        board.where(XpBucket.xp == xp, XpBucket.user_id < user_id).order_by(XpBucket.user_id.desc()).limit(window)
+    ).all()
+    if len(above) < window:
+        above += session.exec(
+            board.where(XpBucket.xp > xp)
+            .order_by(XpBucket.xp, XpBucket.user_id.desc())
+            .limit(window - len(above))
+        ).all()
+    below = session.exec(
+        board.where(XpBucket.xp == xp, XpBucket.user_id >= user_id).order_by(XpBucket.user_id).limit(window + 1)
+    ).all()
+    if len(below) < window + 1:
+        below += session.exec(
+            board.where(XpBucket.xp < xp)
+            .order_by(XpBucket.xp.desc(), XpBucket.user_id)
+            .limit(window + 1 - len(below))
+        ).all()
+
+    first = rank - len(above)
+    rows = list(reversed(above)) + below
+    return rank, total, [_entry(first + i, row) for i, row in enumerate(rows)]
+
+
+def compact_xp_buckets(today: date | None = None, chunk_size: int = 20000) -> dict:
+    # Drop buckets older than the retention windows, a chunk per transaction
+    today = today or date.today()
+    started = time.perf_counter()
+    cutoffs = {
+        "week": period_start("week", today) - timedelta(weeks=XP_WEEK_RETENTION),
+        "month": _months_before(period_start("month", today), XP_MONTH_RETENTION),
+    }
+    deleted = {}
+    for period, cutoff in cutoffs.items():
+        deleted[period] = 0
+        while True:
+            expired = (
+                select(XpBucket.id)
+                .where(XpBucket.period == period, XpBucket.period_start < cutoff)
+                .limit(chunk_size)
+            )
+            with engine.begin() as conn:
+                removed = conn.execute(delete(XpBucket).where(XpBucket.id.in_(expired))).rowcount
+            deleted[period] += removed
+            if removed < chunk_size:
+                break
+    return {**deleted, "duration_s": round(time.perf_counter() - started, 3)}
+
+
+def _months_before(first_of_month: date, months: int) -> date:
+    index = first_of_month.year * 12 + first_of_month.month - 1 - months
+    return date(index // 12, index % 12 + 1, 1)
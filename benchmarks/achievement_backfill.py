@@ -0,0 +1,120 @@
+"""Time the retroactive grant of new achievements to N users.
+
+Seeds N users (random XP/level) with one habit each (random longest and
+current streak), then creates a few achievements and backfills each one
+while a writer thread keeps issuing small wallet UPDATE transactions.
+Reports per achievement the users granted, duration and the writer's
+latency, and checks that:
+
+  - exactly the users meeting the condition (counted independently) got it
+  - each of them got the gem reward once, with one ledger row
+  - a second backfill grants nothing
+
+    python -m benchmarks.achievement_backfill --users 1000000 --chunk-size 2000
+"""
+import argparse
+import sys
+import threading
+import time
+from .common import percentile, seed_habits, seed_users, use_temp_database, wallet_writer
+
+# (title, condition, gems, SQL counting the users who meet it)
+ACHIEVEMENTS = [
+    ("XP 2500", {"field": "xp", "operator": ">=", "value": 2500}, 5, "SELECT count(*) FROM users WHERE xp >= 2500"),
+    ("Level 4", {"field": "level", "operator": ">", "value": 3}, 2, "SELECT count(*) FROM users WHERE level > 3"),
+    ("Streak 30", {"field": "streak", "operator": ">=", "value": 30}, 3,
+     "SELECT count(DISTINCT user_id) FROM streaks WHERE longest_streak >= 30"),
+]
+
+
+def seed(engine, users: int):
+    from sqlalchemy import text
+
+    for start in range(1, users + 1, 100000):
+        count = min(100000, users + 1 - start)
+        seed_users(engine, count, start=start)
+        seed_habits(engine, list(range(start, start + count)), 1)
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE users SET xp = abs(random()) % 5000"))
+        conn.execute(text("UPDATE users SET level = 1 + xp / 1000"))
+        conn.execute(text("UPDATE streaks SET longest_streak = abs(random()) % 60"))
+        conn.execute(text("UPDATE streaks SET current_streak = longest_streak / 2"))
+
+
+def backfill_with_writer(engine, users: int, achievement_id: int, chunk_size: int, pause: float) -> tuple[dict, list]:
+    from app.utils.achievement_backfill import backfill_achievement
+
+    stop, latencies = threading.Event(), []
+    writer = threading.Thread(target=wallet_writer, args=(engine, users, stop, latencies))
+    writer.start()
+    try:
+        job = backfill_achievement(achievement_id, chunk_size, pause)
+    finally:
+        stop.set()
+        writer.join()
+    return job, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--pause", type=float, default=0.02, help="seconds between chunks")
+    args = parser.parse_args()
+
+    use_temp_database("habit-achievement-backfill-")
+    from sqlalchemy import func, insert, select, text
+    from app.db.base import engine
+    from app.db.init_db import create_db_and_tables
+    from app.db.models import Achievement, UserAchievement, UserWallet, WalletLedger
+    from app.utils.achievement_backfill import backfill_achievement
+
+    create_db_and_tables()
+    started = time.perf_counter()
+    seed(engine, args.users)
+    print(f"seeded {args.users} users in {time.perf_counter() - started:.1f}s")
+
+    errors = []
+    print(f"{'achievement':<12} {'granted':>9} {'chunks':>7} {'total s':>8} {'slowest chunk ms':>17} {'writes':>7} "
+          f"{'write p50':>10} {'write p99':>10} {'write max':>10}")
+    for title, condition, gems, expected_sql in ACHIEVEMENTS:
+        with engine.begin() as conn:
+            achievement_id = conn.execute(
+                insert(Achievement).returning(Achievement.id),
+                {"title": title, "condition": condition, "gems_reward": gems},
+            ).scalar()
+            expected = conn.execute(text(expected_sql)).scalar()
+        job, latencies = backfill_with_writer(engine, args.users, achievement_id, args.chunk_size, args.pause)
+        print(f"{title:<12} {job['granted']:>9} {job['chunks']:>7} {job['duration_s']:>8.2f} {job['slowest_chunk_ms']:>17.1f} {len(latencies):>7} "
+              f"{percentile(latencies, 50):>10.2f} {percentile(latencies, 99):>10.2f} {max(latencies, default=0):>10.2f}")
+
+        reference = f"achievement:{achievement_id}"
+        with engine.connect() as conn:
+            rows = conn.execute(
+                select(func.count()).where(UserAchievement.achievement_id == achievement_id)
+            ).scalar()
+            ledger = conn.execute(
+                select(func.count(), func.sum(WalletLedger.delta)).where(WalletLedger.reference == reference)
+            ).one()
+        if job["status"] != "done" or not job["granted"] == rows == expected:
+            errors.append(f"{title}: {job['status']}, granted {job['granted']}, {rows} rows, {expected} qualify")
+        if tuple(ledger) != (expected, expected * gems if expected else None):
+            errors.append(f"{title}: ledger {tuple(ledger)} for {expected} users x {gems} gems")
+        again = backfill_achievement(achievement_id, args.chunk_size, 0)
+        if again["granted"]:
+            errors.append(f"{title}: a second backfill granted {again['granted']} more")
+
+    with engine.connect() as conn:
+        total_gems = conn.execute(select(func.sum(UserWallet.gems))).scalar()
+        total_ledger = conn.execute(select(func.sum(WalletLedger.delta)).where(WalletLedger.currency == "gems")).scalar()
+    if total_gems != total_ledger:
+        errors.append(f"wallets hold {total_gems} gems, the ledger says {total_ledger}")
+
+    print("checks: " + ("OK" if not errors else f"{len(errors)} failed"))
+    for error in errors:
+        print("  " + error)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Old full-scan achievement check vs the compiled rule index.
+
+    python -m benchmarks.achievement_rules --sizes 10 1000 100000
+"""
+import argparse
+import json
+import random
+import time
+from sqlalchemy import insert
+from sqlmodel import SQLModel, Session, create_engine, select
+from app.db.models import Achievement, Streak, User
+from app.utils.achievement_rules import AchievementRuleIndex, Transition
+from app.utils.check_condition import check_condition
+
+FIELD_RANGES = {"streak": 365, "xp": 100_000, "level": 30}
+
+
+def make_catalog(size: int, rng: random.Random) -> list[dict]:
+    rows = []
+    for i in range(1, size + 1):
+        field = rng.choice(list(FIELD_RANGES))
+        operator = rng.choice([">=", ">=", ">=", ">", "=="])
+        rows.append({
+            "id": i,
+            "title": f"Achievement {i}",
+            "condition": {"field": field, "operator": operator, "value": rng.randint(1, FIELD_RANGES[field])},
+            "gems_reward": 1,
+        })
+    return rows
+
+
+def old_path(session: Session, streak: Streak, user: User, obtained_ids: set[int]) -> list[int]:
+    granted = []
+    for ach in session.exec(select(Achievement)).all():
+        if ach.id in obtained_ids:
+            continue
+        cond = ach.condition if isinstance(ach.condition, dict) else json.loads(ach.condition)
+        if check_condition(cond, streak, user):
+            granted.append(ach.id)
+    return granted
+
+
+def new_path(index: AchievementRuleIndex, transitions, obtained_ids: set[int]) -> list[int]:
+    return [ach_id for ach_id in index.triggered(transitions) if ach_id not in obtained_ids]
+
+
+def timed(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def run(size: int, completions: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Achievement), make_catalog(size, rng))
+
+    index = AchievementRuleIndex()
+    with Session(engine) as session:
+        started = time.perf_counter()
+        index.build(session.exec(select(Achievement.id, Achievement.condition, Achievement.gems_reward)).all())
+        build_ms = (time.perf_counter() - started) * 1000
+
+    # A user completing the same habit day after day
+    user = User(id=1, username="bench", password="x", xp=0, level=0)
+    streak = Streak(id=1, user_id=1, habit_id=1, current_streak=0)
+    repeat = max(1, min(completions, 200_000 // size))
+    old_ms = new_ms = 0.0
+    with Session(engine) as session:
+        for _ in range(completions):
+            transitions = [
+                Transition("streak", streak.current_streak, streak.current_streak + 1),
+                Transition("xp", user.xp, user.xp + 10),
+                Transition("level", user.level, int((user.xp + 10) ** 0.5 / 10)),
+            ]
+            streak.current_streak += 1
+            user.xp += 10
+            user.level = transitions[2].new
+
+            old_ms += timed(lambda: old_path(session, streak, user, set()), repeat)
+            new_ms += timed(lambda: new_path(index, transitions, set()), repeat)
+
+    return {
+        "size": size,
+        "build_ms": round(build_ms, 3),
+        "old_ms": round(old_ms / completions, 4),
+        "new_ms": round(new_ms / completions, 4),
+        "speedup": round(old_ms / new_ms, 1) if new_ms else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1_000, 100_000])
+    parser.add_argument("--completions", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'catalog':>10} {'build ms':>10} {'old ms':>10} {'new ms':>10} {'speedup':>9}")
+    for size in args.sizes:
+        r = run(size, args.completions, args.seed)
+        print(f"{r['size']:>10} {r['build_ms']:>10} {r['old_ms']:>10} {r['new_ms']:>10} {r['speedup']:>8}x")
+
+
+if __name__ == "__main__":
+    main()
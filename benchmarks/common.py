@@ -0,0 +1,113 @@
+import os
+import random
+import tempfile
+import threading
+import time
+
+BASE_URL = "http://bench"
+
+
+def use_temp_database(prefix: str = "habit-bench-") -> str:
+    # Must run before app.db.base is imported: the engines read DATABASE_URL once
+    path = os.path.join(tempfile.mkdtemp(prefix=prefix), "database.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    return path
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = (len(ordered) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(latencies_ms: list[float], elapsed_s: float, errors: int = 0) -> dict:
+    return {
+        "requests": len(latencies_ms),
+        "errors": errors,
+        "throughput_rps": round(len(latencies_ms) / elapsed_s, 1) if elapsed_s else 0.0,
+        "p50_ms": round(percentile(latencies_ms, 50), 2),
+        "p95_ms": round(percentile(latencies_ms, 95), 2),
+        "p99_ms": round(percentile(latencies_ms, 99), 2),
+    }
+
+
+def asgi_client(app, raise_app_exceptions: bool = True):
+    import httpx
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=raise_app_exceptions)
+    return httpx.AsyncClient(transport=transport, base_url=BASE_URL, timeout=60)
+
+
+def auth_headers(username: str) -> dict:
+    from app.core.security import create_access_token
+    return {"Authorization": f"Bearer {create_access_token({'sub': username})}"}
+
+
+def seed_users(engine, count: int, password: str = "bench", start: int = 1) -> list[str]:
+    from sqlalchemy import insert
+    from app.core.security import _hash
+    from app.db.models import User, UserWallet
+
+    # One bcrypt hash shared by every synthetic user keeps seeding fast
+    hashed = _hash(password)
+    usernames = [f"bench{i}" for i in range(start, start + count)]
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": start + i, "username": name, "nickname": name, "password": hashed, "role": "user", "xp": 0, "level": 1}
+            for i, name in enumerate(usernames)
+        ])
+        conn.execute(insert(UserWallet), [
+            {"user_id": start + i, "coins": 0, "gems": 0, "event_tokens": 0}
+            for i in range(count)
+        ])
+    return usernames
+
+
+
+def seed_habits(engine, user_ids: list[int], per_user: int, frequency: int = 1) -> dict[int, list[int]]:
+    from sqlalchemy import insert, select
+    from app.db.models import Habit, Streak
+
+    with engine.begin() as conn:
+        start = (conn.execute(select(Habit.id).order_by(Habit.id.desc()).limit(1)).scalar() or 0) + 1
+        habits, streaks, by_user = [], [], {}
+        habit_id = start
+        for user_id in user_ids:
+            for n in range(per_user):
+                habits.append({"id": habit_id, "title": f"habit {n}", "owner_id": user_id, "frequency": frequency, "is_active": True})
+                streaks.append({"user_id": user_id, "habit_id": habit_id, "current_streak": 0, "longest_streak": 0})
+                by_user.setdefault(user_id, []).append(habit_id)
+                habit_id += 1
+        conn.execute(insert(Habit), habits)
+        conn.execute(insert(Streak), streaks)
+    return by_user
+
+
+def seed_shop_items(engine, count: int, price: int = 1) -> list[int]:
+    from sqlalchemy import insert
+    from app.db.models import ShopItem
+
+    with engine.begin() as conn:
+        result = conn.execute(insert(ShopItem).returning(ShopItem.id), [
+            {"name": f"item {i}", "price": price, "currency": "COINS", "type": f"type{i % 5}", "need_xp": 0}
+            for i in range(count)
+        ])
+        return list(result.scalars())
+
+
+def wallet_writer(engine, users: int, stop: threading.Event, latencies: list):
+    # Small wallet UPDATE transactions, like online requests make, until stopped;
+    # run in a thread next to a bulk job to see how long writers wait
+    from sqlalchemy import update
+    from app.db.models import UserWallet
+
+    rng = random.Random(5)
+    while not stop.is_set():
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            conn.execute(update(UserWallet).where(UserWallet.user_id == rng.randint(1, users)).values(coins=UserWallet.coins + 1))
+        latencies.append((time.perf_counter() - started) * 1000)
+        time.sleep(0.005)
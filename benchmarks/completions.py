@@ -0,0 +1,67 @@
+"""Habit completions per second under concurrent clients.
+
+Every client owns its own users and completes each of their habits once,
+so no request is rejected as "already completed today".
+
+    python -m benchmarks.completions --clients 1 8 32 --users 64 --habits 20
+"""
+import argparse
+import asyncio
+import time
+from .common import asgi_client, auth_headers, seed_habits, seed_users, summarize, use_temp_database
+
+
+async def _client(client, jobs, latencies, errors):
+    for headers, habit_id in jobs:
+        started = time.perf_counter()
+        response = await client.post(f"/habits/{habit_id}/complete", headers=headers)
+        latencies.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            errors.append(response.status_code)
+
+
+async def run(app, engine, clients: int, users: int, habits: int) -> dict:
+    from sqlalchemy import func, select
+    from app.db.models import User
+
+    with engine.connect() as conn:
+        start = (conn.execute(select(func.max(User.id))).scalar() or 0) + 1
+    usernames = seed_users(engine, users, start=start)
+    habit_ids = seed_habits(engine, list(range(start, start + users)), habits)
+
+    # Users are split between clients so that concurrent requests hit different rows
+    plans = [[] for _ in range(clients)]
+    for i, username in enumerate(usernames):
+        headers = auth_headers(username)
+        plans[i % clients].extend((headers, habit_id) for habit_id in habit_ids[start + i])
+
+    latencies, errors = [], []
+    async with asgi_client(app) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(_client(client, plan, latencies, errors) for plan in plans))
+        elapsed = time.perf_counter() - started
+    return summarize(latencies, elapsed, len(errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--users", type=int, default=64)
+    parser.add_argument("--habits", type=int, default=20, help="habits per user")
+    args = parser.parse_args()
+
+    use_temp_database()
+    from app.db.base import engine
+    from app.db.init_db import create_db_and_tables
+    from app.main import app
+
+    create_db_and_tables()
+    print(f"{'clients':>8} {'completions':>12} {'per sec':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for clients in args.clients:
+        r = asyncio.run(run(app, engine, clients, args.users, args.habits))
+        print(f"{clients:>8} {r['requests']:>12} {r['throughput_rps']:>9} {r['p50_ms']:>8} "
+              f"{r['p95_ms']:>8} {r['p99_ms']:>8} {r['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Login throughput and latency of unrelated endpoints while logins run.
+
+Each executor kind runs in its own process because the pool is configured
+from the environment at import time. "inline" hashes on the event loop,
+which is what /token did before the hashing pool existed.
+
+    python -m benchmarks.hashing --executors inline thread process
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from .common import asgi_client, auth_headers, seed_users, summarize, use_temp_database
+
+
+async def _loop(client, method, url, deadline, latencies, errors, **kwargs):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        latencies.append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            errors.append(response.status_code)
+
+
+async def _phase(app, duration, login_concurrency, probe_concurrency, usernames):
+    probe_latencies, probe_errors = [], []
+    login_latencies, login_errors = [], []
+    async with asgi_client(app) as client:
+        deadline = time.perf_counter() + duration
+        tasks = [
+            _loop(client, "GET", "/users/me/", deadline, probe_latencies, probe_errors,
+                  headers=auth_headers(usernames[i % len(usernames)]))
+            for i in range(probe_concurrency)
+        ]
+        tasks += [
+            _loop(client, "POST", "/token", deadline, login_latencies, login_errors,
+                  data={"username": usernames[i % len(usernames)], "password": "bench"})
+            for i in range(login_concurrency)
+        ]
+        started = time.perf_counter()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+    return summarize(login_latencies, elapsed, len(login_errors)), summarize(probe_latencies, elapsed, len(probe_errors))
+
+
+def run_one(executor: str, duration: float, login_concurrency: int, probe_concurrency: int) -> dict:
+    use_temp_database()
+    from app.db.base import engine
+    from app.db.init_db import create_db_and_tables
+    from app.core.security import _verify, hashing_executor
+    from app.main import app
+    import app.utils.users as users
+
+    if executor == "inline":
+        async def verify_inline(plain_password, hashed_password):
+            return _verify(plain_password, hashed_password)
+        users.verify_password_async = verify_inline
+
+    create_db_and_tables()
+    usernames = seed_users(engine, max(login_concurrency, probe_concurrency, 1))
+
+    _, idle_probe = asyncio.run(_phase(app, duration, 0, probe_concurrency, usernames))
+    logins, busy_probe = asyncio.run(_phase(app, duration, login_concurrency, probe_concurrency, usernames))
+    hashing_executor.shutdown()
+    return {"executor": executor, "logins": logins, "probe_idle": idle_probe, "probe_under_load": busy_probe}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--executors", nargs="+", default=["inline", "thread", "process"])
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--login-concurrency", type=int, default=16)
+    parser.add_argument("--probe-concurrency", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=None, help="HASH_WORKERS for the pool")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_one(args.child, args.duration, args.login_concurrency, args.probe_concurrency)
+        print(json.dumps(result))
+        return
+
+    print(f"{'executor':>9} {'logins/s':>9} {'login p99':>10} {'probe p99 idle':>15} {'probe p99 busy':>15} {'errors':>7}")
+    for executor in args.executors:
+        env = dict(os.environ, HASH_EXECUTOR="thread" if executor == "inline" else executor)
+        if args.workers:
+            env["HASH_WORKERS"] = str(args.workers)
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.hashing", "--child", executor,
+             "--duration", str(args.duration),
+             "--login-concurrency", str(args.login_concurrency),
+             "--probe-concurrency", str(args.probe_concurrency)],
+            env=env, cwd=os.getcwd(), check=True, capture_output=True, text=True,
+        ).stdout
+        r = json.loads(output.strip().splitlines()[-1])
+        errors = r["logins"]["errors"] + r["probe_under_load"]["errors"]
+        print(f"{executor:>9} {r['logins']['throughput_rps']:>9} {r['logins']['p99_ms']:>10} "
+              f"{r['probe_idle']['p99_ms']:>15} {r['probe_under_load']['p99_ms']:>15} {errors:>7}")
+
+
+if __name__ == "__main__":
+    main()
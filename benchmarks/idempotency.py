@@ -0,0 +1,128 @@
+"""Latency of Idempotency-Key replays vs. running the request.
+
+For POST /habits/{id}/complete and POST /shop/buy/ every request is sent
+once with a fresh key (runs the route), then replayed with the same key
+(served from the in-process LRU), then replayed again after the LRU is
+cleared (served from the idempotency_keys table). Reports p50/p95 per
+phase and checks that replays return the original response and leave
+wallets, the ledger and streaks untouched. Finally one key is fired
+concurrently to check the route ran exactly once.
+
+    python -m benchmarks.idempotency --requests 300
+"""
+import argparse
+import asyncio
+import sys
+import time
+from .common import asgi_client, auth_headers, percentile, seed_habits, seed_shop_items, seed_users, use_temp_database
+
+
+def _state(engine) -> tuple:
+    from sqlalchemy import func, select
+    from app.db.models import HabitCompletion, UserItem, UserWallet, WalletLedger
+
+    with engine.connect() as conn:
+        return tuple(
+            conn.execute(statement).scalar()
+            for statement in (
+                select(func.count()).select_from(WalletLedger),
+                select(func.count()).select_from(HabitCompletion),
+                select(func.count()).select_from(UserItem),
+                select(func.sum(UserWallet.coins)),
+            )
+        )
+
+
+async def _phase(client, requests, keys, errors: list, expected=None) -> tuple[list, list]:
+    latencies, responses = [], []
+    for (method, url, kwargs), key in zip(requests, keys):
+        headers = {**kwargs["headers"], "Idempotency-Key": key}
+        started = time.perf_counter()
+        response = await client.request(method, url, **{**kwargs, "headers": headers})
+        latencies.append((time.perf_counter() - started) * 1000)
+        responses.append((response.status_code, response.content))
+        if expected is not None and response.headers.get("idempotent-replayed") != "true":
+            errors.append(f"{url}: replay not marked as replayed")
+    if expected is not None and responses != expected:
+        errors.append(f"{requests[0][1]}: replayed responses differ from the originals")
+    return latencies, responses
+
+
+async def run(app, engine, routes: dict, errors: list) -> dict:
+    from app.utils.idempotency import response_cache
+
+    results = {}
+    async with asgi_client(app) as client:
+        for name, requests in routes.items():
+            keys = [f"{name}-{i}" for i in range(len(requests))]
+            first, originals = await _phase(client, requests, keys, errors)
+            if any(status >= 400 for status, _ in originals):
+                errors.append(f"{name}: first requests failed")
+            before = _state(engine)
+            memory, _ = await _phase(client, requests, keys, errors, originals)
+            response_cache.clear()
+            database, _ = await _phase(client, requests, keys, errors, originals)
+            if _state(engine) != before:
+                errors.append(f"{name}: replays changed the database {before} -> {_state(engine)}")
+            results[name] = {"first": first, "replay (memory)": memory, "replay (db)": database}
+
+        # The same key from many tasks at once runs the route once
+        method, url, kwargs = routes["buy_item"][0]
+        headers = {**kwargs["headers"], "Idempotency-Key": "concurrent"}
+        before = _state(engine)
+        responses = await asyncio.gather(*(client.request(method, url, **{**kwargs, "headers": headers}) for _ in range(20)))
+        purchases = _state(engine)[2] - before[2]
+        statuses = sorted(r.status_code for r in responses)
+        if purchases != 1 or any(status not in (200, 409) for status in statuses):
+            errors.append(f"concurrent key: {purchases} purchases, statuses {statuses}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300, help="requests per route and phase")
+    parser.add_argument("--users", type=int, default=50)
+    args = parser.parse_args()
+
+    use_temp_database("habit-idempotency-")
+    from sqlalchemy import update
+    from app.db.base import engine
+    from app.db.init_db import create_db_and_tables
+    from app.db.models import UserWallet
+    from app.main import app
+
+    create_db_and_tables()
+    usernames = seed_users(engine, args.users)
+    per_user = args.requests // args.users + 1
+    habit_ids = seed_habits(engine, list(range(1, args.users + 1)), per_user)
+    items = seed_shop_items(engine, 10)
+    with engine.begin() as conn:
+        conn.execute(update(UserWallet).values(coins=10**6))
+
+    headers = {name: auth_headers(name) for name in usernames}
+    habits = [(usernames[user_id - 1], habit_id) for user_id, ids in habit_ids.items() for habit_id in ids]
+    routes = {
+        "complete_habit": [
+            ("POST", f"/habits/{habit_id}/complete", {"headers": headers[username]})
+            for username, habit_id in habits[:args.requests]
+        ],
+        "buy_item": [
+            ("POST", "/shop/buy/", {"headers": headers[usernames[i % args.users]], "json": {"item_id": items[i % 10], "currency": "coins"}})
+            for i in range(args.requests)
+        ],
+    }
+
+    errors = []
+    results = asyncio.run(run(app, engine, routes, errors))
+    print(f"{'route':<16} {'phase':<16} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, phases in results.items():
+        for phase, latencies in phases.items():
+            print(f"{name:<16} {phase:<16} {percentile(latencies, 50):>8.2f} {percentile(latencies, 95):>8.2f}")
+    print("checks: " + ("OK" if not errors else f"{len(errors)} failed"))
+    for error in errors:
+        print("  " + error)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Verify the in-memory leaderboard against SQL ranking and time it.
+
+Seeds N users with random XP (many ties), rebuilds the leaderboard, and
+checks every user's rank against ROW_NUMBER() OVER (ORDER BY xp DESC, id).
+Then it applies a batch of random XP changes to both the database and the
+leaderboard and checks again, including top-N and "around me" windows.
+Finally it compares lookup latency with the equivalent SQL rank query.
+
+    python -m benchmarks.leaderboard --users 1000000 --updates 50000
+"""
+import argparse
+import random
+import sys
+import time
+from .common import seed_users, use_temp_database
+
+RANKS_SQL = "SELECT id, ROW_NUMBER() OVER (ORDER BY xp DESC, id) FROM users"
+RANK_SQL = "SELECT count(*) + 1 FROM users WHERE xp > :xp OR (xp = :xp AND id < :id)"
+
+
+def sql_ranks(engine) -> dict[int, int]:
+    from sqlalchemy import text
+    with engine.connect() as conn:
+        return dict(conn.execute(text(RANKS_SQL)).all())
+
+
+def verify(board, engine, rng, samples: int, window: int) -> list[str]:
+    from sqlalchemy import text
+    errors = []
+    expected = sql_ranks(engine)
+    if len(expected) != len(board):
+        errors.append(f"size: board {len(board)} != sql {len(expected)}")
+    for user_id, rank in expected.items():
+        if board.rank(user_id) != rank:
+            errors.append(f"user {user_id}: board rank {board.rank(user_id)} != sql {rank}")
+            if len(errors) > 10:
+                return errors
+
+    by_rank = sorted(expected, key=expected.get)
+    with engine.connect() as conn:
+        xp = dict(conn.execute(text("SELECT id, xp FROM users")).all())
+    if [(e["user_id"], e["xp"]) for e in board.top(100)] != [(u, xp[u]) for u in by_rank[:100]]:
+        errors.append("top 100 differs")
+    for user_id in rng.sample(by_rank, samples):
+        rank, entries = board.around(user_id, window)
+        start = max(rank - 1 - window, 0)
+        if [e["user_id"] for e in entries] != by_rank[start:rank + window]:
+            errors.append(f"window around {user_id} differs")
+    return errors
+
+
+def timed(fn, args_list) -> float:
+    # Mean microseconds per call
+    started = time.perf_counter()
+    for args in args_list:
+        fn(*args)
+    return (time.perf_counter() - started) / len(args_list) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--updates", type=int, default=50000)
+    parser.add_argument("--max-xp", type=int, default=50000)
+    parser.add_argument("--window", type=int, default=5)
+    args = parser.parse_args()
+
+    use_temp_database("habit-leaderboard-")
+    from sqlalchemy import text, update
+    from app.db.base import engine
+    from app.db.init_db import create_db_and_tables
+    from app.db.models import User
+    from app.utils.leaderboard import Leaderboard
+
+    rng = random.Random(42)
+    create_db_and_tables()
+    started = time.perf_counter()
+    seed_users(engine, args.users)
+    with engine.begin() as conn:
+        conn.execute(update(User).values(xp=text(f"abs(random()) % {args.max_xp}")))
+    print(f"seeded {args.users} users in {time.perf_counter() - started:.1f}s")
+
+    board = Leaderboard()
+    started = time.perf_counter()
+    board.rebuild()
+    print(f"rebuild: {time.perf_counter() - started:.2f}s")
+
+    errors = verify(board, engine, rng, samples=1000, window=args.window)
+    print(f"initial ranks: {'OK' if not errors else 'MISMATCH'}")
+
+    changes = {}
+    for user_id in rng.sample(range(1, args.users + 1), args.updates):
+        changes[user_id] = rng.randrange(args.max_xp * 2)
+    with engine.begin() as conn:
+        conn.execute(
+            text("UPDATE users SET xp = :xp WHERE id = :id"),
+            [{"id": user_id, "xp": xp} for user_id, xp in changes.items()],
+        )
+    update_us = timed(board.update, [(user_id, xp, 1, None) for user_id, xp in changes.items()])
+
+    errors += verify(board, engine, rng, samples=1000, window=args.window)
+    print(f"after {args.updates} updates: {'OK' if not errors else 'MISMATCH'}")
+
+    probe = [(rng.randrange(1, args.users + 1),) for _ in range(10000)]
+    with engine.connect() as conn:
+        xp = dict(conn.execute(text("SELECT id, xp FROM users")).all())
+        sql_params = [{"xp": xp[user_id], "id": user_id} for (user_id,) in probe[:1000]]
+        sql_us = timed(lambda p: conn.execute(text(RANK_SQL), p).scalar(), [(p,) for p in sql_params])
+
+    print(f"\n{'operation':<24} {'us/op':>10}")
+    print(f"{'update':<24} {update_us:>10.1f}")
+    print(f"{'rank':<24} {timed(board.rank, probe):>10.1f}")
+    print(f"{'top 10':<24} {timed(board.top, [(10,)] * 10000):>10.1f}")
+    print(f"{'around me':<24} {timed(board.around, [(u, args.window) for (u,) in probe]):>10.1f}")
+    print(f"{'rank via SQL count':<24} {sql_us:>10.1f}")
+
+    for error in errors[:10]:
+        print(error)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
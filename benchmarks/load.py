@@ -0,0 +1,214 @@
+"""In-process load test of the main API routes.
+
+Seeds a synthetic dataset in a temporary database and drives the real
+app through an ASGI client, one route at a time, with N concurrent
+clients. Reports throughput and p50/p95/p99 latency per route and can
+write the results as JSON to diff between commits.
+
+    python -m benchmarks.load --concurrency 16 --requests 500 --out before.json
+    python -m benchmarks.load --concurrency 16 --requests 500 --compare before.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import time
+from datetime import datetime
+from .common import (
+    asgi_client, auth_headers, seed_habits, seed_shop_items, seed_users, summarize, use_temp_database,
+)
+
+ROUTES = [
+    "login",
+    "read_my_habits",
+    "complete_habit",
+    "read_leaderboard",
+    "buy_item",
+    "read_achievements",
+    "read_user_achievements",
+]
+
+
+def seed(engine, users: int, habits_per_user: int, achievements: int) -> dict:
+    from sqlalchemy import insert, update
+    from app.db.models import Achievement, UserAchievement, UserWallet
+
+    usernames = seed_users(engine, users)
+    habit_ids = seed_habits(engine, list(range(1, users + 1)), habits_per_user)
+    item_ids = seed_shop_items(engine, 50)
+    rng = random.Random(7)
+    with engine.begin() as conn:
+        conn.execute(update(UserWallet).values(coins=10**9))
+        conn.execute(insert(Achievement), [
+            {
+                "id": i,
+                "title": f"achievement {i}",
+                "condition": {"field": rng.choice(["xp", "streak", "level"]), "operator": ">=", "value": i},
+                "gems_reward": 1,
+            }
+            for i in range(1, achievements + 1)
+        ])
+        conn.execute(insert(UserAchievement), [
+            {"user_id": user_id, "achievement_id": achievement_id, "obtained": True}
+            for user_id in range(1, users + 1)
+            for achievement_id in rng.sample(range(1, achievements + 1), min(10, achievements))
+        ])
+
+    return {
+        "usernames": usernames,
+        "headers": {name: auth_headers(name) for name in usernames},
+        "habits": [(usernames[user_id - 1], habit_id) for user_id, ids in habit_ids.items() for habit_id in ids],
+        "items": item_ids,
+    }
+
+
+def requests_for(route: str, data: dict):
+    # Endless (method, url, kwargs) stream for one route
+    rng = random.Random(route)
+    usernames, headers = data["usernames"], data["headers"]
+
+    def anyone():
+        return headers[rng.choice(usernames)]
+
+    if route == "login":
+        while True:
+            yield "POST", "/token", {"data": {"username": rng.choice(usernames), "password": "bench"}}
+    elif route == "read_my_habits":
+        while True:
+            yield "GET", "/habits/", {"headers": anyone()}
+    elif route == "complete_habit":
+        # Each (user, habit) pair once, so nothing is rejected as already completed
+        for username, habit_id in data["habits"]:
+            yield "POST", f"/habits/{habit_id}/complete", {"headers": headers[username]}
+    elif route == "read_leaderboard":
+        while True:
+            yield "GET", "/users/leaderboard/", {"headers": anyone(), "params": {"limit": 10}}
+    elif route == "buy_item":
+        while True:
+            body = {"item_id": rng.choice(data["items"]), "currency": "coins"}
+            yield "POST", "/shop/buy/", {"headers": anyone(), "json": body}
+    elif route == "read_achievements":
+        while True:
+            yield "GET", "/achievements/", {"headers": anyone()}
+    elif route == "read_user_achievements":
+        while True:
+            yield "GET", "/achievements/user/", {"headers": anyone()}
+
+
+async def _worker(client, jobs, latencies, statuses):
+    for method, url, kwargs in jobs:
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        latencies.append((time.perf_counter() - started) * 1000)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+
+async def run_route(client, stream, concurrency: int, count: int, warmup: int) -> dict:
+    for method, url, kwargs in itertools.islice(stream, warmup):
+        await client.request(method, url, **kwargs)
+
+    jobs = list(itertools.islice(stream, count))
+    plans = [jobs[i::concurrency] for i in range(concurrency)]
+    latencies, statuses = [], {}
+    started = time.perf_counter()
+    await asyncio.gather(*(_worker(client, plan, latencies, statuses) for plan in plans))
+    elapsed = time.perf_counter() - started
+
+    errors = sum(n for code, n in statuses.items() if code >= 400)
+    result = summarize(latencies, elapsed, errors)
+    result["statuses"] = {str(code): n for code, n in sorted(statuses.items())}
+    return result
+
+
+async def run(app, data: dict, routes: list[str], concurrency: int, counts: dict, warmup: int) -> dict:
+    results = {}
+    async with asgi_client(app) as client:
+        for route in routes:
+            results[route] = await run_route(client, requests_for(route, data), concurrency, counts[route], warmup)
+    return results
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(__file__), text=True, stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: dict, baseline: dict | None = None):
+    print(f"{'route':<24} {'requests':>9} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for route, r in results.items():
+        print(f"{route:<24} {r['requests']:>9} {r['throughput_rps']:>9} {r['p50_ms']:>9} "
+              f"{r['p95_ms']:>9} {r['p99_ms']:>9} {r['errors']:>7}")
+        old = (baseline or {}).get(route)
+        if old:
+            deltas = []
+            for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+                if old[key]:
+                    deltas.append(f"{key} {(r[key] - old[key]) / old[key] * 100:+.1f}%")
+            print(f"{'':<24} vs baseline: " + ", ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--routes", nargs="+", choices=ROUTES, default=ROUTES)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500, help="timed requests per route")
+    parser.add_argument("--login-requests", type=int, default=64, help="timed logins (bcrypt bound)")
+    parser.add_argument("--warmup", type=int, default=20, help="untimed requests per route")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--achievements", type=int, default=100)
+    parser.add_argument("--out", help="write results to this JSON file")
+    parser.add_argument("--compare", help="print deltas against a previous JSON result")
+    args = parser.parse_args()
+
+    counts = {route: args.requests for route in ROUTES}
+    counts["login"] = args.login_requests
+    habits_per_user = math.ceil((args.requests + args.warmup) / args.users) + 1
+
+    use_temp_database("habit-load-")
+    from app.db.base import engine
+    from app.db.init_db import create_db_and_tables
+    from app.main import app
+
+    create_db_and_tables()
+    data = seed(engine, args.users, habits_per_user, args.achievements)
+    results = asyncio.run(run(app, data, args.routes, args.concurrency, counts, args.warmup))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["routes"]
+    print_results(results, baseline)
+
+    if args.out:
+        report = {
+            "meta": {
+                "revision": git_revision(),
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version,
+                "concurrency": args.concurrency,
+                "users": args.users,
+                "habits_per_user": habits_per_user,
+                "achievements": args.achievements,
+                "warmup": args.warmup,
+            },
+            "routes": results,
+        }
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"\nwrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Deep-page latency of GET /users/: offset vs keyset cursor.
+
+The users table is grown to each size in turn. For every size the same
+page (page 1000 by default) and the last page are fetched with ?offset=
+and with ?cursor=, and the median request latency is reported. Offset
+pages cost O(offset); cursor pages stay flat.
+
+    python -m benchmarks.pagination --sizes 10000 100000 1000000 --page 1000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from .common import asgi_client, auth_headers, seed_users, use_temp_database
+
+
+async def _median_ms(client, headers, params, repeats: int) -> float:
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        response = await client.get("/users/", headers=headers, params=params)
+        samples.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+    return statistics.median(samples)
+
+
+def _cursor_before(engine, offset: int) -> str:
+    from sqlalchemy import select
+    from app.db.models import User
+    from app.utils.pagination import encode_cursor
+
+    with engine.connect() as conn:
+        last_id = conn.execute(select(User.id).order_by(User.id).offset(offset - 1).limit(1)).scalar()
+    return encode_cursor([last_id])
+
+
+async def measure(app, engine, size: int, page: int, limit: int, repeats: int) -> dict:
+    headers = auth_headers("bench1")
+    last = (size - 1) // limit * limit
+    pages = {"page": min((page - 1) * limit, last), "last": last}
+    result = {"size": size}
+    async with asgi_client(app) as client:
+        for name, offset in pages.items():
+            result[f"{name}_offset_ms"] = await _median_ms(client, headers, {"limit": limit, "offset": offset}, repeats)
+            params = {"limit": limit}
+            if offset:
+                params["cursor"] = _cursor_before(engine, offset)
+            result[f"{name}_cursor_ms"] = await _median_ms(client, headers, params, repeats)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--page", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    use_temp_database("habit-pages-")
+    from sqlalchemy import update
+    from app.db.base import engine
+    from app.db.init_db import create_db_and_tables
+    from app.db.models import User
+    from app.main import app
+
+    create_db_and_tables()
+    print(f"{'users':>9} {'page offset':>12} {'page cursor':>12} {'last offset':>12} {'last cursor':>12}  (median ms, page {args.page})")
+    seeded = 0
+    for size in sorted(args.sizes):
+        seed_users(engine, size - seeded, start=seeded + 1)
+        if not seeded:
+            with engine.begin() as conn:
+                conn.execute(update(User).where(User.username == "bench1").values(role="admin"))
+        seeded = size
+
+        r = asyncio.run(measure(app, engine, size, args.page, args.limit, args.repeats))
+        print(f"{size:>9} {r['page_offset_ms']:>12.2f} {r['page_cursor_ms']:>12.2f} "
+              f"{r['last_offset_ms']:>12.2f} {r['last_cursor_ms']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""Query-plan regression check for the routers.
+
+    python -m benchmarks.query_plans [--verbose]
+
+Drives every mounted route once against a seeded temporary database,
+captures each SQL statement the request issues (sync and async engines),
+and runs EXPLAIN QUERY PLAN on it with the captured parameters. Exits
+non-zero if any statement does a full table scan, except for the
+catalog listings in ALLOWED_SCANS that read the whole table by design.
+"""
+import argparse
+import re
+import sqlite3
+import sys
+from .common import use_temp_database, auth_headers, seed_users, seed_habits, seed_shop_items
+
+# Whole-table reads that are intended: small admin catalogs and admin listings
+ALLOWED_SCANS = {
+    "achievements",
+    "medals",
+    "medal_achievement_link",
+    "shop_items",
+    "quests",
+    ("GET /users/", "users"),
+    ("GET /streak", "streaks"),
+}
+
+# "SCAN n CONSTANT ROWS" (a multi-row VALUES list) and "SCAN CONSTANT ROW"
+# (a SELECT without FROM) read no table
+SCAN = re.compile(r"^SCAN (?!(?:\d+ )?CONSTANT ROWS?\b)(\w+)(?: AS \w+)?(?: USING (?:COVERING )?INDEX (\w+))?")
+
+
+def probes(ids: dict) -> list[tuple]:
+    from app.utils.pagination import encode_cursor
+
+    # (label, method, path, user, request kwargs)
+    h, h2, done = ids["habit"], ids["habit2"], ids["habit_done"]
+    cursor = encode_cursor([1])
+    return [
+        ("POST /login", "POST", "/login", None, {"json": {"username": "bench1", "password": "bench"}}),
+        ("POST /token", "POST", "/token", None, {"data": {"username": "bench1", "password": "bench"}}),
+        ("GET /users/me/", "GET", "/users/me/", "bench1", {}),
+        ("GET /users/", "GET", "/users/", "TEST", {"params": {"limit": 10}}),
+        ("GET /users/?cursor", "GET", "/users/", "TEST", {"params": {"limit": 10, "cursor": cursor}}),
+        ("GET /users/{id}", "GET", f"/users/{ids['user']}", "bench1", {}),
+        ("GET /users/leaderboard/", "GET", "/users/leaderboard/", "bench1", {}),
+        ("GET /users/leaderboard/me/", "GET", "/users/leaderboard/me/", "bench1", {}),
+        ("GET /users/wallet/", "GET", "/users/wallet/", "bench1", {}),
+        ("GET /users/items/", "GET", "/users/items/", "bench1", {}),
+        ("POST /users/equip/", "POST", "/users/equip/", "bench1", {"json": {"user_item_id": ids["user_item"]}}),
+        ("POST /users/unequip/", "POST", "/users/unequip/", "bench1", {"json": {"user_item_id": ids["user_item"]}}),
+        ("PUT /users/update-password/", "PUT", "/users/update-password/", "bench2", {"params": {"new_password": "bench"}}),
+        ("POST /users/", "POST", "/users/", "TEST", {"json": {"username": "plans", "password": "plans"}}),
+        ("GET /streak", "GET", "/streak", "bench1", {}),
+        ("GET /streak?user_id", "GET", "/streak", "bench1", {"params": {"user_id": ids["user"]}}),
+        ("GET /streak?habit_id", "GET", "/streak", "bench1", {"params": {"habit_id": h}}),
+        ("GET /streak?user_id&cursor", "GET", "/streak", "bench1", {"params": {"user_id": ids["user"], "cursor": cursor}}),
+        ("GET /streak/{id}", "GET", "/streak/1", "bench1", {}),
+        ("POST /habits/", "POST", "/habits/", "bench1", {"json": {"title": "plans"}}),
+        ("GET /habits/", "GET", "/habits/", "bench1", {}),
+        ("GET /habits/?cursor", "GET", "/habits/", "bench1", {"params": {"cursor": cursor}}),
+        ("GET /habits/{id}", "GET", f"/habits/{h}", "bench1", {}),
+        ("PUT /habits/{id}", "PUT", f"/habits/{h}", "bench1", {"json": {"title": "renamed"}}),
+        ("GET /habits/user/{id}", "GET", f"/habits/user/{ids['user']}", "bench1", {}),
+        ("GET /habits/user/{id}?cursor", "GET", f"/habits/user/{ids['user']}", "bench1", {"params": {"cursor": cursor}}),
+        ("GET /quests/", "GET", "/quests/", "bench1", {}),
+        ("POST /habits/{id}/complete", "POST", f"/habits/{h}/complete", "bench1", {}),
+        ("POST /habits/complete/batch", "POST", "/habits/complete/batch", "bench1",
+         {"json": {"items": [{"habit_id": h2}, {"habit_id": h}]}}),
+        ("GET /users/leaderboard/?period", "GET", "/users/leaderboard/", "bench1", {"params": {"period": "week"}}),
+        ("GET /users/leaderboard/me/?period", "GET", "/users/leaderboard/me/", "bench1", {"params": {"period": "month"}}),
+        ("GET /quests/progress", "GET", "/quests/progress", "bench1", {}),
+        ("POST /quests/{id}/complete", "POST", f"/quests/{ids['xp_quest']}/complete", "bench1", {}),
+        ("POST /quests/", "POST", "/quests/", "TEST",
+         {"json": {"id": 1000, "title": "plans", "description": "plans", "type": "daily",
+                   "condition": {"field": "xp", "operator": ">=", "value": 10**9}}}),
+        ("DELETE /quests/{id}", "DELETE", "/quests/1000", "TEST", {}),
+        ("DELETE /habits/{id}", "DELETE", f"/habits/{done}", "bench1", {}),
+        ("POST /achievements/", "POST", "/achievements/", "TEST",
+         {"json": {"id": 1000, "title": "plans", "condition": {"field": "xp", "operator": ">=", "value": 10**9}}}),
+        ("GET /achievements/", "GET", "/achievements/", "bench1", {}),
+        ("GET /achievements/{id}", "GET", "/achievements/1", "TEST", {}),
+        ("GET /achievements/?cursor", "GET", "/achievements/", "bench1", {"params": {"cursor": cursor}}),
+        ("GET /achievements/user/", "GET", "/achievements/user/", "bench1", {}),
+        ("GET /achievements/user/?cursor", "GET", "/achievements/user/", "bench1", {"params": {"cursor": cursor}}),
+        ("GET /achievements/user/{id}", "GET", "/achievements/user/1", "bench1", {}),
+        ("DELETE /achievements/{id}", "DELETE", "/achievements/1000", "TEST", {}),
+        ("GET /medals/", "GET", "/medals/", "bench1", {}),
+        ("GET /medals/progress", "GET", "/medals/progress", "bench1", {}),
+        ("GET /medals/{id}", "GET", "/medals/1", "bench1", {}),
+        ("POST /medals/{id}/achievements/{id}", "POST", "/medals/1/achievements/2", "TEST", {}),
+        ("DELETE /medals/{id}/achievements/{id}", "DELETE", "/medals/1/achievements/2", "TEST", {}),
+        ("GET /shop/items/", "GET", "/shop/items/", "bench1", {}),
+        ("GET /shop/items/{id}", "GET", f"/shop/items/{ids['item']}", "bench1", {}),
+        ("POST /shop/buy/", "POST", "/shop/buy/", "bench1", {"json": {"item_id": ids["item"], "currency": "coins"}}),
+        ("GET /users/{id}/items/", "GET", f"/users/{ids['user']}/items/", "bench1", {}),
+        ("DELETE /users/{id}", "DELETE", f"/users/{ids['doomed']}", "TEST", {}),
+    ]
+
+
+def seed(engine) -> dict:
+    from sqlalchemy import insert, update
+    from app.db.models import Achievement, Medal, MedalAchievementLink, Quest, UserAchievement, UserItem, UserWallet
+
+    seed_users(engine, 50)
+    habits = seed_habits(engine, list(range(1, 51)), per_user=5)
+    items = seed_shop_items(engine, 10)
+    with engine.begin() as conn:
+        conn.execute(insert(Achievement), [
+            {"id": i, "title": f"xp {i}", "condition": {"field": "xp", "operator": ">=", "value": i * 10}, "gems_reward": 1}
+            for i in range(1, 6)
+        ])
+        conn.execute(insert(Medal), [{"id": 1, "name": "medal", "xp_reward": 10}])
+        conn.execute(insert(MedalAchievementLink), [{"medal_id": 1, "achievement_id": 1}])
+        conn.execute(insert(UserAchievement), [{"id": 1, "user_id": 1, "achievement_id": 1, "obtained": True}])
+        user_item = conn.execute(insert(UserItem).returning(UserItem.id), [{"user_id": 1, "item_id": items[0]}]).scalar()
+        conn.execute(update(UserWallet).values(coins=1000))
+        conn.execute(insert(Quest), [
+            {"id": i, "title": f"quest {i}", "description": "", "type": "daily", "condition": condition,
+             "xp_reward": 10, "coin_reward": 1, "event_tokens_reward": 0, "is_active": True}
+            for i, condition in enumerate([
+                {"field": "completions", "operator": ">=", "value": 1},
+                {"field": "completions", "operator": ">=", "value": 3},
+                {"field": "streak", "operator": ">=", "value": 2},
+                {"field": "xp", "operator": ">=", "value": 0},
+            ], start=1)
+        ])
+
+    return {
+        "user": 1,
+        "doomed": 50,
+        "habit": habits[1][0],
+        "habit2": habits[1][1],
+        "habit_done": habits[1][2],
+        "item": items[1],
+        "user_item": user_item,
+        "xp_quest": 4,
+    }
+
+
+def explain(db_path: str, captured: list[tuple]) -> list[tuple]:
+    # -> (label, statement, [plan details])
+    conn = sqlite3.connect(db_path)
+    plans, seen = [], set()
+    for label, statement, parameters in captured:
+        if not statement.lstrip().upper().startswith(("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")):
+            continue
+        if (label, statement) in seen:
+            continue
+        seen.add((label, statement))
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+        plans.append((label, statement, [row[-1] for row in rows]))
+    conn.close()
+    return plans
+
+
+def full_scans(plans: list[tuple]) -> list[tuple]:
+    violations = []
+    for label, statement, details in plans:
+        for detail in details:
+            match = SCAN.match(detail)
+            if not match:
+                continue
+            table, index = match.groups()
+            if table in ALLOWED_SCANS or (label, table) in ALLOWED_SCANS:
+                continue
+            # Walking an index in order under a LIMIT (leaderboard) stops early
+            if index and " LIMIT " in statement.upper():
+                continue
+            violations.append((label, detail, statement))
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--verbose", action="store_true", help="print every captured plan")
+    args = parser.parse_args()
+
+    db_path = use_temp_database("habit-plans-")
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+    from app.db.base import engine, async_engine
+    from app.db.init_db import create_db_and_tables
+    from app.main import app
+
+    captured, current = [], [None]
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if current[0] is not None:
+            # insertmanyvalues batches arrive flagged executemany but with flat parameters
+            if executemany and parameters and isinstance(parameters[0], (list, tuple, dict)):
+                parameters = parameters[0]
+            if not isinstance(parameters, dict):
+                parameters = tuple(parameters)
+            captured.append((current[0], statement, parameters))
+
+    create_db_and_tables()
+    ids = seed(engine)
+    with TestClient(app, raise_server_exceptions=False) as client:
+        event.listen(engine, "before_cursor_execute", capture)
+        event.listen(async_engine.sync_engine, "before_cursor_execute", capture)
+
+        for label, method, path, user, kwargs in probes(ids):
+            current[0] = label
+            headers = auth_headers(user) if user else {}
+            response = client.request(method, path, headers=headers, **kwargs)
+            current[0] = None
+            if args.verbose or response.status_code >= 400:
+                print(f"{response.status_code} {label}")
+
+    plans = explain(db_path, captured)
+    if args.verbose:
+        for label, statement, details in plans:
+            print(f"\n[{label}] {statement}")
+            for detail in details:
+                print(f"    {detail}")
+
+    violations = full_scans(plans)
+    print(f"\n{len(plans)} statements from {len({p[0] for p in plans})} routes checked")
+    for label, detail, statement in violations:
+        print(f"FULL SCAN [{label}] {detail}\n    {statement}")
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Time the daily/weekly quest rotation and its effect on concurrent writes.
+
+Seeds N users and a few daily and weekly quests, then runs the rotation
+for a Monday (every quest is assigned) while a writer thread keeps issuing
+small wallet UPDATE transactions, the kind online requests make. Then it
+rotates again for the Tuesday, which expires the daily rows and assigns
+them again. Reports each rotation's duration, rows and slowest chunk, and
+the writer's latency while the rotation ran.
+
+    python -m benchmarks.quest_rotation --users 1000000 --chunk-size 2000
+"""
+import argparse
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from .common import percentile, seed_users, use_temp_database, wallet_writer
+
+
+def seed_quests(engine, daily: int, weekly: int) -> None:
+    from sqlalchemy import insert
+    from app.db.models import Quest
+
+    with engine.begin() as conn:
+        conn.execute(insert(Quest), [
+            {"title": f"{quest_type} quest {i}", "description": "", "type": quest_type,
+             "condition": {"field": "completions", "operator": ">=", "value": 3}, "coin_reward": 5}
+            for quest_type, count in (("daily", daily), ("weekly", weekly))
+            for i in range(count)
+        ])
+
+
+def rotate_with_writer(engine, users: int, day: date, chunk_size: int, pause: float) -> tuple[dict, list]:
+    from app.utils.quest_rotation import rotate_quests
+
+    stop, latencies = threading.Event(), []
+    writer = threading.Thread(target=wallet_writer, args=(engine, users, stop, latencies))
+    writer.start()
+    try:
+        report = rotate_quests(day, chunk_size, pause, active_days=0)
+    finally:
+        stop.set()
+        writer.join()
+    return report, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--daily", type=int, default=3, help="daily quests")
+    parser.add_argument("--weekly", type=int, default=2, help="weekly quests")
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--pause", type=float, default=0.02, help="seconds between chunks")
+    args = parser.parse_args()
+
+    use_temp_database("habit-quest-rotation-")
+    from sqlalchemy import func, select
+    from app.db.base import engine
+    from app.db.init_db import create_db_and_tables
+    from app.db.models import UserQuest
+
+    create_db_and_tables()
+    started = time.perf_counter()
+    for start in range(1, args.users + 1, 100000):
+        seed_users(engine, min(100000, args.users + 1 - start), start=start)
+    seed_quests(engine, args.daily, args.weekly)
+    print(f"seeded {args.users} users in {time.perf_counter() - started:.1f}s")
+
+    monday = date.today() - timedelta(days=date.today().weekday())
+    errors = []
+    print(f"{'rotation':<10} {'rows':>9} {'expired':>9} {'chunks':>7} {'total s':>8} {'slowest chunk ms':>17} "
+          f"{'writes':>7} {'write p50':>10} {'write p99':>10} {'write max':>10}")
+    for label, day, expected in (
+        ("monday", monday, (args.daily + args.weekly) * args.users),
+        ("tuesday", monday + timedelta(days=1), args.daily * args.users),
+    ):
+        report, latencies = rotate_with_writer(engine, args.users, day, args.chunk_size, args.pause)
+        print(f"{label:<10} {report['inserted']:>9} {report['expired']:>9} {report['chunks']:>7} "
+              f"{report['duration_s']:>8.2f} {report['slowest_chunk_ms']:>17.1f} {len(latencies):>7} "
+              f"{percentile(latencies, 50):>10.2f} {percentile(latencies, 99):>10.2f} {max(latencies, default=0):>10.2f}")
+        if report["inserted"] != expected:
+            errors.append(f"{label}: inserted {report['inserted']} rows, expected {expected}")
+
+    with engine.connect() as conn:
+        rows = dict(conn.execute(select(UserQuest.period_start, func.count()).group_by(UserQuest.period_start)).all())
+    if rows != {monday: args.weekly * args.users, monday + timedelta(days=1): args.daily * args.users}:
+        errors.append(f"unexpected rows per period after the rotations: {rows}")
+
+    print("checks: " + ("OK" if not errors else f"{len(errors)} failed"))
+    for error in errors:
+        print("  " + error)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
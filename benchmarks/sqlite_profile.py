@@ -0,0 +1,105 @@
+"""Write-heavy throughput of complete_habit and buy_item per SQLite profile.
+
+"stock" is SQLite's own defaults (rollback journal, synchronous=FULL, no
+mmap); "tuned" is the profile from app/core/config.py. Each profile runs
+in a fresh process and a fresh database file.
+
+    python -m benchmarks.sqlite_profile --clients 16 --users 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from .common import (
+    asgi_client, auth_headers, seed_habits, seed_shop_items, seed_users, summarize, use_temp_database,
+)
+
+PROFILES = {
+    "stock": {
+        "SQLITE_JOURNAL_MODE": "DELETE",
+        "SQLITE_SYNCHRONOUS": "FULL",
+        "SQLITE_BUSY_TIMEOUT_MS": "",
+        "SQLITE_CACHE_SIZE": "",
+        "SQLITE_MMAP_SIZE": "",
+    },
+    "tuned": {},
+}
+
+
+async def _worker(client, jobs, latencies, errors):
+    for method, url, kwargs in jobs:
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        latencies.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            errors.append(response.status_code)
+
+
+async def _run(clients: int, users: int, habits: int, purchases: int) -> dict:
+    from sqlalchemy import update
+    from app.db.base import engine
+    from app.db.init_db import create_db_and_tables
+    from app.db.models import UserWallet
+    from app.main import app
+
+    create_db_and_tables()
+    usernames = seed_users(engine, users)
+    habit_ids = seed_habits(engine, list(range(1, users + 1)), habits)
+    item_ids = seed_shop_items(engine, 20)
+    with engine.begin() as conn:
+        conn.execute(update(UserWallet).values(coins=purchases * 10))
+
+    completion_plans = [[] for _ in range(clients)]
+    purchase_plans = [[] for _ in range(clients)]
+    for i, username in enumerate(usernames):
+        headers = auth_headers(username)
+        completion_plans[i % clients].extend(
+            ("POST", f"/habits/{habit_id}/complete", {"headers": headers}) for habit_id in habit_ids[i + 1]
+        )
+        purchase_plans[i % clients].extend(
+            ("POST", "/shop/buy/", {"headers": headers, "json": {"item_id": item_ids[n % len(item_ids)], "currency": "coins"}})
+            for n in range(purchases)
+        )
+
+    results = {}
+    async with asgi_client(app) as client:
+        for route, plans in (("complete_habit", completion_plans), ("buy_item", purchase_plans)):
+            latencies, errors = [], []
+            started = time.perf_counter()
+            await asyncio.gather(*(_worker(client, plan, latencies, errors) for plan in plans))
+            results[route] = summarize(latencies, time.perf_counter() - started, len(errors))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--users", type=int, default=64)
+    parser.add_argument("--habits", type=int, default=10, help="habits per user")
+    parser.add_argument("--purchases", type=int, default=10, help="purchases per user")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        use_temp_database()
+        print(json.dumps(asyncio.run(_run(args.clients, args.users, args.habits, args.purchases))))
+        return
+
+    print(f"{'profile':>8} {'route':>15} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>9} {'errors':>7}")
+    for profile in args.profiles:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.sqlite_profile", "--child",
+             "--clients", str(args.clients), "--users", str(args.users),
+             "--habits", str(args.habits), "--purchases", str(args.purchases)],
+            env=dict(os.environ, **PROFILES[profile]), check=True, capture_output=True, text=True,
+        ).stdout
+        for route, r in json.loads(output.strip().splitlines()[-1]).items():
+            print(f"{profile:>8} {route:>15} {r['throughput_rps']:>8} {r['p50_ms']:>8} {r['p99_ms']:>9} {r['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
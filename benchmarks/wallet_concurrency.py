@@ -0,0 +1,163 @@
+"""Hammer the wallet from many concurrent tasks and check its invariants.
+
+A few users with a small coin balance get many concurrent purchases
+(more than they can afford, some of them in gems, which the coin items
+are not sold for) interleaved with habit completions that credit coins.
+Afterwards, per user:
+
+  - no balance is negative
+  - every balance equals its starting value plus the sum of its ledger deltas
+  - the ledger balances chain: each row's balance is the previous one plus its delta
+  - successful purchases == owned items == purchase ledger rows, each debiting the price
+  - completion credits in the ledger match the successful completions
+  - refused purchases were all "Not enough coins" or, in gems, "Item is not
+    sold for gems"; the only 5xx allowed is a 503 for a busy database
+
+    python -m benchmarks.wallet_concurrency --users 5 --tasks 64 --purchases 20
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from .common import asgi_client, auth_headers, seed_habits, seed_shop_items, seed_users, use_temp_database
+
+
+# Outcomes that are not a failure, besides 2xx
+ALLOWED = {
+    ("buy", 400, "Not enough coins"),
+    ("buy", 400, "Item is not sold for gems"),
+    ("buy", 503, "Database busy, retry"),
+    ("complete", 503, "Database busy, retry"),
+}
+
+
+def _detail(response):
+    try:
+        return response.json().get("detail")
+    except ValueError:
+        return response.text[:100]
+
+
+async def _buyer(client, rng, usernames, items, purchases: int, outcomes: list):
+    for _ in range(purchases):
+        username = rng.choice(usernames)
+        currency = "gems" if rng.random() < 0.1 else "coins"
+        response = await client.post(
+            "/shop/buy/", headers=auth_headers(username), json={"item_id": rng.choice(items), "currency": currency},
+        )
+        outcomes.append(("buy", username, response.status_code, _detail(response)))
+
+
+async def _completer(client, habits, outcomes: list):
+    for username, habit_id in habits:
+        response = await client.post(f"/habits/{habit_id}/complete", headers=auth_headers(username))
+        outcomes.append(("complete", username, response.status_code, _detail(response) if response.status_code >= 400 else None))
+
+
+async def hammer(app, rng, usernames, items, habits, tasks: int, purchases: int) -> list:
+    outcomes = []
+    # Server errors come back as 500 responses and are reported by check()
+    async with asgi_client(app, raise_app_exceptions=False) as client:
+        workers = [_buyer(client, random.Random(rng.random()), usernames, items, purchases, outcomes) for _ in range(tasks)]
+        workers += [_completer(client, habits[i::4], outcomes) for i in range(4)]
+        await asyncio.gather(*workers)
+    return outcomes
+
+
+def check(engine, usernames, initial_coins: int, price: int, coins_per_completion: int, outcomes) -> list[str]:
+    from sqlalchemy import func, select
+    from app.db.models import User, UserItem, UserWallet, WalletLedger
+
+    errors = []
+    statuses = Counter((kind, status, detail) for kind, _, status, detail in outcomes)
+    for (kind, status, detail), n in sorted(statuses.items(), key=str):
+        if status >= 400 and (kind, status, detail) not in ALLOWED:
+            errors.append(f"{n} x {kind} -> {status} {detail}")
+
+    bought = Counter(username for kind, username, status, _ in outcomes if kind == "buy" and status == 200)
+    completed = Counter(username for kind, username, status, _ in outcomes if kind == "complete" and status == 200)
+
+    with engine.connect() as conn:
+        ids = dict(conn.execute(select(User.username, User.id).where(User.username.in_(usernames))).all())
+        wallets = {row.user_id: row for row in conn.execute(select(UserWallet))}
+        items = dict(conn.execute(select(UserItem.user_id, func.count()).group_by(UserItem.user_id)).all())
+        ledger = defaultdict(list)
+        for row in conn.execute(select(WalletLedger).order_by(WalletLedger.id)):
+            ledger[row.user_id].append(row)
+
+    for username in usernames:
+        user_id = ids[username]
+        wallet = wallets[user_id]
+        rows = ledger[user_id]
+        starting = {"coins": initial_coins, "gems": 0, "event_tokens": 0}
+        for currency, start in starting.items():
+            balance = getattr(wallet, currency)
+            if balance < 0:
+                errors.append(f"{username}: negative {currency} {balance}")
+            deltas = [row for row in rows if row.currency == currency]
+            if start + sum(row.delta for row in deltas) != balance:
+                errors.append(f"{username}: {currency} {balance} != {start} + ledger {sum(r.delta for r in deltas)}")
+            running = start
+            for row in deltas:
+                running += row.delta
+                if row.balance != running:
+                    errors.append(f"{username}: ledger row {row.id} balance {row.balance} != {running}")
+                    break
+
+        purchases = [row for row in rows if row.reason == "purchase"]
+        if not bought[username] == items.get(user_id, 0) == len(purchases):
+            errors.append(f"{username}: {bought[username]} bought, {items.get(user_id, 0)} items, {len(purchases)} ledger rows")
+        if any(row.delta != -price for row in purchases):
+            errors.append(f"{username}: purchase ledger row with a wrong amount")
+        credited = sum(row.delta for row in rows if row.reason == "habit_completion")
+        if credited != completed[username] * coins_per_completion:
+            errors.append(f"{username}: credited {credited} for {completed[username]} completions")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--tasks", type=int, default=64, help="concurrent buyer tasks")
+    parser.add_argument("--purchases", type=int, default=20, help="purchase attempts per task")
+    parser.add_argument("--habits", type=int, default=20, help="habits completed per user while buying")
+    parser.add_argument("--coins", type=int, default=100, help="starting coins per user")
+    parser.add_argument("--price", type=int, default=3)
+    args = parser.parse_args()
+
+    use_temp_database("habit-wallet-")
+    from sqlalchemy import update
+    from app.api.habits import coins_for_completion
+    from app.db.base import engine
+    from app.db.init_db import create_db_and_tables
+    from app.db.models import UserWallet
+    from app.main import app
+
+    create_db_and_tables()
+    usernames = seed_users(engine, args.users)
+    habit_ids = seed_habits(engine, list(range(1, args.users + 1)), args.habits)
+    items = seed_shop_items(engine, 10, price=args.price)
+    with engine.begin() as conn:
+        conn.execute(update(UserWallet).values(coins=args.coins))
+
+    rng = random.Random(11)
+    habits = [(usernames[user_id - 1], habit_id) for user_id, ids in habit_ids.items() for habit_id in ids]
+    rng.shuffle(habits)
+
+    started = time.perf_counter()
+    outcomes = asyncio.run(hammer(app, rng, usernames, items, habits, args.tasks, args.purchases))
+    elapsed = time.perf_counter() - started
+
+    kinds = Counter((kind, status) for kind, _, status, _ in outcomes)
+    print(f"{len(outcomes)} requests in {elapsed:.1f}s: " + ", ".join(f"{k} {s}: {n}" for (k, s), n in sorted(kinds.items())))
+    errors = check(engine, usernames, args.coins, args.price, coins_for_completion(1), outcomes)
+    print("invariants: " + ("OK" if not errors else f"{len(errors)} violations"))
+    for error in errors[:20]:
+        print("  " + error)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()